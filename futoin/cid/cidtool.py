@@ -264,33 +264,30 @@ class CIDTool(LogMixIn, ConfigMixIn, LockMixIn, ServiceMixIn, DeployMixIn, ToolM
         self._info('Generating package from {0}'.format(package_content))
 
         #---
+        package_format = config.get('packageFormat', 'txz')
+        package_engine = config.get('packageEngine', 'native')
+        package_exclude = ['.git*', '.hg*', '.svn']
+        checksums_file = None
+        cs_cache = None
+
         if config.get('packageChecksums', True):
-            self._info('Generating checksums')
             checksums_file = '.package.checksums'
 
-            checksums = []
-            cs_files = []
-
-            for pkg_item in sorted(package_content):
-                if ospath.isfile(pkg_item):
-                    cs_files.append(pkg_item)
+            if config.get('packageChecksumsCache', False):
+                cs_cache = self._ext.hashlib.sha1(
+                    ospath.realpath('.').encode('utf8')).hexdigest()
+                cs_cache = ospath.join(
+                    self._pathutil.cacheDir('checksums'), cs_cache + '.json')
 
-                if ospath.isdir(pkg_item):
-                    for (path, dirs, files) in os.walk(pkg_item):
-                        for f in sorted(files):
-                            f = ospath.join(path, f)
-                            cs_files.append(f)
-
-            hashlib = self._ext.hashlib
-
-            for cf in cs_files:
-                hasher = hashlib.sha512()
+        # Native engine calculates checksums on its own
+        if checksums_file and package_engine == 'tar':
+            self._info('Generating checksums')
 
-                with open(cf, 'rb') as f_in:
-                    for chunk in iter(lambda: f_in.read(65536), b""):
-                        hasher.update(chunk)
+            checksums = []
+            cs_files = self._hashutil.walkFiles(package_content)
 
-                checksums.append("{0}  {1}".format(hasher.hexdigest(), cf))
+            for (cf, cs) in self._hashutil.fileDigests(cs_files, 'sha512', cs_cache):
+                checksums.append("{0}  {1}".format(cs, cf))
 
             checksums.append('')
 
@@ -330,16 +327,32 @@ class CIDTool(LogMixIn, ConfigMixIn, LockMixIn, ServiceMixIn, DeployMixIn, ToolM
         if 'target' in config:
             package_file += '-{0}'.format(config['target'])
 
-        package_file += '.txz'
+        package_file += '.' + package_format
         self._info('Creating package {0}'.format(package_file))
 
-        tar_tool = self._getTarTool('xz')
-        tar_args = ['cJf', package_file,
-                    '--exclude=' + package_file,
-                    '--exclude=.git*',
-                    '--exclude=.hg*',
-                    '--exclude=.svn'] + package_content
-        tar_tool.onExec(config['env'], tar_args, False)
+        from .details.packager import Packager
+
+        env = config['env']
+        (compressor, compressor_args) = Packager.FORMATS[package_format]
+
+        if package_engine == 'native':
+            if checksums_file:
+                self._info('Generating checksums')
+
+            self._getTool(compressor).requireInstalled(env)
+            packager = Packager(env[compressor + 'Bin'], compressor_args)
+            packager.create(package_file, package_content,
+                            package_exclude, checksums_file)
+        else:
+            tar_tool = self._getTarTool(compressor)
+            tar_args = ['-c',
+                        '--use-compress-program=' + env[compressor + 'Bin'],
+                        '-f', package_file,
+                        '--exclude=' + package_file]
+            tar_args += ['--exclude=' + e for e in package_exclude]
+            tar_args += package_content
+            tar_tool.onExec(env, tar_args, False)
+
         # note, no --exclude-vcs
         self._lastPackages = [package_file]
 
@@ -729,6 +742,9 @@ class CIDTool(LogMixIn, ConfigMixIn, LockMixIn, ServiceMixIn, DeployMixIn, ToolM
             else:
                 print(t)
 
+    def tool_envcache_clear(self):
+        self._clearEnvCache()
+
     def init_project(self, project_name):
         self._processWcDir()
         ospath = self._ospath
@@ -912,9 +928,10 @@ class CIDTool(LogMixIn, ConfigMixIn, LockMixIn, ServiceMixIn, DeployMixIn, ToolM
             if ospath.exists(p):
                 self._errorExit('File already exists: {0}'.format(p))
 
+        hashes = rmstool.rmsPackageHashes(package_list)
         package_list = rmstool.rmsProcessChecksums(
             config, rms_pool, package_list)
-        rmstool.rmsRetrieve(config, rms_pool, package_list)
+        rmstool.rmsRetrieve(config, rms_pool, package_list, hashes)
 
     def rms_pool_create(self, rms_pool):
         self._processWcDir()
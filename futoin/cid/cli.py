@@ -21,15 +21,15 @@
 Usage:
     cid init [<project_name>] [--vcsRepo=<vcs_repo>] [--rmsRepo=<rms_repo>] [--permissive]
     cid tag <branch> [<next_version>] [--vcsRepo=<vcs_repo>] [--wcDir=<wc_dir>]
-    cid prepare [<vcs_ref>] [--vcsRepo=<vcs_repo>] [--wcDir=<wc_dir>]
-    cid build [--debug]
-    cid package
-    cid check [--permissive]
+    cid prepare [<vcs_ref>] [--vcsRepo=<vcs_repo>] [--wcDir=<wc_dir>] [--no-env-cache]
+    cid build [--debug] [--no-env-cache]
+    cid package [--no-env-cache]
+    cid check [--permissive] [--no-env-cache]
     cid promote <rms_pool> <packages>... [--rmsRepo=<rms_repo>]
-    cid deploy setup [--deployDir=<deploy_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>]
-    cid deploy vcstag [<vcs_ref>] [--vcsRepo=<vcs_repo>] [--redeploy] [--deployDir=<deploy_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>]
-    cid deploy vcsref <vcs_ref> [--vcsRepo=<vcs_repo>] [--redeploy] [--deployDir=<deploy_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>]
-    cid deploy rms <rms_pool> [<package>] [--rmsRepo=<rms_repo>] [--redeploy] [--deployDir=<deploy_dir>] [--build] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>]
+    cid deploy setup [--deployDir=<deploy_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>] [--no-env-cache]
+    cid deploy vcstag [<vcs_ref>] [--vcsRepo=<vcs_repo>] [--redeploy] [--deployDir=<deploy_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>] [--no-env-cache]
+    cid deploy vcsref <vcs_ref> [--vcsRepo=<vcs_repo>] [--redeploy] [--deployDir=<deploy_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>] [--no-env-cache]
+    cid deploy rms <rms_pool> [<package>] [--rmsRepo=<rms_repo>] [--redeploy] [--deployDir=<deploy_dir>] [--build] [--incremental] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--runtimeDir=<runtime_dir>] [--tmpDir=<tmp_dir>] [--user=<user>] [--group=<group>] [--no-env-cache]
     cid deploy set tools <tools>... [--deployDir=<deploy_dir>]
     cid deploy set tooltune <tool> <tune>... [--deployDir=<deploy_dir>]
     cid deploy set action <name> <action>... [--deployDir=<deploy_dir>]
@@ -39,16 +39,17 @@ Usage:
     cid deploy set webcfg <variable> [<value>] [--deployDir=<deploy_dir>]
     cid deploy set webmount <web_path> [<json>] [--deployDir=<deploy_dir>]
     cid migrate
-    cid run
-    cid run <command> [--] [<command_arg>...]
-    cid ci_build <vcs_ref> [<rms_pool>] [--vcsRepo=<vcs_repo>] [--rmsRepo=<rms_repo>] [--permissive] [--debug] [--wcDir=<wc_dir>]
-    cid tool exec <tool_name> [<tool_version>] [-- <tool_arg>...]
-    cid tool envexec <tool_name> [<tool_version>] [-- <any_command>...]
-    cid tool (install|uninstall|update|test|env) [<tool_name> [<tool_version>]]
-    cid tool (prepare|build|check|package|migrate) <tool_name> [<tool_version>]
+    cid run [--no-env-cache]
+    cid run <command> [--no-env-cache] [--] [<command_arg>...]
+    cid ci_build <vcs_ref> [<rms_pool>] [--vcsRepo=<vcs_repo>] [--rmsRepo=<rms_repo>] [--permissive] [--debug] [--wcDir=<wc_dir>] [--no-env-cache]
+    cid tool exec <tool_name> [<tool_version>] [--no-env-cache] [-- <tool_arg>...]
+    cid tool envexec <tool_name> [<tool_version>] [--no-env-cache] [-- <any_command>...]
+    cid tool (install|uninstall|update|test|env) [<tool_name> [<tool_version>]] [--no-env-cache]
+    cid tool (prepare|build|check|package|migrate) <tool_name> [<tool_version>] [--no-env-cache]
     cid tool list
     cid tool describe <tool_name>
     cid tool detect
+    cid tool envcache clear
     cid vcs checkout [<vcs_ref>] [--vcsRepo=<vcs_repo>] [--wcDir=<wc_dir>]
     cid vcs commit <commit_msg> [<commit_files>...] [--wcDir=<wc_dir>]
     cid vcs merge <vcs_ref> [--no-cleanup] [--wcDir=<wc_dir>]
@@ -64,9 +65,9 @@ Usage:
     cid rms retrieve <rms_pool> <packages>... [--rmsRepo=<rms_repo>]
     cid rms pool create <rms_pool> [--rmsRepo=<rms_repo>]
     cid rms pool list [--rmsRepo=<rms_repo>]
-    cid devserve [--wcDir=<wc_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>]
-    cid service master [--deployDir=<deploy_dir>] [--adapt] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--user=<user>] [--group=<group>]
-    cid service list [--deployDir=<deploy_dir>] [--adapt] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--user=<user>] [--group=<group>]
+    cid devserve [--wcDir=<wc_dir>] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--no-env-cache]
+    cid service master [--deployDir=<deploy_dir>] [--adapt] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--user=<user>] [--group=<group>] [--no-env-cache]
+    cid service list [--deployDir=<deploy_dir>] [--adapt] [--limit-memory=<mem_limit>] [--limit-cpus=<cpu_count>] [--listen-addr=<address>] [--user=<user>] [--group=<group>] [--no-env-cache]
     cid service exec <entry_point> <instance_id> [--deployDir=<deploy_dir>]
     cid service stop <entry_point> <instance_id> <pid> [--deployDir=<deploy_dir>]
     cid service reload <entry_point> <instance_id> <pid> [--deployDir=<deploy_dir>]
@@ -83,6 +84,7 @@ Options:
     --deployDir=<deploy_dir>        Destination for deployment.
     --redeploy                      Force redeploy.
     --build                         Build during deploy.
+    --incremental                   Reuse unchanged files of current deployment.
     --permissive                    Ignore test failures.
     --debug                         Build in debug mode, if applicable.
     --cacheDir=<cache_dir>          Directory to hold VCS cache.
@@ -95,6 +97,7 @@ Options:
     --user=<user>|auto              User name to use for service execution.
     --group=<group>|auto            Group name to use for service execution.
     --skip-key-management           Enforce better security forbidding signing key management.
+    --no-env-cache                  Do not use cached tool environment resolution.
     <rms_pool>                      Either "dst_pool" or  "src_pool:dst_pool" for promotion.
     <packages>                      Either "local/file" or "remote_file" or "<package>@<hash>".
     <sudo_entity>                   Username or group to be put in generated sudoers as is.
@@ -104,12 +107,8 @@ from __future__ import print_function
 
 from .cidtool import CIDTool
 from .coloring import Coloring
-
-try:
-    from docopt import docopt
-except ImportError:
-    # fallback to "hardcoded"
-    from futoin.cid.contrib.docopt import docopt
+from .util import tracing
+from .util.clicache import docopt
 
 import os
 import sys
@@ -178,6 +177,9 @@ def runInner():
         if args['--build']:
             overrides['deployBuild'] = True
 
+        if args['--incremental']:
+            overrides['deployIncremental'] = True
+
         if args['--debug']:
             overrides['debugBuild'] = True
 
@@ -203,6 +205,7 @@ def runInner():
         )
 
         overrides['toolDetect'] = not (args['service'] and args['master'])
+        overrides['envCache'] = not args['--no-env-cache']
 
         #---
         if args['--permissive']:
@@ -243,6 +246,8 @@ def runInner():
                 cit.tool_list()
             elif args['detect']:
                 cit.tool_detect()
+            elif args['envcache']:
+                cit.tool_envcache_clear()
             else:
                 subcmds = [
                     'install',
@@ -383,7 +388,8 @@ def runInner():
 
 def run():
     try:
-        runInner()
+        with tracing.span('cid', 'cid ' + ' '.join(sys.argv[1:])):
+            runInner()
     except Exception as e:
         print(file=sys.stderr)
         print(Coloring.error('ERROR: ' + str(e)), file=sys.stderr)
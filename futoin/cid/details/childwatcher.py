@@ -0,0 +1,179 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+
+
+class ChildWatcher(LogMixIn, OnDemandMixIn):
+    """Event wait for signals, child process exit and timeouts.
+
+Signal handlers only set flags while signal.set_wakeup_fd() makes sure
+a blocked wait returns. Child exit is detected through pidfd, where
+supported, and through SIGCHLD otherwise. Non-child processes without
+pidfd support are polled.
+"""
+    POLL_INTERVAL = 0.1
+
+    def __init__(self):
+        self._wakeup_fds = None
+        self._old_wakeup_fd = -1
+        self._pidfds = {}
+
+    def open(self, handlers):
+        os = self._os
+        fcntl = self._ext.fcntl
+        signal = self._ext.signal
+
+        self._wakeup_fds = os.pipe()
+
+        for fd in self._wakeup_fds:
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+            fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+        self._old_wakeup_fd = signal.set_wakeup_fd(self._wakeup_fds[1])
+
+        for (sig, handler) in handlers.items():
+            signal.signal(sig, handler)
+
+        # Python-level handler is required for wakeup fd to get notified.
+        # Note: SIG_IGN would make children to be auto-reaped on some OSes.
+        signal.signal(signal.SIGCHLD, lambda *args: None)
+
+    def close(self):
+        signal = self._ext.signal
+
+        if self._wakeup_fds is None:
+            return
+
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(self._old_wakeup_fd)
+        self.closeInChild()
+
+    def closeInChild(self):
+        os = self._os
+
+        for fd in self._wakeup_fds:
+            os.close(fd)
+
+        for fd in self._pidfds.values():
+            os.close(fd)
+
+        self._wakeup_fds = None
+        self._pidfds = {}
+
+    def watch(self, pid):
+        """Try to get pidfd for process. Return True on success."""
+        pidfd_open = getattr(self._os, 'pidfd_open', None)
+
+        if pidfd_open is None:
+            return False
+
+        try:
+            self._pidfds[pid] = pidfd_open(pid)
+            return True
+        except OSError:
+            return False
+
+    def unwatch(self, pid):
+        fd = self._pidfds.pop(pid, None)
+
+        if fd is not None:
+            self._os.close(fd)
+
+    def isWatched(self, pid):
+        return pid in self._pidfds
+
+    def monotonic(self):
+        try:
+            return self._ext.time.monotonic()
+        except AttributeError:
+            return self._os.times()[4]
+
+    def wait(self, timeout=None):
+        """Wait for event and return set of pids with ready pidfd."""
+        os = self._os
+        errno = self._ext.errno
+        select = self._ext.select
+
+        fds = [self._wakeup_fds[0]] + list(self._pidfds.values())
+
+        if timeout is not None:
+            timeout = max(timeout, 0)
+
+        try:
+            if hasattr(select, 'poll'):
+                poller = select.poll()
+
+                for fd in fds:
+                    poller.register(fd, select.POLLIN)
+
+                if timeout is not None:
+                    timeout = int(timeout * 1000) + 1
+
+                ready = [fd for (fd, ev) in poller.poll(timeout)]
+            else:
+                ready = select.select(fds, [], [], timeout)[0]
+        except (select.error, IOError, OSError) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+            ready = []
+
+        if self._wakeup_fds[0] in ready:
+            try:
+                while os.read(self._wakeup_fds[0], 512):
+                    pass
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+
+        return set(
+            pid for (pid, fd) in self._pidfds.items() if fd in ready
+        )
+
+    def reap(self):
+        """Get list of (pid, status) for all exited children."""
+        os = self._os
+        errno = self._ext.errno
+        res = []
+
+        while True:
+            try:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+
+                break
+
+            if not pid:
+                break
+
+            self.unwatch(pid)
+            res.append((pid, status))
+
+        return res
+
+    def isAlive(self, pid):
+        """Check non-child process. Note: zombie is seen as alive."""
+        try:
+            self._os.kill(pid, 0)
+            return True
+        except OSError as e:
+            return e.errno == self._ext.errno.EPERM
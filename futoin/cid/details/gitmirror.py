@@ -0,0 +1,181 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+
+
+class GitMirror(LogMixIn, OnDemandMixIn):
+    """Host-wide mirror of Git repository shared by deploy caches.
+
+Mirrors are stored in cacheDir('vcs') by hash of repository URL and
+guarded with flock(): exclusive for update and shared for export.
+Deploy caches are bare repositories borrowing objects through
+alternates. They are registered as mirror users, so a mirror gets
+removed only after all its users are gone.
+"""
+    STORE_KEY = 'vcs'
+
+    def __init__(self, git_bin, repo_url):
+        ospath = self._ospath
+        hashlib = self._ext.hashlib
+
+        self._git_bin = git_bin
+        self._repo_url = repo_url
+        self._store = self._pathutil.cacheDir(self.STORE_KEY)
+
+        key = hashlib.sha1(repo_url.encode('utf8')).hexdigest()
+        self._mirror = ospath.join(self._store, key + '.git')
+        self._lockfd = None
+
+    def lock(self, exclusive=False):
+        fcntl = self._ext.fcntl
+
+        if self._lockfd is None:
+            self._lockfd = self.__openLock(self._mirror)
+
+        if exclusive:
+            fcntl.flock(self._lockfd, fcntl.LOCK_EX)
+        else:
+            fcntl.flock(self._lockfd, fcntl.LOCK_SH)
+
+    def unlock(self):
+        fcntl = self._ext.fcntl
+
+        if self._lockfd is not None:
+            fcntl.flock(self._lockfd, fcntl.LOCK_UN)
+            self._os.close(self._lockfd)
+            self._lockfd = None
+
+    def update(self):
+        """Clone or fetch mirror. Requires exclusive lock."""
+        ospath = self._ospath
+        git_bin = self._git_bin
+        mirror = self._mirror
+
+        if ospath.exists(mirror):
+            self._executil.callExternal([
+                git_bin,
+                '--git-dir={0}'.format(mirror),
+                'fetch', '-q', '--prune',
+            ])
+            return
+
+        mirror_tmp = '{0}.{1}.tmp'.format(mirror, self._os.getpid())
+        self._pathutil.rmTree(mirror_tmp)
+        self._executil.callExternal([
+            git_bin,
+            'clone', '-q', '--mirror',
+            self._repo_url,
+            mirror_tmp,
+        ])
+        self._os.rename(mirror_tmp, mirror)
+
+    def attach(self, cache_dir):
+        """Make cache_dir a registered user of mirror. Requires exclusive lock."""
+        ospath = self._ospath
+        git_bin = self._git_bin
+        cache_dir = ospath.realpath(cache_dir)
+
+        if ospath.exists(cache_dir) and not self.__isUser(self._mirror, cache_dir):
+            self._info('Converting git cache to use shared mirror')
+            self._pathutil.rmTree(cache_dir)
+
+        if not ospath.exists(cache_dir):
+            self._executil.callExternal([
+                git_bin, 'init', '-q', '--bare', cache_dir,
+            ], verbose=False)
+            self._executil.callExternal([
+                git_bin,
+                '--git-dir={0}'.format(cache_dir),
+                'config', 'remote.origin.url', self._repo_url,
+            ], verbose=False)
+
+            with open(self.__alternatesFile(cache_dir), 'w') as f:
+                f.write(ospath.join(self._mirror, 'objects') + "\n")
+
+        users = self.__loadUsers(self._mirror)
+        users.append(cache_dir)
+        self.__saveUsers(self._mirror, users)
+
+    def gitDir(self):
+        return self._mirror
+
+    def collect(self):
+        """Remove other mirrors without users, if not locked."""
+        os = self._os
+        ospath = self._ospath
+        fcntl = self._ext.fcntl
+
+        for f in os.listdir(self._store):
+            mirror = ospath.join(self._store, f)
+
+            if not f.endswith('.git') or mirror == self._mirror:
+                continue
+
+            lockfd = self.__openLock(mirror)
+
+            try:
+                try:
+                    fcntl.flock(lockfd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    continue
+
+                if not self.__loadUsers(mirror):
+                    self._info('Removing unused shared git mirror {0}'
+                               .format(mirror))
+                    self._pathutil.rmTree(mirror)
+                    self.__removeFile(mirror + '.users')
+            finally:
+                os.close(lockfd)
+
+    def __openLock(self, mirror):
+        os = self._os
+        return os.open(mirror + '.lock', os.O_WRONLY | os.O_CREAT, 0o600)
+
+    def __alternatesFile(self, cache_dir):
+        return self._ospath.join(cache_dir, 'objects', 'info', 'alternates')
+
+    def __isUser(self, mirror, cache_dir):
+        try:
+            with open(self.__alternatesFile(cache_dir), 'r') as f:
+                alternates = f.read().split("\n")
+        except (IOError, OSError):
+            return False
+
+        return self._ospath.join(mirror, 'objects') in alternates
+
+    def __loadUsers(self, mirror):
+        try:
+            users = self._pathutil.loadJSONConfig(mirror + '.users', [])
+        except ValueError:
+            users = []
+
+        return sorted(set(u for u in users if self.__isUser(mirror, u)))
+
+    def __saveUsers(self, mirror, users):
+        os = self._os
+        users_file = mirror + '.users'
+        users_tmp = '{0}.{1}.tmp'.format(users_file, os.getpid())
+
+        self._pathutil.writeJSONConfig(users_tmp, sorted(set(users)))
+        os.rename(users_tmp, users_file)
+
+    def __removeFile(self, file_name):
+        try:
+            self._os.unlink(file_name)
+        except OSError:
+            pass
@@ -0,0 +1,272 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+
+
+class IncrementalExtractor(LogMixIn, OnDemandMixIn):
+    """Package extraction reusing unchanged files of previous release.
+
+Files with the same checksum in .package.checksums of both releases
+are reflinked, if filesystem supports that, or hardlinked otherwise.
+Only changed files are written.
+
+Unlike GNU tar, symlinks are not deferred. So, links pointing outside
+of target and paths crossing already extracted symlinks are rejected
+regardless of tarfile extraction filter support.
+"""
+    CHECKSUMS_FILE = '.package.checksums'
+    FICLONE = 0x40049409
+    X_MASK = 0o110
+
+    def __init__(self, decompress_cmd, package, prev_dir):
+        self._decompress_cmd = decompress_cmd
+        self._package = package
+        self._prev_dir = prev_dir
+        self._can_reflink = True
+
+    def readChecksums(self):
+        """Get path to checksum map of new package or None.
+
+Only the first member is checked, so just the head of package gets
+decompressed. Packages with checksums elsewhere are left for plain
+extraction.
+"""
+        for (tar, member) in self.__members():
+            if self.__memberPath(member) == self.CHECKSUMS_FILE:
+                return self.__parseChecksums(
+                    tar.extractfile(member).read().decode('utf8'))
+
+            return None
+
+        return None
+
+    def extract(self, target, checksums):
+        """Extract package into target. Return list of reused files."""
+        os = self._os
+        ospath = self._ospath
+        tarfile = self._ext.tarfile
+        prev_dir = self._prev_dir
+
+        try:
+            with open(ospath.join(prev_dir, self.CHECKSUMS_FILE), 'r') as f:
+                prev_checksums = self.__parseChecksums(f.read())
+        except (IOError, OSError):
+            prev_checksums = {}
+
+        extract_args = {}
+
+        if hasattr(tarfile, 'tar_filter'):
+            extract_args['filter'] = 'tar'
+
+        reused = []
+        total = 0
+        symlinks = set()
+
+        for (tar, member) in self.__members():
+            path = self.__memberPath(member)
+
+            if path is None or not self.__isSafeMember(member, path, symlinks):
+                self._errorExit(
+                    'Unsafe path in package: {0}'.format(member.name))
+
+            if member.issym():
+                symlinks.add(path)
+
+            dst = ospath.join(target, path)
+
+            if member.isdir():
+                if not ospath.isdir(dst):
+                    os.makedirs(dst)
+
+                continue
+
+            if member.isreg():
+                total += 1
+                cs = checksums.get(path, None)
+
+                if (cs is not None and
+                        cs == prev_checksums.get(path, None) and
+                        self.__reuse(member, path, dst)):
+                    reused.append(dst)
+                    continue
+
+            tar.extract(member, target, **extract_args)
+
+        self._info('Reused {0} of {1} files from previous release'.format(
+            len(reused), total))
+        return reused
+
+    def __reuse(self, member, path, dst):
+        os = self._os
+        ospath = self._ospath
+        stat = self._ext.stat
+        src = ospath.join(self._prev_dir, path)
+
+        try:
+            st = os.lstat(src)
+        except OSError:
+            return False
+
+        if (not stat.S_ISREG(st.st_mode) or
+                st.st_size != member.size or
+                (st.st_mode & self.X_MASK) != (member.mode & self.X_MASK)):
+            return False
+
+        dst_dir = ospath.dirname(dst)
+
+        if not ospath.isdir(dst_dir):
+            os.makedirs(dst_dir)
+
+        if self._can_reflink and self.__reflink(src, dst, st):
+            return True
+
+        try:
+            os.link(src, dst)
+            return True
+        except OSError:
+            return False
+
+    def __reflink(self, src, dst, st):
+        os = self._os
+        errno = self._ext.errno
+
+        try:
+            fcntl = self._ext.fcntl
+            ioctl = fcntl.ioctl
+        except ImportError:
+            self._can_reflink = False
+            return False
+
+        src_fd = os.open(src, os.O_RDONLY)
+
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+
+            try:
+                ioctl(dst_fd, self.FICLONE, src_fd)
+            except (IOError, OSError) as e:
+                os.close(dst_fd)
+                os.unlink(dst)
+
+                if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                               errno.EINVAL, errno.ENOSYS):
+                    self._can_reflink = False
+
+                return False
+
+            os.fchmod(dst_fd, st.st_mode & 0o7777)
+            os.close(dst_fd)
+            os.utime(dst, (st.st_atime, st.st_mtime))
+            return True
+        finally:
+            os.close(src_fd)
+
+    def __members(self):
+        tarfile = self._ext.tarfile
+        subprocess = self._ext.subprocess
+
+        if self._decompress_cmd:
+            p = subprocess.Popen(
+                self._decompress_cmd + [self._package],
+                stdout=subprocess.PIPE,
+            )
+            fileobj = p.stdout
+        else:
+            p = None
+            fileobj = open(self._package, 'rb')
+
+        try:
+            tar = tarfile.open(fileobj=fileobj, mode='r|')
+
+            for member in tar:
+                yield (tar, member)
+
+            tar.close()
+        finally:
+            fileobj.close()
+
+            if p:
+                # early stop on readChecksums()
+                if p.poll() is None:
+                    p.terminate()
+
+                p.wait()
+
+        if p and p.returncode > 0:
+            raise subprocess.CalledProcessError(
+                p.returncode, self._decompress_cmd)
+
+    def __memberPath(self, member):
+        ospath = self._ospath
+        path = ospath.normpath(member.name)
+
+        if ospath.isabs(path) or path == '..' or path.startswith('..' + ospath.sep):
+            return None
+
+        return path
+
+    def __isSafeMember(self, member, path, symlinks):
+        # also, no write through symlink of the same name
+        if self.__crossesSymlink(path.split('/'), symlinks):
+            return False
+
+        if not member.issym() and not member.islnk():
+            return True
+        elif member.linkname.startswith('/'):
+            return False
+        elif member.issym():
+            base = path.split('/')[:-1]
+        else:
+            base = []
+
+        parts = []
+        via_symlink = False
+
+        for p in base + member.linkname.split('/'):
+            if p in ('', '.'):
+                continue
+            elif p != '..':
+                parts.append(p)
+                via_symlink = via_symlink or '/'.join(parts) in symlinks
+            elif parts and not via_symlink:
+                parts.pop()
+            else:
+                # outside of target or unknown place behind symlink
+                return False
+
+        # hardlinks are made by path, so any symlink is followed
+        return not (member.islnk() and via_symlink)
+
+    def __crossesSymlink(self, parts, symlinks):
+        for i in range(1, len(parts) + 1):
+            if '/'.join(parts[:i]) in symlinks:
+                return True
+
+        return False
+
+    def __parseChecksums(self, content):
+        ospath = self._ospath
+        res = {}
+
+        for line in content.split("\n"):
+            line = line.split('  ', 1)
+
+            if len(line) == 2:
+                res[ospath.normpath(line[1])] = line[0]
+
+        return res
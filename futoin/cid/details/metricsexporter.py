@@ -0,0 +1,135 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+from . import procstats
+
+
+class MetricsExporter(LogMixIn, OnDemandMixIn):
+    """Per-instance metrics of service master in Prometheus text format.
+
+The file is rewritten every UPDATE_INTERVAL seconds, so it can be
+picked up by node_exporter textfile collector or any other scraper.
+"""
+    UPDATE_INTERVAL = 15
+    METRICS_FILE = 'cid-metrics.prom'
+    METRIC_PREFIX = 'cid_instance_'
+
+    METRICS = (
+        ('up', 'gauge', 'Instance process is running'),
+        ('pid', 'gauge', 'Instance process ID'),
+        ('uptime_seconds', 'gauge', 'Time since instance start'),
+        ('restarts_total', 'counter', 'Instance restart count'),
+        ('last_exit_code', 'gauge', 'Exit code of previous instance process'),
+        ('rss_bytes', 'gauge', 'Resident memory of instance process tree'),
+        ('cpu_seconds_total', 'counter',
+         'CPU time of instance process tree'),
+        ('open_fds', 'gauge', 'Open file descriptors of instance process tree'),
+        ('max_memory_bytes', 'gauge', 'Allocated memory limit'),
+        ('max_connections', 'gauge', 'Allocated connection limit'),
+    )
+
+    def __init__(self, runtime_dir):
+        self._metrics_file = self._ospath.join(runtime_dir, self.METRICS_FILE)
+        self._next_update = 0
+
+    def update(self, now, svc_list):
+        """Rewrite metrics, if due. Return monotonic time of the next update."""
+        if now < self._next_update:
+            return self._next_update
+
+        self._next_update = now + self.UPDATE_INTERVAL
+
+        try:
+            procs = procstats.readProcs()
+            self._write(self.render(now, svc_list, procs))
+        except (IOError, OSError) as e:
+            self._warn('Failed to write metrics: {0}'.format(e))
+
+        return self._next_update
+
+    def render(self, now, svc_list, procs):
+        configutil = self._configutil
+        children = procstats.childMap(procs)
+        values = dict((m[0], []) for m in self.METRICS)
+
+        for svc in svc_list:
+            tune = svc['tune']
+            pid = svc['_pid']
+            labels = 'entry_point="{0}",instance_id="{1}"'.format(
+                svc['name'], svc['instanceId'])
+
+            if pid and pid in procs:
+                pids = procstats.treePids(pid, procs, children)
+                (rss, cpu) = procstats.treeUsage(pids, procs)
+                fds = procstats.openFds(pids)
+                uptime = now - svc['_forkAt']
+            else:
+                pid = rss = cpu = fds = uptime = 0
+
+            values['up'].append((labels, pid and 1 or 0))
+            values['pid'].append((labels, pid))
+            values['uptime_seconds'].append((labels, round(uptime, 3)))
+            values['restarts_total'].append(
+                (labels, max(svc['_starts'] - 1, 0)))
+            values['last_exit_code'].append(
+                (labels, self._exitCode(svc['_lastExitStatus'])))
+            values['rss_bytes'].append((labels, rss))
+            values['cpu_seconds_total'].append((labels, round(cpu, 3)))
+            values['open_fds'].append((labels, fds))
+
+            if 'maxMemory' in tune:
+                values['max_memory_bytes'].append(
+                    (labels, configutil.parseMemory(tune['maxMemory'])))
+
+            if 'maxConnections' in tune:
+                values['max_connections'].append(
+                    (labels, tune['maxConnections']))
+
+        res = []
+
+        for (metric, metric_type, help_text) in self.METRICS:
+            name = self.METRIC_PREFIX + metric
+            res.append('# HELP {0} {1}'.format(name, help_text))
+            res.append('# TYPE {0} {1}'.format(name, metric_type))
+
+            for (labels, v) in values[metric]:
+                res.append('{0}{{{1}}} {2}'.format(name, labels, v))
+
+        res.append('')
+        return "\n".join(res)
+
+    def _exitCode(self, status):
+        """Shell-like exit code of waitpid() status."""
+        os = self._os
+
+        if os.WIFSIGNALED(status):
+            return 128 + os.WTERMSIG(status)
+
+        return os.WEXITSTATUS(status)
+
+    def remove(self):
+        try:
+            self._os.remove(self._metrics_file)
+        except OSError:
+            pass
+
+    def _write(self, content):
+        os = self._os
+        tmp_file = '{0}.{1}.tmp'.format(self._metrics_file, os.getpid())
+        self._pathutil.writeTextFile(tmp_file, content)
+        os.rename(tmp_file, self._metrics_file)
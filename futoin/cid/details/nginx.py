@@ -252,6 +252,16 @@ class ConfigBuilder(LogMixIn, OnDemandMixIn):
         #---
         #conf['user'] = '{0} {1}'.format(deploy['user'], deploy['group'])
         conf['worker_processes'] = svc_tune['maxCpuCount']
+
+        cpus = svc_tune.get('cpuAffinity', None)
+
+        if cpus:
+            # one worker per core, rightmost mask digit is CPU0
+            width = max(cpus) + 1
+            conf['worker_processes'] = len(cpus)
+            conf['worker_cpu_affinity'] = ' '.join(
+                ('0' * (width - c - 1)) + '1' + ('0' * c) for c in cpus)
+
         conf.setdefault('error_log', 'stderr error')
         conf['worker_rlimit_nofile'] = svc_tune['maxFD']
         conf['daemon'] = 'off'
@@ -264,7 +274,7 @@ class ConfigBuilder(LogMixIn, OnDemandMixIn):
         #---
         events = conf.setdefault('events', OrderedDict())
         events['worker_connections'] = int(
-            svc_tune['maxFD'] // svc_tune['maxCpuCount'])
+            svc_tune['maxFD'] // conf['worker_processes'])
 
         # HTTP
         #---
@@ -371,6 +381,13 @@ class ConfigBuilder(LogMixIn, OnDemandMixIn):
             loc['gzip_static'] = 'on' if tune.get(
                 'staticGzip', False) else 'off'
 
+            # require third-party modules, so set only if enabled
+            if tune.get('staticBrotli', False):
+                loc['brotli_static'] = 'on'
+
+            if tune.get('staticZstd', False):
+                loc['zstd_static'] = 'on'
+
         for (prefix, info) in mounts.items():
 
             if not isinstance(info, dict):
@@ -0,0 +1,185 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+
+
+class _HashingReader(object):
+    __slots__ = ('_f', '_hasher')
+
+    def __init__(self, f, hasher):
+        self._f = f
+        self._hasher = hasher
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self._hasher.update(data)
+        return data
+
+
+class Packager(LogMixIn, OnDemandMixIn):
+    """Deterministic tar writer piping into external compressor.
+
+Entries are sorted and have fixed owner and modification time.
+SOURCE_DATE_EPOCH is respected, if set. Checksums are calculated while
+file data is streamed into archive, so each file is read once.
+
+Checksums are put as the first member, so they can be read without
+decompression of the whole package. For that, the rest of the archive
+is compressed into a temporary file first. Then, the checksums member
+is written as a separate leading compressed stream followed by the
+temporary file. Both xz and zstd decompress concatenated streams as
+a single one.
+"""
+    FORMATS = {
+        'txz': ('xz', ['-T0', '--block-size=25165824', '-6', '-c']),
+        'tzst': ('zstd', ['-T0', '-19', '-q', '-c']),
+    }
+
+    def __init__(self, compressor_bin, compressor_args):
+        self._compressor = [compressor_bin] + compressor_args
+
+    def create(self, package_file, package_content, exclude,
+               checksums_file=None):
+        os = self._os
+        tarfile = self._ext.tarfile
+
+        exclude = exclude + [package_file]
+
+        if checksums_file:
+            exclude.append(checksums_file)
+
+        mtime = int(self._environ.get('SOURCE_DATE_EPOCH', 0))
+        entries = self._hashutil.walkTree(package_content, exclude)
+        body_file = '{0}.{1}.tmp'.format(package_file, os.getpid())
+
+        try:
+            if not checksums_file:
+                with open(package_file, 'wb') as f_out:
+                    self.__compress(
+                        f_out, lambda out: self.__writeTar(out, entries, mtime))
+
+                return
+
+            checksums = []
+
+            with open(body_file, 'wb') as f_out:
+                self.__compress(f_out, lambda out: self.__writeTar(
+                    out, entries, mtime, checksums))
+
+            checksums.append('')
+
+            with open(checksums_file, 'w') as f:
+                f.write("\n".join(checksums))
+
+            with open(package_file, 'wb') as f_out:
+                self.__compress(f_out, lambda out: self.__writeLeading(
+                    out, checksums_file, mtime))
+
+                with open(body_file, 'rb') as f_in:
+                    self._ext.shutil.copyfileobj(f_in, f_out)
+        except:
+            try:
+                os.remove(package_file)
+            except OSError:
+                pass
+
+            raise
+        finally:
+            try:
+                os.remove(body_file)
+            except OSError:
+                pass
+
+    def __compress(self, f_out, write):
+        subprocess = self._ext.subprocess
+
+        p = subprocess.Popen(
+            self._compressor,
+            stdin=subprocess.PIPE,
+            stdout=f_out,
+        )
+
+        try:
+            write(p.stdin)
+        finally:
+            p.stdin.close()
+            returncode = p.wait()
+
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, self._compressor)
+
+    def __writeTar(self, out, entries, mtime, checksums=None):
+        tarfile = self._ext.tarfile
+
+        tar = tarfile.open(fileobj=out, mode='w|', format=tarfile.GNU_FORMAT)
+
+        for (path, t) in entries:
+            self.__addEntry(tar, path, t, mtime, checksums)
+
+        tar.close()
+
+    def __writeLeading(self, out, path, mtime):
+        """Write member without end of archive marker."""
+        tarfile = self._ext.tarfile
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        tarinfo = self.__setOwner(tarfile.TarInfo(path), mtime)
+        tarinfo.mode = self._os.stat(path).st_mode & 0o7777
+        tarinfo.size = len(data)
+
+        out.write(tarinfo.tobuf(tarfile.GNU_FORMAT))
+        out.write(data)
+        out.write(tarfile.NUL * (-len(data) % tarfile.BLOCKSIZE))
+
+    def __setOwner(self, tarinfo, mtime):
+        tarinfo.mtime = mtime
+        tarinfo.uid = 0
+        tarinfo.gid = 0
+        tarinfo.uname = ''
+        tarinfo.gname = ''
+        return tarinfo
+
+    def __addEntry(self, tar, path, t, mtime, checksums):
+        tarinfo = tar.gettarinfo(path)
+
+        if tarinfo is None:
+            self._warn('Skipping unsupported file type: {0}'.format(path))
+            return
+
+        self.__setOwner(tarinfo, mtime)
+
+        if not tarinfo.isreg():
+            tar.addfile(tarinfo)
+
+            # symlink to file, like other engines do
+            if checksums is not None and t == 'f' and self._ospath.isfile(path):
+                checksums.append("{0}  {1}".format(
+                    self._hashutil.fileDigest(path, 'sha512'), path))
+
+            return
+
+        with open(path, 'rb') as f:
+            if checksums is None:
+                tar.addfile(tarinfo, f)
+                return
+
+            hasher = self._ext.hashlib.sha512()
+            tar.addfile(tarinfo, _HashingReader(f, hasher))
+            checksums.append("{0}  {1}".format(hasher.hexdigest(), path))
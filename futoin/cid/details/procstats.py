@@ -0,0 +1,106 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Resource usage of process trees from Linux /proc."""
+
+from ..mixins.ondemand import OnDemandMixIn
+
+_PROC_DIR = '/proc'
+
+
+def isSupported():
+    return OnDemandMixIn._ext.ospath.exists('/proc/self/stat')
+
+
+def readProcs():
+    """Get pid -> (ppid, rss bytes, cpu seconds) of all processes."""
+    os = OnDemandMixIn._ext.os
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    clk_tck = float(os.sysconf('SC_CLK_TCK'))
+    res = {}
+
+    for pid in os.listdir(_PROC_DIR):
+        if not pid.isdigit():
+            continue
+
+        try:
+            with open('{0}/{1}/stat'.format(_PROC_DIR, pid), 'r') as f:
+                stat = f.read()
+        except (IOError, OSError):
+            # already gone
+            continue
+
+        # comm may contain spaces and parenthesis
+        stat = stat[stat.rfind(')') + 2:].split()
+        ticks = sum(int(v) for v in stat[11:15])
+        res[int(pid)] = (
+            int(stat[1]),
+            int(stat[21]) * page_size,
+            ticks / clk_tck,
+        )
+
+    return res
+
+
+def childMap(procs):
+    """Get ppid -> list of pid for result of readProcs()."""
+    children = {}
+
+    for (pid, p) in procs.items():
+        children.setdefault(p[0], []).append(pid)
+
+    return children
+
+
+def treePids(pid, procs, children):
+    """Get pid and all its live descendants."""
+    res = []
+    queue = [pid]
+
+    while queue:
+        p = queue.pop()
+
+        if p in procs:
+            res.append(p)
+            queue += children.get(p, [])
+
+    return res
+
+
+def treeUsage(pids, procs):
+    """Get (rss bytes, cpu seconds) summed for pids."""
+    rss = 0
+    cpu = 0.0
+
+    for p in pids:
+        info = procs[p]
+        rss += info[1]
+        cpu += info[2]
+
+    return (rss, cpu)
+
+
+def openFds(pids):
+    os = OnDemandMixIn._ext.os
+    res = 0
+
+    for p in pids:
+        try:
+            res += len(os.listdir('{0}/{1}/fd'.format(_PROC_DIR, p)))
+        except OSError:
+            pass
+
+    return res
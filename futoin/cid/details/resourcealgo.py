@@ -23,6 +23,14 @@ from collections import OrderedDict
 
 class ResourceAlgo(LogMixIn, OnDemandMixIn):
     CID_MIN_MEMORY = '48M'
+    CGROUP_ROOT = '/sys/fs/cgroup'
+    CGROUP_V1_MEMORY = '/sys/fs/cgroup/memory/memory.limit_in_bytes'
+    CGROUP_V1_CPUSET = '/sys/fs/cgroup/cpuset/cpuset.cpus'
+    CGROUP_V1_CPU_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+    USAGE_FILE = '.futoin.usage.json'
+    USAGE_PERCENTILE = 95
+    USAGE_MIN_SAMPLES = 12
+    USAGE_CPU_HEADROOM = 1.5
 
     def pageSize(self):
         return self._os.sysconf('SC_PAGE_SIZE')
@@ -37,12 +45,67 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
                 self._errorExit('Failed to detect system memory size')
 
     def cgroupMemory(self, cgroupFile=None):
-        cgroupFile = cgroupFile or '/sys/fs/cgroup/memory/memory.limit_in_bytes'
+        if cgroupFile:
+            return self._readCgroupLimit(cgroupFile)
 
-        if self._ospath.exists(cgroupFile):
-            return int(self._pathutil.readTextFile(cgroupFile).strip())
+        limit = self._readCgroupLimit(self.CGROUP_V1_MEMORY)
 
-        return None
+        if limit is not None:
+            return limit
+
+        for d in self._cgroupV2Dirs():
+            v2_limit = self._readCgroupLimit(
+                self._ospath.join(d, 'memory.max'))
+
+            if v2_limit is not None and (limit is None or v2_limit < limit):
+                limit = v2_limit
+
+        return limit
+
+    def _readCgroupLimit(self, cgroupFile):
+        if not self._ospath.exists(cgroupFile):
+            return None
+
+        val = self._pathutil.readTextFile(cgroupFile).strip()
+
+        # cgroup v2 has no limit
+        if val == 'max':
+            return None
+
+        return int(val)
+
+    def _cgroupV2Dirs(self):
+        """Unified cgroup folder of current process and its parents."""
+        ospath = self._ospath
+        root = self.CGROUP_ROOT
+
+        if not ospath.exists(ospath.join(root, 'cgroup.controllers')):
+            return []
+
+        path = '/'
+
+        try:
+            for l in self._pathutil.readTextFile('/proc/self/cgroup').split("\n"):
+                if l.startswith('0::'):
+                    path = l[3:].strip() or '/'
+                    break
+        except (IOError, OSError):
+            pass
+
+        res = []
+
+        while True:
+            d = ospath.join(root, path.lstrip('/'))
+
+            if ospath.isdir(d):
+                res.append(d)
+
+            if path == '/':
+                break
+
+            path = ospath.dirname(path)
+
+        return res
 
     def memoryLimit(self, config):
         maxTotalMemory = config.get('deploy', {}).get('maxTotalMemory', None)
@@ -66,24 +129,89 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
         return min(os.sysconf('SC_NPROCESSORS_ONLN'), os.sysconf('SC_NPROCESSORS_CONF'))
 
     def cgroupCpuCount(self, cgroupFile=None):
-        cgroupFile = cgroupFile or '/sys/fs/cgroup/cpuset/cpuset.cpus'
+        cpus = self.cgroupCpuSet(cgroupFile)
 
-        if not self._ospath.exists(cgroupFile):
+        if cpus is None:
+            return None
+
+        return len(cpus)
+
+    def cgroupCpuSet(self, cgroupFile=None):
+        ospath = self._ospath
+
+        if not cgroupFile:
+            cgroupFile = self.CGROUP_V1_CPUSET
+
+            for d in self._cgroupV2Dirs():
+                f = ospath.join(d, 'cpuset.cpus.effective')
+
+                if ospath.exists(f):
+                    cgroupFile = f
+                    break
+
+        if not ospath.exists(cgroupFile):
             return None
 
         cpus = self._pathutil.readTextFile(cgroupFile).strip()
-        cpus = cpus.split(',')
-        count = 0
 
-        for c in cpus:
+        if not cpus:
+            return None
+
+        res = []
+
+        for c in cpus.split(','):
             c = c.split('-')
 
             if len(c) == 2:
-                count += len(range(int(c[0]), int(c[1]) + 1))
+                res += range(int(c[0]), int(c[1]) + 1)
+            else:
+                res.append(int(c[0]))
+
+        return res
+
+    def cgroupCpuQuota(self, cgroupFile=None):
+        """CPU count rounded up from CFS quota, if any."""
+        import math
+        ospath = self._ospath
+
+        if cgroupFile:
+            quota_files = [cgroupFile]
+        else:
+            quota_files = [ospath.join(d, 'cpu.max')
+                           for d in self._cgroupV2Dirs()]
+            quota_files.append(self.CGROUP_V1_CPU_QUOTA)
+
+        res = None
+
+        for f in quota_files:
+            if not ospath.exists(f):
+                continue
+
+            quota = self._pathutil.readTextFile(f).split()
+
+            if len(quota) == 2:
+                # cgroup v2: "<quota|max> <period>"
+                (quota, period) = quota
             else:
-                count += 1
+                quota = quota[0]
+                period_file = ospath.join(
+                    ospath.dirname(f), 'cpu.cfs_period_us')
+
+                if not ospath.exists(period_file):
+                    continue
+
+                period = self._pathutil.readTextFile(period_file)
+
+            if quota == 'max' or int(quota) <= 0:
+                continue
+
+            count = int(math.ceil(float(quota) / int(period)))
+            count = max(count, 1)
+
+            if res is None or count < res:
+                res = count
 
-        return count
+        return res
 
     def cpuLimit(self, config):
         maxCpuCount = config.get('deploy', {}).get('maxCpuCount', None)
@@ -92,12 +220,26 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
             return maxCpuCount
 
         cpu_count = self.systemCpuCount()
-        cgroup_count = self.cgroupCpuCount()
 
-        if cgroup_count:
-            return min(cpu_count, cgroup_count)
-        else:
-            return cpu_count
+        for c in (self.cgroupCpuCount(), self.cgroupCpuQuota()):
+            if c:
+                cpu_count = min(cpu_count, c)
+
+        return cpu_count
+
+    def availableCpus(self):
+        """IDs of CPU cores the current process may run on."""
+        os = self._os
+
+        if hasattr(os, 'sched_getaffinity'):
+            return sorted(os.sched_getaffinity(0))
+
+        cpus = self.cgroupCpuSet()
+
+        if cpus:
+            return cpus
+
+        return list(range(self.systemCpuCount()))
 
     def configServices(self, config):
         memLimit = self.memoryLimit(config)
@@ -126,6 +268,10 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
         external_services = env.get('externalServices', [])
         cid_min_memory = configutil.parseMemory(
             self.CID_MIN_MEMORY) // granularity
+        usage = {}
+
+        if deploy.get('usageFeedback', False):
+            usage = self.observedUsage(config)
 
         # Init
         for (en, ei) in entryPoints.items():
@@ -163,6 +309,9 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
             if (not ei['scalable']) and ei['maxMemory'] < ei['maxTotalMemory']:
                 ei['maxTotalMemory'] = ei['maxMemory']
 
+            if en in usage:
+                ei['memWeight'] = max(1, usage[en]['totalRss'] // granularity)
+
             ei['instances'] = 1
             ei['memAlloc'] = max(ei['minMemory'], cid_min_memory)
 
@@ -240,6 +389,19 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
                 else:
                     ei['instances'] = min(2, possible_instances)
 
+                if en in usage:
+                    needed = int(math.ceil(
+                        usage[en]['cpu'] * self.USAGE_CPU_HEADROOM))
+
+                    # non-reloadable needs spare instance for restarts
+                    if not ei['reloadable']:
+                        needed = max(needed, 2)
+
+                    # each instance must fit its observed peak
+                    rss = max(1, usage[en]['rss'] // granularity)
+                    ei['instances'] = max(1, min(
+                        ei['instances'], needed, ei['memAlloc'] // rss))
+
                 ei['maxCpuCount'] = 1
 
             ei['instances'] = min(ei['instances'], ei.get(
@@ -282,6 +444,70 @@ class ResourceAlgo(LogMixIn, OnDemandMixIn):
 
             autoServices[en] = instances
 
+        if deploy.get('cpuAffinity', False):
+            self.planCpuAffinity(autoServices, maxcpu)
+
+    def observedUsage(self, config):
+        """Percentiles of usage history recorded by service master.
+
+Result is empty, unless all entry points have enough samples as
+weights must be of the same origin.
+"""
+        from .usagesampler import UsageSampler
+
+        history = UsageSampler.loadHistory(self._ospath.join(
+            config['deployDir'], self.USAGE_FILE))
+        env = config.get('env', {})
+        external_services = env.get('externalServices', [])
+        res = {}
+
+        for (en, ei) in config.get('entryPoints', {}).items():
+            if ei['tool'] in external_services:
+                continue
+
+            samples = history.get(en, [])
+
+            if len(samples) < self.USAGE_MIN_SAMPLES:
+                if history:
+                    self._info(
+                        'Not enough usage history of "{0}" to adapt'.format(en))
+
+                return {}
+
+            res[en] = {
+                'totalRss': self._percentile([v[2] for v in samples]),
+                'rss': self._percentile([v[3] for v in samples]),
+                'cpu': self._percentile([v[4] for v in samples]),
+            }
+
+        return res
+
+    def _percentile(self, values):
+        values = sorted(values)
+        idx = (len(values) * self.USAGE_PERCENTILE + 99) // 100
+        return values[max(idx - 1, 0)]
+
+    def planCpuAffinity(self, autoServices, maxcpu):
+        """Assign CPU cores to instances as "cpuAffinity" list.
+
+Core sets are disjoint while there are enough cores, otherwise
+assignment wraps around to load cores evenly.
+"""
+        cpus = self.availableCpus()[:int(maxcpu)]
+        cpu_count = len(cpus)
+        pos = 0
+
+        if not cpu_count:
+            return
+
+        for en in sorted(autoServices.keys()):
+            for ic in autoServices[en]:
+                count = min(int(ic['maxCpuCount']), cpu_count)
+                ic['cpuAffinity'] = [
+                    cpus[(pos + i) % cpu_count] for i in range(count)
+                ]
+                pos = (pos + count) % cpu_count
+
     def assignSockets(self, config):
         port = 1025
         ports = set()
@@ -0,0 +1,89 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.ondemand import OnDemandMixIn
+
+# Master exits by itself, if cid gets killed before closeAll()
+_CONTROL_PERSIST = 60
+
+_masters = {}
+_masters_lock = OnDemandMixIn._ext.threading.Lock()
+_control_dir = []
+
+
+def controlOptions(env, user_host, port):
+    """Get ssh/scp options to run over shared master connection.
+
+Master connection to user@host:port is started on first use and is
+kept for the life of process. Control sockets are placed in private
+temporary folder.
+"""
+    key = (env['sshBin'], user_host, port)
+
+    with _masters_lock:
+        control_path = _masters.get(key, None)
+
+        if control_path is None:
+            control_path = _startMaster(env, user_host, port)
+            _masters[key] = control_path
+
+    return [
+        '-o', 'ControlMaster=no',
+        '-o', 'ControlPath={0}'.format(control_path),
+    ]
+
+
+def closeAll():
+    ext = OnDemandMixIn._ext
+
+    with _masters_lock:
+        while _masters:
+            ((ssh_bin, user_host, port), control_path) = _masters.popitem()
+            ext.executil.callExternal([
+                ssh_bin,
+                '-o', 'ControlPath={0}'.format(control_path),
+                '-O', 'exit',
+                user_host,
+            ], suppress_fail=True)
+
+        if _control_dir:
+            ext.pathutil.rmTree(_control_dir.pop(), verbose=False)
+
+
+def _startMaster(env, user_host, port):
+    ext = OnDemandMixIn._ext
+
+    if not _control_dir:
+        ext.atexit.register(closeAll)
+        _control_dir.append(ext.tempfile.mkdtemp(prefix='cid-ssh-'))
+
+    # Keep it short due to unix socket path limit
+    control_path = ext.ospath.join(_control_dir[0], str(len(_masters)))
+
+    ext.executil.callExternal([
+        env['sshBin'],
+        '-fNTq',
+        '-o', 'BatchMode=yes',
+        '-o', 'StrictHostKeyChecking={0}'.format(
+            env['sshStrictHostKeyChecking']),
+        '-o', 'ControlMaster=yes',
+        '-o', 'ControlPath={0}'.format(control_path),
+        '-o', 'ControlPersist={0}'.format(_CONTROL_PERSIST),
+        '-p', port,
+        user_host,
+    ])
+
+    return control_path
@@ -0,0 +1,139 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+from . import procstats
+
+
+class UsageSampler(LogMixIn, OnDemandMixIn):
+    """Rolling history of actual resource usage per entry point.
+
+RSS and CPU time of each instance process tree are read from /proc
+every SAMPLE_INTERVAL seconds. Once in FLUSH_INTERVAL, the window is
+appended to history file as [time, instances, total RSS, max instance
+RSS, CPU cores] per entry point. RSS is the peak of window, CPU is
+the average.
+"""
+    SAMPLE_INTERVAL = 30
+    FLUSH_INTERVAL = 300
+    HISTORY_SIZE = 2016
+
+    def __init__(self, history_file):
+        self._history_file = history_file
+        self._next_sample = 0
+        self._next_flush = None
+        self._window = {}
+        self._last_cpu = {}
+
+    def sample(self, now, svc_list):
+        """Take sample, if due. Return monotonic time of the next one."""
+        if now < self._next_sample:
+            return self._next_sample
+
+        self._next_sample = now + self.SAMPLE_INTERVAL
+
+        if self._next_flush is None:
+            self._next_flush = now + self.FLUSH_INTERVAL
+
+        try:
+            procs = procstats.readProcs()
+        except (IOError, OSError) as e:
+            self._warn('Failed to sample resource usage: {0}'.format(e))
+            return self._next_sample
+
+        children = procstats.childMap(procs)
+
+        last_cpu = {}
+        usage = {}
+
+        for svc in svc_list:
+            pid = svc['_pid']
+
+            if not pid or pid not in procs:
+                continue
+
+            (rss, cpu) = procstats.treeUsage(
+                procstats.treePids(pid, procs, children), procs)
+            key = (svc['name'], svc['instanceId'])
+            ep_usage = usage.setdefault(svc['name'], [0, 0, 0, 0.0, False])
+            ep_usage[0] += 1
+            ep_usage[1] += rss
+            ep_usage[2] = max(ep_usage[2], rss)
+
+            prev = self._last_cpu.get(key, None)
+            last_cpu[key] = (pid, now, cpu)
+
+            if prev and prev[0] == pid and now > prev[1]:
+                ep_usage[3] += max(0, cpu - prev[2]) / (now - prev[1])
+                ep_usage[4] = True
+
+        self._last_cpu = last_cpu
+
+        for (name, ep_usage) in usage.items():
+            window = self._window.setdefault(name, [0, 0, 0, 0.0, 0])
+            window[0] = max(window[0], ep_usage[0])
+            window[1] = max(window[1], ep_usage[1])
+            window[2] = max(window[2], ep_usage[2])
+
+            if ep_usage[4]:
+                window[3] += ep_usage[3]
+                window[4] += 1
+
+        if now >= self._next_flush:
+            self._next_flush = now + self.FLUSH_INTERVAL
+            self.flush()
+
+        return self._next_sample
+
+    def flush(self):
+        if not self._window:
+            return
+
+        window = self._window
+        self._window = {}
+        ts = int(self._ext.time.time())
+
+        try:
+            history = self.loadHistory(self._history_file)
+
+            for (name, w) in window.items():
+                samples = history.setdefault(name, [])
+                samples.append([ts, w[0], w[1], w[2],
+                                round(w[3] / max(w[4], 1), 3)])
+                del samples[:-self.HISTORY_SIZE]
+
+            self._saveHistory(history)
+        except (IOError, OSError) as e:
+            self._warn('Failed to save resource usage: {0}'.format(e))
+
+    @classmethod
+    def loadHistory(cls, history_file):
+        try:
+            with open(history_file, 'r') as f:
+                return cls._ext.json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _saveHistory(self, history):
+        os = self._os
+        history_file = self._history_file
+        tmp_file = '{0}.{1}.tmp'.format(history_file, os.getpid())
+
+        with open(tmp_file, 'w') as f:
+            self._ext.json.dump(history, f)
+
+        os.rename(tmp_file, history_file)
@@ -0,0 +1,231 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.log import LogMixIn
+from ..mixins.ondemand import OnDemandMixIn
+
+_sessions = {}
+
+
+def getSession(session_class, vcs_bin, repo_dir):
+    """Get persistent session for repository, start on first query."""
+    repo_dir = OnDemandMixIn._ext.ospath.realpath(repo_dir)
+    key = (session_class, vcs_bin, repo_dir)
+    session = _sessions.get(key, None)
+
+    if session is None:
+        if not _sessions:
+            OnDemandMixIn._ext.atexit.register(closeAll)
+
+        session = session_class(vcs_bin, repo_dir)
+        _sessions[key] = session
+
+    return session
+
+
+def forgetSession(repo_dir):
+    """Close sessions of repository which gets removed."""
+    repo_dir = OnDemandMixIn._ext.ospath.realpath(repo_dir)
+
+    for key in list(_sessions.keys()):
+        if key[2] == repo_dir:
+            _sessions.pop(key).close()
+
+
+def closeAll():
+    while _sessions:
+        _sessions.popitem()[1].close()
+
+
+class VcsSession(LogMixIn, OnDemandMixIn):
+    def __init__(self, vcs_bin, repo_dir):
+        self._vcs_bin = vcs_bin
+        self._repo_dir = repo_dir
+        self._proc = None
+
+    def close(self):
+        p = self._proc
+
+        if p is None:
+            return
+
+        self._proc = None
+
+        try:
+            p.stdin.close()
+        except (IOError, OSError):
+            pass
+
+        p.wait()
+        p.stdout.close()
+
+    def _start(self, cmd):
+        if self._proc is None:
+            subprocess = self._ext.subprocess
+            self._proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=self._executil.devNull(),
+                close_fds=True,
+            )
+
+        return self._proc
+
+    def _broken(self, cmd):
+        p = self._proc
+        self.close()
+        raise self._ext.subprocess.CalledProcessError(
+            p and p.returncode or 1, cmd)
+
+
+class GitSession(VcsSession):
+    """Persistent "git cat-file --batch-check" process for ref queries.
+
+Git config is listed once and cached until resetConfig().
+"""
+
+    def __init__(self, vcs_bin, repo_dir):
+        super(GitSession, self).__init__(vcs_bin, repo_dir)
+        self._config = None
+
+    def resolve(self, name):
+        """Get object id of name or None, if missing."""
+        cmd = [
+            self._vcs_bin,
+            '--git-dir={0}'.format(self._repo_dir),
+            'cat-file', '--batch-check',
+        ]
+
+        if "\n" in name:
+            return None
+
+        p = self._start(cmd)
+
+        try:
+            p.stdin.write((name + "\n").encode('utf8'))
+            p.stdin.flush()
+            res = p.stdout.readline().decode('utf8')
+        except (IOError, OSError):
+            res = ''
+
+        if not res:
+            self._broken(cmd)
+
+        res = res.strip()
+
+        # <name> missing, <name> ambiguous
+        if res == '{0} missing'.format(name) or res == '{0} ambiguous'.format(name):
+            return None
+
+        return res.split()[0]
+
+    def config(self, key):
+        if self._config is None:
+            res = self._executil.callExternal([
+                self._vcs_bin,
+                '--git-dir={0}'.format(self._repo_dir),
+                'config', '--list', '-z',
+            ], verbose=False)
+
+            self._config = {}
+
+            for entry in res.split("\0"):
+                if entry:
+                    entry = entry.split("\n", 1)
+                    self._config[entry[0]] = len(entry) > 1 and entry[1] or ''
+
+        return self._config.get(key, None)
+
+    def resetConfig(self):
+        self._config = None
+
+
+class HgSession(VcsSession):
+    """Mercurial command server for read-only queries.
+
+Commands get run in the same process through "runcommand" of
+"hg serve --cmdserver pipe" protocol.
+"""
+
+    def run(self, args):
+        """Get output of hg command. Fail like executil.callExternal()."""
+        struct = self._ext.struct
+        cmd = [
+            self._vcs_bin,
+            '--repository', self._repo_dir,
+            'serve', '--cmdserver', 'pipe',
+        ]
+        new_proc = self._proc is None
+        p = self._start(cmd)
+
+        try:
+            if new_proc:
+                # hello message
+                self.__readChannel(p, cmd)
+
+            data = "\0".join(args).encode('utf8')
+            p.stdin.write(b'runcommand\n' +
+                          struct.pack('>I', len(data)) + data)
+            p.stdin.flush()
+        except (IOError, OSError):
+            self._broken(cmd)
+
+        out = []
+
+        while True:
+            (ch, data) = self.__readChannel(p, cmd)
+
+            if ch == b'o':
+                out.append(data)
+            elif ch == b'r':
+                res = struct.unpack('>i', data)[0]
+                break
+            elif ch in (b'I', b'L'):
+                # no input is available
+                p.stdin.write(struct.pack('>I', 0))
+                p.stdin.flush()
+            elif ch.isupper():
+                self._broken(cmd)
+
+        out = b''.join(out).decode('utf8')
+
+        if res != 0:
+            raise self._ext.subprocess.CalledProcessError(
+                res, [self._vcs_bin] + args, out)
+
+        return out
+
+    def __readChannel(self, p, cmd):
+        struct = self._ext.struct
+
+        header = p.stdout.read(5)
+
+        if len(header) != 5:
+            self._broken(cmd)
+
+        ch = header[0:1]
+        size = struct.unpack('>I', header[1:])[0]
+
+        if ch in (b'I', b'L'):
+            return (ch, size)
+
+        data = p.stdout.read(size)
+
+        if len(data) != size:
+            self._broken(cmd)
+
+        return (ch, data)
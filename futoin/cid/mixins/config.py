@@ -40,6 +40,9 @@ class ConfigMixIn(DataSlots):
         ('package', list),
         ('packageGzipStatic', bool),
         ('packageChecksums', bool),
+        ('packageChecksumsCache', bool),
+        ('packageFormat', __str_type),
+        ('packageEngine', __str_type),
         ('persistent', list),
         ('entryPoints', dict),
         ('configenv', dict),
@@ -61,6 +64,10 @@ class ConfigMixIn(DataSlots):
         ('reloadable', bool),
         ('multiCore', bool),
         ('exitTimeoutMS', int),
+        ('reloadBatch', 'batch'),
+        ('readyTimeoutMS', int),
+        ('readyProbe', 'probe'),
+        ('socketActivation', bool),
         ('cpuWeight', 'weight'),
         ('memWeight', 'weight'),
         ('instances', int),
@@ -78,6 +85,10 @@ class ConfigMixIn(DataSlots):
         ('pluginPacks', list),
         ('externalSetup', (bool,) + __str_type),
         ('externalServices', list),
+        ('rmsParallel', int),
+        ('artifactCacheSize', __str_type),
+        ('artifactCacheDays', int),
+        ('toolInstallParallel', int),
     ])
 
     __slots__ = ()
@@ -109,6 +120,10 @@ class ConfigMixIn(DataSlots):
                 5]
 
     def _initConfig(self, startup=False):
+        with self._ext.tracing.span('cid', 'initConfig'):
+            self.__initConfig(startup)
+
+    def __initConfig(self, startup):
         ospath = self._ospath
         os = self._os
 
@@ -361,6 +376,13 @@ class ConfigMixIn(DataSlots):
         if tools and 'futoin' not in tools:
             tools['futoin'] = True
 
+        #---
+        if config.get('packageFormat', 'txz') not in ('txz', 'tzst'):
+            errors.append('Package format must be either "txz" or "tzst"')
+
+        if config.get('packageEngine', 'native') not in ('native', 'tar'):
+            errors.append('Package engine must be either "native" or "tar"')
+
         #---
         entry_points = config.get('entryPoints', None)
 
@@ -406,6 +428,21 @@ class ConfigMixIn(DataSlots):
                             errors.append(
                                 'Weight value "{0}/{1}" must be positive'.format(en, tk))
 
+                    elif tt == 'probe':
+                        if not isinstance(tv, self.__str_type) or tv[:1] != '/':
+                            errors.append(
+                                'Probe value "{0}/{1}" must be HTTP path '
+                                '(e.g. "/health")'.format(en, tk))
+
+                    elif tt == 'batch':
+                        try:
+                            self._configutil.parseBatch(tv, 1)
+                        except ValueError:
+                            errors.append(
+                                'Batch value "{0}/{1}" must be positive '
+                                'integer or percentage (e.g. "25%")'
+                                .format(en, tk))
+
                     elif not isinstance(tv, tt):
                         errors.append(
                             'Config tune variable "{0}" type "{1}" is not instance of "{2}"'
@@ -428,6 +465,10 @@ class ConfigMixIn(DataSlots):
                 errors.append(
                     '"deploy/maxCpuCount" must be a positive integer')
 
+        for f in ('cpuAffinity', 'usageFeedback', 'exportMetrics'):
+            if not isinstance(deploy.get(f, False), bool):
+                errors.append('"deploy/{0}" must be boolean'.format(f))
+
     def __sanitizeMemory(self, key, val, errors):
         try:
             self._configutil.parseMemory(val)
@@ -444,6 +485,10 @@ class ConfigMixIn(DataSlots):
         env.setdefault('pluginPacks', [])
         env.setdefault('externalSetup', False)
         env.setdefault('externalServices', [])
+        env.setdefault('rmsParallel', 4)
+        env.setdefault('artifactCacheSize', '4G')
+        env.setdefault('artifactCacheDays', 30)
+        env.setdefault('toolInstallParallel', 4)
 
         timeouts = env.setdefault('timeouts', {})
         timeouts.setdefault('connect', 10)
@@ -467,13 +512,33 @@ class ConfigMixIn(DataSlots):
 
                 self._errorExit(
                     'Config variable "{0}" type "{1}" is not instance of "{2}"'
-                    .format(k, v.__class__.__name__, req_t[0].__name__)
+                    .format(k, v.__class__.__name__, req_t.__name__)
                 )
 
         if env['type'] not in ('prod', 'test', 'dev'):
             self._errorExit(
                 'Not valid environment type "{0}'.format(env['type']))
 
+        if env['rmsParallel'] < 1:
+            self._errorExit('Config variable "rmsParallel" must be positive')
+
+        if env['toolInstallParallel'] < 1:
+            self._errorExit(
+                'Config variable "toolInstallParallel" must be positive')
+
+        if env['artifactCacheDays'] < 1:
+            self._errorExit(
+                'Config variable "artifactCacheDays" must be positive')
+
+        # "0" disables artifact cache
+        if env['artifactCacheSize'] != '0':
+            errors = []
+            self.__sanitizeMemory('artifactCacheSize',
+                                  env['artifactCacheSize'], errors)
+
+            if errors:
+                self._errorExit(errors[0])
+
     def _processWcDir(self):
         ospath = self._ospath
         os = self._os
@@ -40,13 +40,13 @@ class DataSlots(OnDemandMixIn):
 
         # ToolMixIn
         '_tool_impl',
+        '_tool_meta',
 
         '_lastPackages',
 
         # ServiceMixIn
         '_running',
         '_reload_services',
-        '_interruptable',
     )
 
     _FUTOIN_JSON = 'futoin.json'
@@ -21,6 +21,13 @@ class DeployMixIn(DataSlots):
     __slots__ = ()
 
     __VCS_CACHE_DIR = 'vcs'
+    __DECOMPRESSORS = {
+        '.txz': 'xz',
+        '.tzst': 'zstd',
+        '.tbz2': 'bzip2',
+        '.tgz': 'gzip',
+        '.tar': None,
+    }
 
     def __init__(self):
         super(DeployMixIn, self).__init__()
@@ -71,9 +78,10 @@ class DeployMixIn(DataSlots):
         if not ospath.exists(package_basename):
             self._info('Retrieving the package')
             package_list = [package]
+            hashes = rmstool.rmsPackageHashes(package_list)
             package_list = rmstool.rmsProcessChecksums(
                 config, rms_pool, package_list)
-            rmstool.rmsRetrieve(config, rms_pool, package_list)
+            rmstool.rmsRetrieve(config, rms_pool, package_list, hashes)
 
         package_noext_tmp = package_noext + '.tmp'
 
@@ -83,11 +91,23 @@ class DeployMixIn(DataSlots):
         # Unpack package to temporary folder
         self._info('Extracting the package')
         env = config['env']
+        reused = None
 
-        if package_ext == '.txz':
+        if config.get('deployIncremental', False):
+            reused = self.__incrementalExtract(
+                package_basename, package_ext, package_noext_tmp)
+
+        if reused is not None:
+            pass
+        elif package_ext == '.txz':
             tar_tool = self._getTarTool('xz')
             tar_args = ['xJf', package_basename, '-C', package_noext_tmp]
             tar_tool.onExec(env, tar_args, False)
+        elif package_ext == '.tzst':
+            tar_tool = self._getTarTool('zstd')
+            tar_args = ['-x', '--use-compress-program=' + env['zstdBin'],
+                        '-f', package_basename, '-C', package_noext_tmp]
+            tar_tool.onExec(env, tar_args, False)
         elif package_ext == '.tbz2':
             tar_tool = self._getTarTool('bzip2')
             tar_args = ['xjf', package_basename, '-C', package_noext_tmp]
@@ -104,7 +124,44 @@ class DeployMixIn(DataSlots):
             self._errorExit('Not supported package format: ' + package_ext)
 
         # Common processing
-        self._deployCommon(package_noext_tmp, package_noext, [package])
+        self._deployCommon(package_noext_tmp, package_noext, [package],
+                           reused)
+
+    def __incrementalExtract(self, package, package_ext, target):
+        ospath = self._ospath
+        env = self._config['env']
+
+        if not ospath.exists('current'):
+            self._info('No previous release for incremental deploy')
+            return None
+
+        # hardlinked files must not be modified in place
+        if self._config.get('deployBuild', False):
+            self._warn('Incremental deploy is not compatible with --build')
+            return None
+
+        try:
+            compressor = self.__DECOMPRESSORS[package_ext]
+        except KeyError:
+            return None
+
+        if compressor:
+            self._getTool(compressor).requireInstalled(env)
+            decompress_cmd = [env[compressor + 'Bin'], '-dc']
+        else:
+            decompress_cmd = None
+
+        from ..details.incremental import IncrementalExtractor
+
+        extractor = IncrementalExtractor(
+            decompress_cmd, package, ospath.realpath('current'))
+        checksums = extractor.readChecksums()
+
+        if checksums is None:
+            self._warn('Package has no leading checksums for incremental deploy')
+            return None
+
+        return extractor.extract(target, checksums)
 
     def _vcsref_deploy(self, vcs_ref):
         self._requireDeployLock()
@@ -192,7 +249,7 @@ class DeployMixIn(DataSlots):
     def _deploy_setup(self):
         self._deployConfig()
 
-    def _deployCommon(self, tmp, dst, cleanup_whitelist):
+    def _deployCommon(self, tmp, dst, cleanup_whitelist, reused=None):
         self._requireDeployLock()
 
         ospath = self._ospath
@@ -277,7 +334,9 @@ class DeployMixIn(DataSlots):
 
         file_perm = stat.S_IRUSR | stat.S_IRGRP
         dir_perm = file_perm | stat.S_IXUSR | stat.S_IXGRP
-        self._pathutil.chmodTree(tmp, dir_perm, file_perm, True)
+        # Note: reused files of previous release are read-only already
+        self._pathutil.chmodTree(tmp, dir_perm, file_perm, True,
+                                 set(reused or []), parallel=True)
 
         # Setup services
         self._deployConfig()
@@ -325,7 +384,7 @@ class DeployMixIn(DataSlots):
             if f[0] == '.' or f in whitelist:
                 continue
 
-            self._pathutil.rmTree(f)
+            self._pathutil.rmTree(f, parallel=True)
 
     def _deployConfig(self):
         self._requireDeployLock()
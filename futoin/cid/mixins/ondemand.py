@@ -76,6 +76,15 @@ _ext_demand_map = {
     'resource': 'resource',
     'binascii': 'binascii',
     'platform': 'platform',
+    'mmap': 'mmap',
+    'tarfile': 'tarfile',
+    'threading': 'threading',
+    'select': 'select',
+    'socket': 'socket',
+    'struct': 'struct',
+    'atexit': 'atexit',
+    'multiprocessing': 'multiprocessing',
+    'threadpool': ('multiprocessing.pool', 'ThreadPool'),
     #
     'os': 'os',
     'ospath': 'os.path',
@@ -89,12 +98,20 @@ _ext_demand_map = {
     'configutil': '.util.configutil',
     'phputil': '.util.phputil',
     'github': '.util.github',
+    'hashutil': '.util.hashutil',
+    'precompress': '.util.precompress',
+    'httputil': '.util.httputil',
+    'artifactcache': '.util.artifactcache',
+    'tracing': '.util.tracing',
+    'log': '.util.log',
 }
 
 if sys.version_info >= (3, 0):
     _ext_demand_map['urllib'] = 'urllib.request'
+    _ext_demand_map['urlparse'] = 'urllib.parse'
 else:
     _ext_demand_map['urllib'] = 'urllib2'
+    _ext_demand_map['urlparse'] = 'urlparse'
 
 ext = tailor_ondemand(_ext_demand_map)()
 
@@ -111,6 +128,8 @@ _cid_demand_map = {
     '_versionutil': '.util.versionutil',
     '_configutil': '.util.configutil',
     '_phputil': '.util.phputil',
+    '_hashutil': '.util.hashutil',
+    '_httputil': '.util.httputil',
 }
 
 
@@ -17,14 +17,6 @@
 from .data import DataSlots
 
 
-class TimeoutException(RuntimeError):
-    __slots__ = ()
-
-    @classmethod
-    def alarmHandler(cls, *args, **kwargs):
-        raise TimeoutException('Alarm')
-
-
 class ServiceMixIn(DataSlots):
     __slots__ = ()
 
@@ -113,6 +105,19 @@ class ServiceMixIn(DataSlots):
             print("\t".join([svc['name'], str(svc['instanceId']),
                              socket_type, socket_addr]))
 
+    def __setCpuAffinity(self, svc):
+        cpus = svc['tune'].get('cpuAffinity', None)
+        os = self._os
+
+        if not cpus or not hasattr(os, 'sched_setaffinity'):
+            return
+
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            self._warn('Failed to set CPU affinity of "{0}:{1}": {2}'.format(
+                svc['name'], svc['instanceId'], e))
+
     def _serviceCommon(self, entry_point, instance_id):
         config = self._config
         entry_points = config.get('entryPoints', {})
@@ -142,36 +147,213 @@ class ServiceMixIn(DataSlots):
         return res
 
     def _serviceStop(self, svc, toolImpl, pid):
+        from ..details.childwatcher import ChildWatcher
+
+        svc = dict(svc)
+        svc['toolImpl'] = toolImpl
+
+        watcher = ChildWatcher()
+        watcher.open({})
+
+        try:
+            self.__stopServices(watcher, [(svc, pid)], {})
+        finally:
+            watcher.close()
+
+    def __stopServices(self, watcher, stop_list, pid_to_svc, on_exit=None):
+        """Stop services concurrently.
+
+Exit timeouts of all services start at the same time. Services still
+running after own timeout get killed. Exit of other children gets
+reported through on_exit as well.
+"""
         signal = self._ext.signal
         os = self._os
+        config = self._config
         from ..runtimetool import RuntimeTool
 
-        signal.signal(signal.SIGALRM, TimeoutException.alarmHandler)
+        now = watcher.monotonic()
+        pending = {}
+
+        for (svc, pid) in stop_list:
+            tune = svc['tune']
+
+            try:
+                svc['toolImpl'].onStop(config, pid, tune)
+            except Exception as e:
+                self._warn(str(e))
+                continue
+
+            timeout = tune.get(
+                'exitTimeoutMS', RuntimeTool.DEFAULT_EXIT_TIMEOUT)
+            pending[pid] = now + timeout / 1000.0
+
+            if pid not in pid_to_svc:
+                watcher.watch(pid)
+
+        while pending:
+            ready = watcher.wait(0)
+
+            for (pid, excode) in watcher.reap():
+                pending.pop(pid, None)
+
+                if on_exit:
+                    on_exit(pid, excode)
+
+            # not own children
+            for pid in list(pending.keys()):
+                if pid in pid_to_svc:
+                    continue
+
+                if pid in ready or not watcher.isAlive(pid):
+                    watcher.unwatch(pid)
+                    del pending[pid]
+
+            if not pending:
+                break
+
+            now = watcher.monotonic()
+
+            for (pid, deadline) in list(pending.items()):
+                if deadline > now:
+                    continue
+
+                del pending[pid]
+                watcher.unwatch(pid)
+
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    continue
+
+                if pid in pid_to_svc:
+                    try:
+                        (pid, excode) = os.waitpid(pid, 0)
+                    except OSError:
+                        continue
+
+                    if on_exit:
+                        on_exit(pid, excode)
+
+            if not pending:
+                break
+
+            timeout = min(pending.values()) - now
+
+            for pid in pending:
+                if pid not in pid_to_svc and not watcher.isWatched(pid):
+                    timeout = min(timeout, watcher.POLL_INTERVAL)
+                    break
+
+            watcher.wait(timeout)
+
+    def __listenKey(self, tune):
+        if not tune.get('socketActivation', False):
+            return None
+
+        socket_type = tune.get('socketType', 'none')
+
+        if socket_type == 'unix':
+            return (socket_type, tune['socketPath'])
+        elif socket_type in ('tcp', 'tcp6'):
+            return (socket_type, tune['socketAddress'], tune['socketPort'])
+
+        return None
+
+    def __listenSocket(self, key):
+        socket = self._ext.socket
+        socket_type = key[0]
+
+        if socket_type == 'unix':
+            addr = key[1]
+
+            try:
+                self._os.unlink(addr)
+            except OSError:
+                pass
+
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            addr = key[1:]
+
+            if socket_type == 'tcp6':
+                sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+            else:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        try:
+            sock.bind(addr)
+            sock.listen(socket.SOMAXCONN)
+        except:
+            sock.close()
+            raise
+
+        return sock
+
+    def __passListenSocket(self, sock):
+        """Pass pre-bound socket to child as fd 3 (systemd-style)."""
+        os = self._os
+        environ = self._environ
+
+        if sock is None:
+            environ.pop('LISTEN_FDS', None)
+            environ.pop('LISTEN_PID', None)
+            return
+
+        fd = sock.fileno()
+
+        if fd != 3:
+            os.dup2(fd, 3)
+        elif hasattr(os, 'set_inheritable'):
+            os.set_inheritable(3, True)
+
+        environ['LISTEN_FDS'] = '1'
+        environ['LISTEN_PID'] = str(os.getpid())
+
+    def __rollReady(self, svc, now):
+        """Check if restarted service may be left behind in rolling reload."""
+        from ..runtimetool import RuntimeTool
+
+        if svc['_remove']:
+            return True
+
+        pid = svc['_pid']
+        svc_id = '{0}:{1}'.format(svc['name'], svc['instanceId'])
+
+        if not pid:
+            if svc['_startAt'] > now:
+                self._warn('Failed to restart "{0}" in {1:.3f}s'.format(
+                    svc_id, now - svc['_rollAt']))
+                return True
+
+            return False
 
         tune = svc['tune']
+        ready_timeout = tune.get(
+            'readyTimeoutMS', RuntimeTool.DEFAULT_READY_TIMEOUT) / 1000.0
 
         try:
-            toolImpl.onStop(self._config, pid, tune)
+            ready = svc['toolImpl'].onCheckReady(self._config, pid, tune)
         except Exception as e:
             self._warn(str(e))
-            return
+            ready = False
 
-        try:
-            timeout = tune.get(
-                'exitTimeoutMS', RuntimeTool.DEFAULT_EXIT_TIMEOUT)
-            timeout /= 1000.0
-            signal.setitimer(signal.ITIMER_REAL, timeout)
+        if ready:
+            self._info(
+                'Restarted "{0}" pid "{1}" in {2:.3f}s, ready in {3:.3f}s'
+                .format(svc_id, pid, now - svc['_rollAt'],
+                        now - svc['_forkAt']))
+            return True
 
-            try:
-                os.waitpid(pid, 0)
-            except TimeoutException:
-                signal.setitimer(signal.ITIMER_REAL, 0)
-                os.kill(pid, signal.SIGKILL)
-                os.waitpid(pid, 0)
-        except OSError:
-            pass
-        finally:
-            signal.setitimer(signal.ITIMER_REAL, 0)
+        if (now - svc['_forkAt']) >= ready_timeout:
+            self._warn(
+                'Restarted "{0}" pid "{1}" is not ready in {2:.3f}s'
+                .format(svc_id, pid, now - svc['_forkAt']))
+            return True
+
+        return False
 
     def _serviceMasterPID(self):
         self._requireDeployLock()
@@ -197,15 +379,22 @@ class ServiceMixIn(DataSlots):
         signal = self._ext.signal
         os = self._os
         sys = self._sys
-        time = self._ext.time
         from ..runtimetool import RuntimeTool
+        from ..details.childwatcher import ChildWatcher
+        from ..details.resourcealgo import ResourceAlgo
+        from ..details.usagesampler import UsageSampler
+        from ..details.metricsexporter import MetricsExporter
+        from ..details import procstats
 
         svc_list = []
+        sampler = None
+        exporter = None
         pid_to_svc = {}
+        rolling = {}
+        listen_socks = {}
 
         self._running = True
         self._reload_services = True
-        self._interruptable = False
 
         def serviceExitSignal(*args, **kwargs):
             self._running = False
@@ -215,21 +404,129 @@ class ServiceMixIn(DataSlots):
             signal.signal(signal.SIGUSR1, signal.SIG_IGN)
             signal.signal(signal.SIGUSR2, signal.SIG_IGN)
 
-            if self._interruptable:
-                raise KeyboardInterrupt('Exit received')
-
         def serviceReloadSignal(*args, **kwargs):
             self._reload_services = True
 
-            if self._interruptable:
-                raise KeyboardInterrupt('Reload received')
+        watcher = ChildWatcher()
+        watcher.open({
+            signal.SIGTERM: serviceExitSignal,
+            signal.SIGINT: serviceExitSignal,
+            signal.SIGHUP: serviceExitSignal,
+            signal.SIGUSR1: serviceReloadSignal,
+            signal.SIGUSR2: serviceReloadSignal,
+        })
+
+        def serviceExit(pid, excode):
+            svc = pid_to_svc.pop(pid, None)
 
-        signal.signal(signal.SIGTERM, serviceExitSignal)
-        signal.signal(signal.SIGINT, serviceExitSignal)
-        signal.signal(signal.SIGHUP, serviceExitSignal)
-        signal.signal(signal.SIGUSR1, serviceReloadSignal)
-        signal.signal(signal.SIGUSR2, serviceReloadSignal)
-        signal.signal(signal.SIGCHLD, signal.SIG_DFL)  # important for macOS
+            if svc is None:
+                return
+
+            svc['_pid'] = None
+            svc['_lastExitStatus'] = excode
+
+            if svc['_stopping']:
+                svc['_stopping'] = False
+                self._info('Exited "{0}:{1}" pid "{2}"'.format(
+                    svc['name'], svc['instanceId'], pid))
+                return
+
+            now = watcher.monotonic()
+            svc['_lastExit2'] = svc['_lastExit1']
+            svc['_lastExit1'] = now
+
+            self._warn('Exited "{0}:{1}" pid "{2}" exit code "{3}"'.format(
+                svc['name'], svc['instanceId'], pid, excode))
+
+            if (svc['_lastExit1'] - svc['_lastExit2']) < self.__RESTART_DELAY_THRESHOLD:
+                svc['_startAt'] = now + self.__RESTART_DELAY
+                self._warn('Delaying start "{0}:{1}" for {2}s'.format(
+                    svc['name'], svc['instanceId'], self.__RESTART_DELAY))
+
+        def stopServices(stop_list):
+            for (svc, pid) in stop_list:
+                svc['_stopping'] = True
+
+            self.__stopServices(watcher, stop_list, pid_to_svc, serviceExit)
+
+        def listenSocket(svc):
+            key = self.__listenKey(svc['tune'])
+
+            if key is None:
+                return None
+
+            sock = listen_socks.get(key, None)
+
+            if sock is None:
+                try:
+                    sock = self.__listenSocket(key)
+                except (IOError, OSError) as e:
+                    self._warn('Failed to pre-bind socket for "{0}:{1}": {2}'
+                               .format(svc['name'], svc['instanceId'], e))
+                    return None
+
+                listen_socks[key] = sock
+
+            return sock
+
+        def closeSockets(keep):
+            for key in list(listen_socks.keys()):
+                if key in keep:
+                    continue
+
+                listen_socks.pop(key).close()
+
+                if key[0] == 'unix':
+                    try:
+                        os.unlink(key[1])
+                    except OSError:
+                        pass
+
+        def rollServices():
+            now = watcher.monotonic()
+            stop_list = []
+
+            for (name, roll) in list(rolling.items()):
+                batch = roll['batch']
+
+                for svc in list(batch):
+                    if self.__rollReady(svc, now):
+                        batch.remove(svc)
+
+                if batch:
+                    continue
+
+                queue = roll['queue']
+
+                if queue:
+                    batch_size = self._configutil.parseBatch(
+                        queue[0]['tune'].get(
+                            'reloadBatch', RuntimeTool.DEFAULT_RELOAD_BATCH),
+                        len([v for v in svc_list if v['name'] == name]))
+
+                while queue and len(batch) < batch_size:
+                    svc = queue.pop(0)
+                    svc['_rolling'] = False
+                    pid = svc['_pid']
+
+                    if svc['_remove'] or not pid:
+                        continue
+
+                    self._info('Restarting "{0}:{1}" pid "{2}"'.format(
+                        svc['name'], svc['instanceId'], pid))
+                    svc['_rollAt'] = now
+                    svc['_lastExit1'] = self.__RESTART_DELAY_THRESHOLD + 1
+                    svc['_lastExit2'] = 0
+                    batch.append(svc)
+                    stop_list.append((svc, pid))
+
+                if not batch:
+                    del rolling[name]
+                    self._info('Restarted "{0}" in {1:.3f}s'.format(
+                        name, now - roll['startAt']))
+
+            # batches of all entry points get stopped together
+            stopServices(stop_list)
 
         # Still, it's not safe to assume processes continue
         # to run in set process group.
@@ -259,6 +556,7 @@ class ServiceMixIn(DataSlots):
             # Reload services
             #---
             if self._reload_services:
+                self._reload_services = False
                 self._info('Reloading services')
 
                 # Mark shutdown by default
@@ -277,8 +575,14 @@ class ServiceMixIn(DataSlots):
                         svc = newsvc
                         svc_list.append(newsvc)
                         svc['_pid'] = None
+                        svc['_stopping'] = False
+                        svc['_startAt'] = 0
+                        svc['_rolling'] = False
+                        svc['_forkAt'] = 0
                         svc['_lastExit1'] = self.__RESTART_DELAY_THRESHOLD + 1
                         svc['_lastExit2'] = 0
+                        svc['_starts'] = 0
+                        svc['_lastExitStatus'] = 0
 
                         tool = svc['tool']
                         t = self._getTool(tool)
@@ -302,15 +606,33 @@ class ServiceMixIn(DataSlots):
                 if not len(svc_list):
                     break
 
+                if (self._config['deploy'].get('usageFeedback', False) and
+                        procstats.isSupported()):
+                    if sampler is None:
+                        sampler = UsageSampler(self._ospath.join(
+                            self._config['deployDir'], ResourceAlgo.USAGE_FILE))
+                elif sampler is not None:
+                    sampler.flush()
+                    sampler = None
+
+                if (self._config['deploy'].get('exportMetrics', False) and
+                        procstats.isSupported()):
+                    if exporter is None:
+                        exporter = MetricsExporter(
+                            self._config['deploy']['runtimeDir'])
+                elif exporter is not None:
+                    exporter.remove()
+                    exporter = None
+
                 # Kill removed or changed services
+                stop_list = []
+
                 for svc in svc_list:
                     if svc['_remove']:
                         pid = svc['_pid']
 
                         if pid:
-                            self._serviceStop(svc, svc['toolImpl'], pid)
-                            pid_to_svc[pid]['_pid'] = None
-                            del pid_to_svc[pid]
+                            stop_list.append((svc, pid))
 
                         self._info('Removed "{0}:{1}" pid "{2}"'.format(
                             svc['name'], svc['instanceId'], pid))
@@ -318,8 +640,9 @@ class ServiceMixIn(DataSlots):
                 svc_list = list(filter(lambda v: not v['_remove'], svc_list))
 
                 # actual reload of services
-                for pid in pid_to_svc.keys():
-                    svc = pid_to_svc[pid]
+                for (pid, svc) in list(pid_to_svc.items()):
+                    if svc['_remove']:
+                        continue
 
                     if svc['tune'].get('reloadable', False):
                         self._info('Reloading "{0}:{1}" pid "{2}"'.format(
@@ -329,41 +652,55 @@ class ServiceMixIn(DataSlots):
                                 self._config, pid, svc['tune'])
                         except OSError:
                             pass
-                    else:
-                        self._info('Stopping "{0}:{1}" pid "{2}"'.format(
-                            svc['name'], svc['instanceId'], pid))
-                        self._serviceStop(svc, svc['toolImpl'], pid)
-
-                        del pid_to_svc[pid]
-                        svc['_lastExit1'] = self.__RESTART_DELAY_THRESHOLD + 1
-                        svc['_lastExit2'] = 0
-                        svc['_pid'] = None
-
-                self._reload_services = False
+                    elif not svc['_rolling']:
+                        svc['_rolling'] = True
+                        roll = rolling.setdefault(svc['name'], {
+                            'queue': [],
+                            'batch': [],
+                            'startAt': watcher.monotonic(),
+                        })
+                        roll['queue'].append(svc)
+
+                stopServices(stop_list)
+
+                closeSockets(set(
+                    self.__listenKey(v['tune']) for v in svc_list
+                ))
+
+            # rolling restart of non-reloadable services
+            #---
+            if rolling:
+                rollServices()
 
             # create children
+            now = watcher.monotonic()
+            next_start = None
+
             for svc in svc_list:
-                pid = svc['_pid']
-                if pid:
+                if svc['_pid']:
                     continue
 
-                delay = 0
+                start_at = svc['_startAt']
+
+                if start_at > now:
+                    if next_start is None or start_at < next_start:
+                        next_start = start_at
 
-                if (svc['_lastExit1'] - svc['_lastExit2']) < self.__RESTART_DELAY_THRESHOLD:
-                    delay = self.__RESTART_DELAY
+                    continue
 
+                svc['_startAt'] = 0
+                svc['_forkAt'] = now
+                svc['_starts'] += 1
+                listen_sock = listenSocket(svc)
                 pid = os.fork()
 
                 if pid:
                     svc['_pid'] = pid
                     pid_to_svc[pid] = svc
+                    watcher.watch(pid)
 
-                    if delay:
-                        self._warn('Delaying start "{0}:{1}" pid "{2}"'.format(
-                            svc['name'], svc['instanceId'], pid))
-                    else:
-                        self._info('Started "{0}:{1}" pid "{2}"'.format(
-                            svc['name'], svc['instanceId'], pid))
+                    self._info('Started "{0}:{1}" pid "{2}"'.format(
+                        svc['name'], svc['instanceId'], pid))
                 else:
                     try:
                         signal.signal(signal.SIGTERM, signal.SIG_DFL)
@@ -372,11 +709,14 @@ class ServiceMixIn(DataSlots):
                         signal.signal(signal.SIGUSR1, signal.SIG_DFL)
                         signal.signal(signal.SIGUSR2, signal.SIG_DFL)
                         signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                        signal.set_wakeup_fd(-1)
+                        watcher.closeInChild()
 
-                        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+                        self.__passListenSocket(listen_sock)
+
+                        self.__setCpuAffinity(svc)
 
-                        if delay:
-                            time.sleep(delay)
+                        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
 
                         os.chdir(self._config['wcDir'])
 
@@ -391,85 +731,50 @@ class ServiceMixIn(DataSlots):
                         # Should not be reachable here
                         os._exit(2)
 
-            # Wait for children to exit
-            try:
-                self._interruptable = True
-
-                if self._reload_services:
-                    continue
-
-                if not self._running:
-                    break
-
-                (pid, excode) = os.wait()
-            except KeyboardInterrupt:
-                continue
-            except OSError as e:  # macOS
-                self._warn(str(e))
+            # Wait for events
+            #---
+            if self._reload_services or not self._running:
                 continue
-            finally:
-                self._interruptable = False
 
-            svc = pid_to_svc[pid]
-            del pid_to_svc[pid]
-            svc['_pid'] = None
-            svc['_lastExit2'] = svc['_lastExit1']
+            if sampler is not None:
+                sample_at = sampler.sample(now, svc_list)
 
-            try:
-                svc['_lastExit1'] = time.monotonic()
-            except:
-                times = os.times()
-                svc['_lastExit1'] = times[4]
+                if next_start is None or sample_at < next_start:
+                    next_start = sample_at
 
-            self._warn('Exited "{0}:{1}" pid "{2}" exit code "{3}"'.format(
-                svc['name'], svc['instanceId'], pid, excode))
+            if exporter is not None:
+                update_at = exporter.update(now, svc_list)
 
-        # try terminate children
-        #---
-        self._info('Terminating children')
+                if next_start is None or update_at < next_start:
+                    next_start = update_at
 
-        for svc in svc_list:
-            pid = svc['_pid']
+            if rolling:
+                # readiness is polled
+                if next_start is None or (next_start - now) > watcher.POLL_INTERVAL:
+                    next_start = now + watcher.POLL_INTERVAL
 
-            if pid:
-                try:
-                    self._info('Terminating "{0}:{1}" pid "{2}"'.format(
-                        svc['name'], svc['instanceId'], pid))
-                    os.kill(pid, signal.SIGTERM)
-                except OSError:
-                    del pid_to_svc[pid]
-                    self._info('Exited "{0}:{1}" pid "{2}"'.format(
-                        svc['name'], svc['instanceId'], pid))
+            if next_start is None:
+                watcher.wait()
+            else:
+                watcher.wait(next_start - watcher.monotonic())
 
-        # try wait children
-        #---
-        self._info('Waiting for children')
-        signal.signal(signal.SIGALRM, TimeoutException.alarmHandler)
+            for (pid, excode) in watcher.reap():
+                serviceExit(pid, excode)
 
-        try:
-            signal.setitimer(signal.ITIMER_REAL,
-                             RuntimeTool.DEFAULT_EXIT_TIMEOUT / 1000.0)
-
-            while len(pid_to_svc) > 0:
-                (pid, excode) = os.waitpid(-1, 0)
-                svc = pid_to_svc[pid]
-                del pid_to_svc[pid]
-                self._info('Exited "{0}:{1}" pid "{2}"'.format(
-                    svc['name'], svc['instanceId'], pid))
-        except TimeoutException:
-            self._warn('Timed out waiting for children shutdown')
-        except OSError as e:  # macOS
-            self._warn(str(e))
-        finally:
-            signal.setitimer(signal.ITIMER_REAL, 0)
+        # terminate children
+        #---
+        self._info('Terminating children')
+        stopServices([
+            (svc, svc['_pid']) for svc in svc_list if svc['_pid']
+        ])
 
         # final kill
         #---
         if pid_to_svc:
             self._info('Killing children')
-        for pid in pid_to_svc:
+
+        for (pid, svc) in pid_to_svc.items():
             try:
-                svc = pid_to_svc[pid]
                 self._info('Killing "{0}:{1}" pid "{2}"'.format(
                     svc['name'], svc['instanceId'], pid))
                 os.kill(pid, signal.SIGKILL)
@@ -477,6 +782,15 @@ class ServiceMixIn(DataSlots):
             except OSError as e:
                 self._warn(str(e))
 
+        watcher.close()
+        closeSockets(set())
+
+        if sampler is not None:
+            sampler.flush()
+
+        if exporter is not None:
+            exporter.remove()
+
         self._info('Master process exit')
         self._masterUnlock()
         self._dumpResourceStats()
@@ -25,9 +25,68 @@ from ..vcstool import VcsTool
 class ToolMixIn(DataSlots):
     __slots__ = ()
 
+    __REGISTRY_FILE = 'registry.json'
+    __REGISTRY_FORMAT = 3
+    __ENV_CACHE_FORMAT = 2
+    __ENV_CACHE_VOLATILE = (
+        '_deploy',
+        'adaptDeploy',
+        'envCache',
+        'reDeploy',
+        'rmsPool',
+        'vcsRef',
+    )
+    # process environment tools read, besides lower case tool variables
+    __ENV_CACHE_ENVIRON = (
+        'BUNDLE_PATH',
+        'CARGO_HOME',
+        'CID_DEPLOY_HOME',
+        'CID_SOURCE_DIR',
+        'FLYWAY_HOME',
+        'GEM_HOME',
+        'GEM_PATH',
+        'GEM_SPEC_CACHE',
+        'GVM_DEST',
+        'GVM_NAME',
+        'HOME',
+        'JAVA_HOME',
+        'JDK_HOME',
+        'JRE_HOME',
+        'LIQUIBASE_HOME',
+        'NODE_ENV',
+        'PATH',
+        'PHP_BUILD_CONFIGURE_OPTS',
+        'PHP_BUILD_EXTRA_MAKE_ARGUMENTS',
+        'RAILS_ENV',
+        'RUBY_ENV',
+        'RUSTUP_HOME',
+        'RUSTUP_TOOLCHAIN',
+        'SDKMAN_DIR',
+        'TMPDIR',
+    )
+    __ENV_CACHE_MAX_FILES = 64
+    __ENV_CACHE_MAX_AGE = 7 * 24 * 3600
+    __TRACED_HOOKS = (
+        'importEnv',
+        'initEnv',
+        'requireInstalled',
+        '_installTool',
+        'onExec',
+        'onPrepare',
+        'onBuild',
+        'onPackage',
+        'onCheck',
+        'onMigrate',
+        'onPreConfigure',
+        'onRun',
+        'onStop',
+        'onReload',
+    )
+
     def __init__(self):
         super(ToolMixIn, self).__init__()
         self._tool_impl = {}
+        self._tool_meta = {}
 
     def _checkKnownTool(self, tool):
         if tool not in self._tool_impl:
@@ -60,7 +119,9 @@ class ToolMixIn(DataSlots):
 
         tool_mod_name = timpl
         tool_module = self._ext.importlib.import_module(tool_mod_name)
-        timpl = getattr(tool_module, name + 'Tool')(name)
+        tool_class = getattr(tool_module, name + 'Tool')
+        self._ext.tracing.traceMethods(tool_class, self.__TRACED_HOOKS, 'tool')
+        timpl = tool_class(name)
 
         try:
             getattr(timpl, '__dict__')
@@ -74,6 +135,412 @@ class ToolMixIn(DataSlots):
     def _getKnownTools(self):
         return self._tool_impl.keys()
 
+    def _getToolMeta(self, name):
+        self._checkKnownTool(name)
+        tool_meta = self._tool_meta
+
+        try:
+            return tool_meta[name]
+        except KeyError:
+            pass
+
+        meta = self.__toolMeta(self._getTool(name))
+        tool_meta[name] = meta
+        return meta
+
+    def _isToolOfType(self, name, base):
+        return base.__name__ in self._getToolMeta(name)['bases']
+
+    def _autoDetectTool(self, name, config):
+        meta = self._getToolMeta(name)
+
+        if meta['customDetect']:
+            return self._getTool(name).autoDetect(config)
+
+        files = meta['autoDetectFiles']
+
+        if files:
+            return self._detect.autoDetectByCfg(name, config, files)
+
+        return False
+
+    def __toolMeta(self, t):
+        auto_detect_files = t.autoDetectFiles()
+
+        if auto_detect_files:
+            auto_detect_files = self._configutil.listify(auto_detect_files)
+        else:
+            auto_detect_files = []
+
+        tool_cls = type(t)
+
+        return {
+            'bases': [c.__name__ for c in tool_cls.__mro__],
+            'customDetect': self.__isOverridden(tool_cls, 'autoDetect'),
+            'customLoadConfig': self.__isOverridden(tool_cls, 'loadConfig'),
+            'autoDetectFiles': auto_detect_files,
+            'deps': list(t.getDeps()),
+            'postDeps': list(t.getPostDeps()),
+            'order': t.getOrder(),
+        }
+
+    @staticmethod
+    def __isOverridden(tool_cls, method):
+        # Python 2 creates new unbound method object on every access
+        impl = getattr(tool_cls, method)
+        base = getattr(SubTool, method)
+        return getattr(impl, '__func__', impl) is not getattr(base, '__func__', base)
+
+    def __loadRegistry(self, plugin_packs):
+        """Map tool names to modules and metadata for all plugin packs.
+
+Importing every *tool.py module is expensive, so metadata is stored
+in a persistent cache keyed by pack path and file modification times.
+Only packs with changed keys get imported and re-cached. Some tools
+have distribution specific dependencies, so the whole registry is
+also bound to host OS.
+"""
+        os = self._os
+        ospath = self._ospath
+        importlib = self._ext.importlib
+        fnmatch = self._ext.fnmatch
+        pathutil = self._pathutil
+        from .. import __version__
+
+        registry_file = ospath.join(
+            pathutil.cacheDir('plugins'), self.__REGISTRY_FILE)
+
+        try:
+            registry = pathutil.loadJSONConfig(registry_file, {})
+        except ValueError:
+            registry = {}
+
+        host = self._detect.hostKey()
+
+        if (registry.get('format', None) != self.__REGISTRY_FORMAT or
+                registry.get('cidVersion', None) != __version__ or
+                registry.get('host', None) != host):
+            registry = {
+                'format': self.__REGISTRY_FORMAT,
+                'cidVersion': __version__,
+                'host': host,
+                'packs': {},
+            }
+
+        registry_packs = registry['packs']
+        plugins = {}
+        tool_meta = {}
+        updated = False
+
+        for pack_mod_name in plugin_packs:
+            m = importlib.import_module(pack_mod_name)
+            pack_dir = ospath.dirname(m.__file__)
+            tool_files = os.listdir(pack_dir)
+            tool_files = sorted(fnmatch.filter(tool_files, '*tool.py'))
+
+            pack_key = [pack_dir]
+
+            for f in tool_files:
+                mtime = os.stat(ospath.join(pack_dir, f)).st_mtime
+                pack_key.append([f, mtime])
+
+            pack_info = registry_packs.get(pack_mod_name, {})
+
+            if pack_info.get('key', None) != pack_key:
+                pack_tools = {}
+
+                for f in tool_files:
+                    tool = f.replace('tool.py', '')
+                    tool_mod_name = '{0}.{1}tool'.format(pack_mod_name, tool)
+                    tool_module = importlib.import_module(tool_mod_name)
+                    t = getattr(tool_module, tool + 'Tool')(tool)
+                    meta = self.__toolMeta(t)
+                    meta['module'] = tool_mod_name
+                    pack_tools[tool] = meta
+
+                pack_info = {
+                    'key': pack_key,
+                    'tools': pack_tools,
+                }
+                registry_packs[pack_mod_name] = pack_info
+                updated = True
+
+            for (tool, meta) in pack_info['tools'].items():
+                plugins[tool] = meta['module']
+                tool_meta[tool] = meta
+
+        if updated:
+            registry_tmp = '{0}.{1}.tmp'.format(registry_file, os.getpid())
+
+            try:
+                pathutil.writeJSONConfig(registry_tmp, registry)
+                os.rename(registry_tmp, registry_file)
+            except (IOError, OSError) as e:
+                self._warn('Failed to update plugin registry: {0}'.format(e))
+
+        return plugins, tool_meta
+
+    def _clearEnvCache(self):
+        self._pathutil.rmTree(self._pathutil.cacheDir('envcache'))
+
+    def __envCacheFile(self, config):
+        """Get snapshot file for resolved tool environment or None.
+
+The key covers merged config, project root listing, PATH and other
+process environment variables tools read. Tool binaries are checked
+separately on load as they get known only after resolution.
+"""
+        ext = self._ext
+        from .. import __version__
+
+        key_config = {}
+
+        for (k, v) in config.items():
+            if k not in self.__ENV_CACHE_VOLATILE:
+                key_config[k] = v
+
+        key_config['projectRootSet'] = sorted(config['projectRootSet'])
+
+        key = {
+            'config': key_config,
+            'environ': dict(
+                (k, v) for (k, v) in self._environ.items()
+                # tool variables like "nodeVer" or "rvm_path"
+                if k in self.__ENV_CACHE_ENVIRON or k[:1].islower()
+            ),
+            'cidVersion': __version__,
+            'host': self._detect.hostKey(),
+        }
+
+        try:
+            key = ext.json.dumps(key, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+
+        key = ext.hashlib.sha256(key.encode('utf8')).hexdigest()
+
+        return self._ospath.join(
+            self._pathutil.cacheDir('envcache'), key + '.json')
+
+    def __binaryTimes(self, env):
+        os = self._os
+        ospath = self._ospath
+        res = {}
+
+        for (k, v) in env.items():
+            if not k.endswith('Bin') or not v:
+                continue
+
+            try:
+                if ospath.isabs(v):
+                    res[v] = os.stat(v).st_mtime
+            except (AttributeError, TypeError, OSError):
+                pass
+
+        return res
+
+    def __loadEnvCache(self, cache_file):
+        os = self._os
+
+        try:
+            snapshot = self._pathutil.loadJSONConfig(cache_file, None)
+        except ValueError:
+            return None
+
+        if not snapshot or snapshot.get('format', None) != self.__ENV_CACHE_FORMAT:
+            return None
+
+        # cheap check instead of probing tools again
+        if self.__binaryTimes(snapshot['env']) != snapshot['binaries']:
+            return None
+
+        for tool in snapshot['toolOrder']:
+            if tool not in self._tool_impl:
+                return None
+
+        try:
+            # mtime is used for eviction
+            os.utime(cache_file, None)
+        except OSError:
+            pass
+
+        return snapshot
+
+    def __saveEnvCache(self, cache_file, tools, config, env, orig_config, orig_environ):
+        os = self._os
+        environ = self._environ
+
+        environ_set = {}
+
+        for (k, v) in environ.items():
+            if orig_environ.get(k, None) != v:
+                environ_set[k] = v
+
+        # auto-detection sets values like "vcs" and "rms"
+        config_set = {}
+
+        for (k, v) in config.items():
+            if k in ('env', 'toolOrder', 'projectRootSet'):
+                continue
+
+            if k not in orig_config or orig_config[k] != v:
+                config_set[k] = v
+
+        snapshot = {
+            'format': self.__ENV_CACHE_FORMAT,
+            'toolOrder': tools,
+            'config': config_set,
+            'env': env,
+            'environ': environ_set,
+            'environUnset': list(set(orig_environ.keys()) - set(environ.keys())),
+            'binaries': self.__binaryTimes(env),
+        }
+
+        cache_tmp = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+
+        try:
+            # full tool environment may have secrets
+            fd = os.open(cache_tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+
+            with os.fdopen(fd, 'w') as f:
+                self._ext.json.dump(snapshot, f)
+
+            os.rename(cache_tmp, cache_file)
+        except (IOError, OSError, TypeError, ValueError) as e:
+            self._warn('Failed to save environment cache: {0}'.format(e))
+
+            try:
+                os.unlink(cache_tmp)
+            except OSError:
+                pass
+
+        self.__evictEnvCache(self._ospath.dirname(cache_file))
+
+    def __evictEnvCache(self, cache_dir):
+        """Remove snapshots not used for a while and the least recent ones."""
+        os = self._os
+        ospath = self._ospath
+        min_mtime = self._ext.time.time() - self.__ENV_CACHE_MAX_AGE
+        snapshots = []
+
+        try:
+            for f in os.listdir(cache_dir):
+                f = ospath.join(cache_dir, f)
+                snapshots.append((os.stat(f).st_mtime, f))
+        except OSError:
+            return
+
+        snapshots.sort(reverse=True)
+
+        for (i, (mtime, f)) in enumerate(snapshots):
+            if i >= self.__ENV_CACHE_MAX_FILES or mtime < min_mtime:
+                try:
+                    os.unlink(f)
+                except OSError:
+                    pass
+
+    def __restoreEnvCache(self, snapshot, config, env):
+        environ = self._environ
+        curr_tool = config.get('tool', None)
+        tools = snapshot['toolOrder']
+
+        config.update(snapshot['config'])
+        env.update(snapshot['env'])
+
+        for (k, v) in snapshot['environ'].items():
+            environ[k] = v
+
+        for k in snapshot['environUnset']:
+            environ.pop(k, None)
+
+        # avoid import of tool modules without own loadConfig()
+        for tool in tools:
+            if tool != curr_tool and self._getToolMeta(tool)['customLoadConfig']:
+                self._getTool(tool).loadConfig(config)
+
+        config['toolOrder'] = tools
+
+    def __installGeneration(self, config, env, generation):
+        """Install tools of the same dependency generation.
+
+Tools not sharing dependencies are installed in parallel, up to
+env.toolInstallParallel. Output is prefixed with tool name then.
+"""
+        tool_impl = self._tool_impl
+        missing = []
+
+        for tool in generation:
+            t = tool_impl[tool]
+            t.sanitizeVersion(env)
+
+            if env['toolInstallParallel'] > 1:
+                t.importEnv(env)
+
+                if not t.isInstalled(env):
+                    missing.append(tool)
+            else:
+                t.requireInstalled(env)
+
+        groups = self.__independentGroups(missing)
+        jobs = min(env['toolInstallParallel'], len(groups))
+
+        if jobs < 2:
+            for tool in missing:
+                tool_impl[tool].installTool(env)
+
+            return
+
+        self._info('Installing {0} in parallel'.format(', '.join(missing)))
+
+        def install(group):
+            try:
+                for tool in group:
+                    self._ext.log.setThreadLabel(tool)
+                    tool_impl[tool].installTool(env)
+            except Exception as e:
+                self._warn('Failed to install "{0}": {1}'.format(tool, e))
+                return e
+            finally:
+                self._ext.log.setThreadLabel(None)
+
+        pool = self._ext.threadpool(jobs)
+
+        try:
+            errors = [e for e in pool.map(install, groups, 1) if e]
+        finally:
+            pool.close()
+            pool.join()
+
+        if errors:
+            raise errors[0]
+
+    def __independentGroups(self, tools):
+        """Split tools into groups with no shared dependencies.
+
+Install prefix may be shared through postDeps as well, e.g. python
+has virtualenv there. So, both deps and postDeps are considered along
+with tool itself. Indirect dependencies are installed in earlier
+generations and do not matter here.
+"""
+        groups = []
+
+        for tool in tools:
+            meta = self._getToolMeta(tool)
+            deps = set(meta['deps']) | set(meta['postDeps'])
+            deps.add(tool)
+            group = [[tool], deps]
+
+            for g in list(groups):
+                if g[1] & deps:
+                    group[0][0:0] = g[0]
+                    group[1] |= g[1]
+                    groups.remove(g)
+
+            groups.append(group)
+
+        return [g[0] for g in groups]
+
     def _getVcsTool(self):
         config = self._config
         vcs = config.get('vcs', None)
@@ -130,11 +597,13 @@ class ToolMixIn(DataSlots):
         return tar_tool
 
     def _initTools(self):
+        with self._ext.tracing.span('cid', 'initTools'):
+            self.__initTools()
+
+    def __initTools(self):
         config = self._config
         env = self._env
         os = self._os
-        ospath = self._ospath
-        importlib = self._ext.importlib
 
         if config is None:
             config = self._overrides.copy()
@@ -153,18 +622,11 @@ class ToolMixIn(DataSlots):
         plugin_packs += config.get('pluginPacks', [])
         plugin_packs.append('futoin.cid.tool')
 
-        for pack_mod_name in plugin_packs:
-            m = importlib.import_module(pack_mod_name)
-            pack_dir = ospath.dirname(m.__file__)
-            tool_files = os.listdir(pack_dir)
-            tool_files = self._ext.fnmatch.filter(tool_files, '*tool.py')
-
-            for f in tool_files:
-                tool = f.replace('tool.py', '')
-                tool_mod_name = '{0}.{1}tool'.format(pack_mod_name, tool)
-                plugins[tool] = tool_mod_name
+        pack_plugins, pack_meta = self.__loadRegistry(plugin_packs)
+        plugins.update(pack_plugins)
 
         tool_impl = self._tool_impl
+        tool_meta = self._tool_meta
 
         for (tool, t) in tool_impl.items():
             if isinstance(t, SubTool):
@@ -174,6 +636,29 @@ class ToolMixIn(DataSlots):
             if tool not in tool_impl:
                 tool_impl[tool] = tool_mod_name
 
+                # explicit plugins get metadata on first use
+                if tool in pack_meta:
+                    tool_meta[tool] = pack_meta[tool]
+
+        #---
+        env_cache_file = None
+
+        if (self._config is not None and
+                config.get('envCache', True) and
+                not config.get('toolTest', False)):
+            env_cache_file = self.__envCacheFile(config)
+
+        if env_cache_file:
+            deepcopy = self._ext.copy.deepcopy
+            snapshot = self.__loadEnvCache(env_cache_file)
+
+            if snapshot:
+                self.__restoreEnvCache(snapshot, config, env)
+                return
+
+            orig_config = deepcopy(config)
+            orig_environ = dict(self._environ)
+
         #---
         curr_tool = config.get('tool', None)
 
@@ -200,8 +685,7 @@ class ToolMixIn(DataSlots):
                         env[tool + 'Ver'] = v
             elif self._project_config is not None and config.get('toolDetect', True):
                 for n in self._getKnownTools():
-                    t = self._getTool(n)
-                    if t.autoDetect(config):
+                    if self._autoDetectTool(n, config):
                         tools.append(n)
 
             # Make sure deps & env are processed for cli-supplied tools
@@ -212,7 +696,7 @@ class ToolMixIn(DataSlots):
                 if tool:
                     tools.append(tool)
 
-                    if not isinstance(self._getTool(tool), base):
+                    if not self._isToolOfType(tool, base):
                         self._errorExit(
                             'Tool {0} does not suite {1} type'.format(tool, item))
 
@@ -224,7 +708,7 @@ class ToolMixIn(DataSlots):
                 if tool:
                     tools.append(tool)
 
-                    if not isinstance(self._getTool(tool), RuntimeTool):
+                    if not self._isToolOfType(tool, RuntimeTool):
                         self._errorExit(
                             'Tool {0} does not suite RuntimeTool type'.format(tool))
 
@@ -242,12 +726,12 @@ class ToolMixIn(DataSlots):
 
             for g in dep_generations[curr_index:]:
                 for tn in g:
-                    t = self._getTool(tn)
-                    moredeps = set(t.getDeps())
+                    meta = self._getToolMeta(tn)
+                    moredeps = set(meta['deps'])
                     if moredeps:
                         dep_generations.append(moredeps)
                         tools.update(moredeps)
-                    postdeps.update(set(t.getPostDeps()) - tools)
+                    postdeps.update(set(meta['postDeps']) - tools)
 
             if len(dep_generations) == dep_length and postdeps:
                 dep_generations.append(postdeps)
@@ -258,18 +742,20 @@ class ToolMixIn(DataSlots):
         if self._detect.isMacOS() and tools:
             # Make sure Homebrew is always implicit first tool
             dep_generations.append(set(['brew']))
-            self._getTool('brew')
 
         #---
         dep_generations.reverse()
         tools = []
+        tool_generations = []
         for d in dep_generations:
-            tools.extend(d - set(tools))
+            g = list(d - set(tools))
+            tools.extend(g)
+            tool_generations.append(g)
         config['toolOrder'] = tools
 
         #--
         for tool in tools:
-            t = tool_impl[tool]
+            t = self._getTool(tool)
             t.envDeps(env)
 
         #--
@@ -285,12 +771,12 @@ class ToolMixIn(DataSlots):
             # but let's leave that for now
             self._globalLock()
 
-            for tool in tools:
-                t = tool_impl[tool]
-                t.sanitizeVersion(env)
-                t.requireInstalled(env)
-                if tool != curr_tool:
-                    t.loadConfig(config)
+            for g in tool_generations:
+                self.__installGeneration(config, env, g)
+
+                for tool in g:
+                    if tool != curr_tool:
+                        tool_impl[tool].loadConfig(config)
 
             self._globalUnlock()
 
@@ -298,4 +784,8 @@ class ToolMixIn(DataSlots):
         # later execution with predictable results:
         # 1. sort by integer order
         # 2. sort by tool name
-        tools.sort(key=lambda v: (tool_impl[v].getOrder(), v))
+        tools.sort(key=lambda v: (self._getToolMeta(v)['order'], v))
+
+        if env_cache_file:
+            self.__saveEnvCache(env_cache_file, tools, config,
+                                env, orig_config, orig_environ)
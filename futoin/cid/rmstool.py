@@ -20,6 +20,12 @@ __all__ = ['RmsTool']
 
 
 class RmsTool(SubTool):
+    """Base for Release Management System tools.
+
+Multi-package operations run per package on a pool of env.rmsParallel
+threads. Implementations either override rmsUpload(), rmsPromote() and
+rmsRetrieve() or provide their per-package _rms*Package() variants.
+"""
     __slots__ = ()
 
     ALLOWED_HASH_TYPES = [
@@ -36,15 +42,45 @@ class RmsTool(SubTool):
         return super(RmsTool, self).autoDetect(config)
 
     def rmsUpload(self, config, rms_pool, package_list):
-        raise NotImplementedError(self._name)
+        self._rmsForEach(
+            config, 'Upload', package_list,
+            lambda package: self._rmsUploadPackage(config, rms_pool, package),
+            lambda package: package)
 
     def rmsPromote(self, config, src_pool, dst_pool, package_list):
-        raise NotImplementedError(self._name)
+        self._rmsForEach(
+            config, 'Promote', package_list,
+            lambda package: self._rmsPromotePackage(
+                config, src_pool, dst_pool, package))
 
     def rmsGetList(self, config, rms_pool, package_hint):
         raise NotImplementedError(self._name)
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
+    def rmsRetrieve(self, config, rms_pool, package_list, hashes=None):
+        """Retrieve packages, hashes is optional result of rmsPackageHashes()."""
+        env = config['env']
+        artifactcache = self._ext.artifactcache
+        hashes = hashes or {}
+
+        def retrieve(package):
+            key = ['rms', config['rmsRepo'], rms_pool, package]
+            package_hashes = hashes.get(package, None)
+
+            if not artifactcache.fetch(env, key, package, package_hashes):
+                self._rmsRetrievePackage(config, rms_pool, package)
+                artifactcache.store(env, key, package, package_hashes)
+
+        self._rmsForEach(
+            config, 'Retrieve', package_list, retrieve,
+            lambda package: package)
+
+    def _rmsUploadPackage(self, config, rms_pool, package):
+        raise NotImplementedError(self._name)
+
+    def _rmsPromotePackage(self, config, src_pool, dst_pool, package):
+        raise NotImplementedError(self._name)
+
+    def _rmsRetrievePackage(self, config, rms_pool, package):
         raise NotImplementedError(self._name)
 
     def rmsPoolCreate(self, config, rms_pool):
@@ -62,62 +98,135 @@ class RmsTool(SubTool):
 
         return False
 
-    def rmsProcessChecksums(self, config, rms_pool, package_list):
-        ret = []
+    def rmsPackageHashes(self, package_list):
+        """Get dict of file name to {hash_type: hash} for "<package>@<hash>"."""
+        res = {}
 
         for package in package_list:
             package = package.split('@', 1)
-            filename = package[0]
 
             if len(package) == 2:
-                hash_str = package[1]
-                hash_type, hash = hash_str.split(':', 1)
+                hash_type, hash = package[1].split(':', 1)
 
                 if hash_type not in self.ALLOWED_HASH_TYPES:
                     self._errorExit(
                         'Unsupported hash type "{0}"'.format(hash_type))
 
+                res[package[0]] = {hash_type: hash}
+
+        return res
+
+    def rmsProcessChecksums(self, config, rms_pool, package_list):
+        filenames = [p.split('@', 1)[0] for p in package_list]
+        hashes = self.rmsPackageHashes(package_list)
+        checks = []
+
+        for filename in filenames:
+            if filename in hashes:
+                (hash_type, hash), = hashes[filename].items()
                 self._info('Verifying {2} hash of {0} in {1}'.format(
                     filename, rms_pool, hash_type))
-                rms_hash = self.rmsGetHash(
-                    config, rms_pool, filename, hash_type)
+                checks.append((filename, hash_type, hash))
+
+        if checks:
+            rms_hashes = self._rmsGetHashes(
+                config, rms_pool, dict((c[0], c[1]) for c in checks))
+
+            for (filename, hash_type, hash) in checks:
+                rms_hash = rms_hashes[filename]
 
                 if rms_hash != hash:
                     self._errorExit(
                         'RMS hash mismatch "{0}" != "{1}"'.format(rms_hash, hash))
 
-            ret.append(filename)
-
-        return ret
+        return filenames
+
+    def _rmsGetHashes(self, config, rms_pool, hash_types):
+        """Get dict of package to hash for dict of package to hash type.
+
+Implementations may override it to get all hashes in one call.
+"""
+        package_list = list(hash_types.keys())
+        res = self._rmsForEach(
+            config, 'Verify', package_list,
+            lambda package: self.rmsGetHash(
+                config, rms_pool, package, hash_types[package]))
+
+        return dict(zip(package_list, res))
+
+    def _rmsForEach(self, config, action, package_list, func, local_file=None):
+        """Run func for each package on thread pool, return results in order.
+
+All packages are processed even if some fail. Failures are reported
+together afterwards. Throughput summary is shown for multiple packages,
+local_file maps package to its local file to get size from.
+"""
+        os = self._os
+        time = self._ext.time
+        package_list = list(package_list)
+        jobs = min(int(config['env'].get('rmsParallel', 1)),
+                   len(package_list))
+
+        def task(package):
+            start = time.time()
+
+            try:
+                res = func(package)
+            except Exception as e:
+                return (False, e, time.time() - start)
+
+            return (True, res, time.time() - start)
+
+        if jobs > 1:
+            pool = self._ext.threadpool(jobs)
+
+            try:
+                results = pool.map(task, package_list, 1)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            results = [task(p) for p in package_list]
+
+        failed = []
+
+        for (package, (ok, res, duration)) in zip(package_list, results):
+            if not ok:
+                self._warn('{0} of {1} failed: {2}'.format(
+                    action, package, res))
+                failed.append(res)
+                continue
+
+            if len(package_list) < 2:
+                continue
+
+            size = None
+
+            if local_file:
+                try:
+                    size = os.path.getsize(local_file(package))
+                except (OSError, TypeError):
+                    pass
+
+            if size is None:
+                self._info('{0} of {1} took {2:.2f}s'.format(
+                    action, package, duration))
+            else:
+                self._info('{0} of {1}: {2:.1f} KiB in {3:.2f}s, {4:.1f} KiB/s'.format(
+                    action, package, size / 1024.0, duration,
+                    size / 1024.0 / max(duration, 0.001)))
+
+        if len(failed) == 1:
+            raise failed[0]
+        elif failed:
+            self._errorExit('{0} failed for {1} of {2} packages'.format(
+                action, len(failed), len(package_list)))
+
+        return [res for (ok, res, duration) in results]
 
     def rmsCalcHash(self, file_name, hash_type):
-        hashlib = self._ext.hashlib
-
-        hf = hashlib.new(hash_type)
-        with open(file_name, 'rb') as f:
-            for chunk in iter(lambda: f.read(65536), ''):
-                if not chunk:
-                    break
-                hf.update(chunk)
-        return "{0}:{1}".format(hash_type, hf.hexdigest())
+        hashes = self._hashutil.fileHashes(file_name, [hash_type])
+        return "{0}:{1}".format(hash_type, hashes[hash_type])
 
     def rmsCalcHashes(self, file_name):
-        hashlib = self._ext.hashlib
-
-        hashes = {}
-
-        for hash_type in self.ALLOWED_HASH_TYPES:
-            hashes[hash_type] = hashlib.new(hash_type)
-
-        with open(file_name, 'rb') as f:
-            for chunk in iter(lambda: f.read(65536), ''):
-                if not chunk:
-                    break
-
-                for hash_type in self.ALLOWED_HASH_TYPES:
-                    hashes[hash_type].update(chunk)
-
-        for hash_type in self.ALLOWED_HASH_TYPES:
-            hashes[hash_type] = hashes[hash_type].hexdigest()
-
-        return hashes
+        return self._hashutil.fileHashes(file_name, self.ALLOWED_HASH_TYPES)
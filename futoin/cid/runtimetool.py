@@ -22,6 +22,10 @@ __all__ = ['RuntimeTool']
 class RuntimeTool(SubTool):
     __slots__ = ()
     DEFAULT_EXIT_TIMEOUT = 5000
+    DEFAULT_RELOAD_BATCH = '50%'
+    DEFAULT_READY_TIMEOUT = 10000
+    READY_CHECK_TIMEOUT = 0.1
+    READY_PROBE_TIMEOUT = 1.0
 
     def __init__(self, name):
         super(RuntimeTool, self).__init__(name)
@@ -40,6 +44,9 @@ class RuntimeTool(SubTool):
             'reloadable': False,
             'multiCore': False,
             'exitTimeoutMS': self.DEFAULT_EXIT_TIMEOUT,
+            'reloadBatch': self.DEFAULT_RELOAD_BATCH,
+            'readyTimeoutMS': self.DEFAULT_READY_TIMEOUT,
+            'socketActivation': False,
             'maxRequestSize': '1M',
             'socketProtocol': 'custom',
         }
@@ -53,6 +60,64 @@ class RuntimeTool(SubTool):
         else:
             self.onStop(config, pid, tune)
 
+    def onCheckReady(self, config, pid, tune):
+        """Check if service instance is ready to serve requests.
+
+By default, it's ready when listen socket accepts connections. If
+.readyProbe is set then HTTP GET of the path must succeed as well.
+Services without socket are ready as soon as started.
+"""
+        socket = self._ext.socket
+        socket_type = tune.get('socketType', 'none')
+
+        if socket_type == 'unix':
+            family = socket.AF_UNIX
+            addr = tune['socketPath']
+        elif socket_type == 'tcp':
+            family = socket.AF_INET
+            addr = (tune['socketAddress'], tune['socketPort'])
+        elif socket_type == 'tcp6':
+            family = socket.AF_INET6
+            addr = tune['socketAddress']
+
+            if addr == '::':
+                addr = '::1'
+
+            addr = (addr, tune['socketPort'])
+        else:
+            return True
+
+        probe = tune.get('readyProbe', None)
+        s = socket.socket(family, socket.SOCK_STREAM)
+
+        try:
+            s.settimeout(self.READY_CHECK_TIMEOUT)
+            s.connect(addr)
+
+            if not probe:
+                return True
+
+            # NOTE: pre-bound socket accepts connections before service
+            #       is actually started, so only probe is reliable then.
+            s.settimeout(self.READY_PROBE_TIMEOUT)
+            s.sendall((
+                'GET {0} HTTP/1.0\r\n'
+                'Host: localhost\r\n'
+                'Connection: close\r\n'
+                '\r\n'
+            ).format(probe).encode('ascii'))
+            status = s.recv(32).split(b' ')
+
+            return (
+                len(status) > 1 and
+                status[0].startswith(b'HTTP/') and
+                status[1][:1] in (b'2', b'3')
+            )
+        except (socket.error, IOError, OSError):
+            return False
+        finally:
+            s.close()
+
     def onPreConfigure(self, config, runtime_dir, svc, cfg_svc_tune):
         pass
 
@@ -31,70 +31,68 @@ NOT IMPLEMENTED YET!
     def initEnv(self, env):
         self._have_tool = True
 
-    def rmsUpload(self, config, rms_pool, package_list):
+    def _rmsUploadPackage(self, config, rms_pool, package):
         ospath = self._ospath
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
-            path = '/repository/{0}/{1}'.format(rms_pool, package_basename)
+        package_basename = ospath.basename(package)
+        path = '/repository/{0}/{1}'.format(rms_pool, package_basename)
 
-            res = self._callArchiva(config, 'HEAD', path)
+        res = self._callArchiva(config, 'HEAD', path)
 
-            if res.ok:
-                self._errorExit(
-                    'Package {0} already exists on RMS'.format(package_basename))
+        if res.ok:
+            self._errorExit(
+                'Package {0} already exists on RMS'.format(package_basename))
 
-            hashes = self.rmsCalcHashes(package)
+        hashes = self.rmsCalcHashes(package)
 
-            with open(package, 'rb') as pf:
+        with open(package, 'rb') as pf:
+            res = self._callArchiva(
+                config,
+                'PUT', path,
+                data=pf
+            )
+
+            res.raise_for_status()
+
+            for (hash_type, hash_value) in hashes.items():
                 res = self._callArchiva(
                     config,
-                    'PUT', path,
-                    data=pf
+                    'PUT', '{0}.{1}'.format(path, hash_type),
+                    data='{0}  {1}'.format(hash_value, package_basename),
                 )
-
                 res.raise_for_status()
 
-                for (hash_type, hash_value) in hashes.items():
-                    res = self._callArchiva(
-                        config,
-                        'PUT', '{0}.{1}'.format(path, hash_type),
-                        data='{0}  {1}'.format(hash_value, package_basename),
-                    )
-                    res.raise_for_status()
-
-    def rmsPromote(self, config, src_pool, dst_pool, package_list):
-        for package in package_list:
-            src_path = '/repository/{0}/{1}'.format(src_pool, package)
-            dst_path = '/repository/{0}/{1}'.format(dst_pool, package)
+    def _rmsPromotePackage(self, config, src_pool, dst_pool, package):
+        src_path = '/repository/{0}/{1}'.format(src_pool, package)
+        dst_path = '/repository/{0}/{1}'.format(dst_pool, package)
 
-            res = self._callArchiva(
-                config,
-                'COPY', src_path,
-                headers={
-                    'Depth': '0',
-                    'Overwrite': 'F',
-                    'Destination': dst_path,
-                }
-            )
-            res.raise_for_status()
+        res = self._callArchiva(
+            config,
+            'COPY', src_path,
+            headers={
+                'Depth': '0',
+                'Overwrite': 'F',
+                'Destination': dst_path,
+            }
+        )
+        res.raise_for_status()
 
-            for hash_type in self.ALLOWED_HASH_TYPES:
-                src_hash = '{0}.{1}'.format(src_path, hash_type)
+        for hash_type in self.ALLOWED_HASH_TYPES:
+            src_hash = '{0}.{1}'.format(src_path, hash_type)
 
-                res = self._callArchiva(config, 'GET', src_hash)
+            res = self._callArchiva(config, 'GET', src_hash)
 
-                if res.status_code == 404:
-                    continue
+            if res.status_code == 404:
+                continue
 
-                res.raise_for_status()
+            res.raise_for_status()
 
-                res = self._callArchiva(
-                    config,
-                    'PUT', '{0}.{1}'.format(dst_path, hash_type),
-                    data=res.text
-                )
-                res.raise_for_status()
+            res = self._callArchiva(
+                config,
+                'PUT', '{0}.{1}'.format(dst_path, hash_type),
+                data=res.text
+            )
+            res.raise_for_status()
 
     def rmsGetList(self, config, rms_pool, package_hint):
         ospath = self._ospath
@@ -138,21 +136,13 @@ NOT IMPLEMENTED YET!
 
         return ret
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
-        shutil = self._ext.shutil
-
-        for package in package_list:
-            result = self._callArchiva(
-                config,
-                'GET',
-                '/repository/{0}/{1}'.format(rms_pool, package),
-                stream=True
-            )
-            result.raise_for_status()
-
-            with open(package, 'wb') as f:
-                result.raw.decode_content = True
-                shutil.copyfileobj(result.raw, f)
+    def _rmsRetrievePackage(self, config, rms_pool, package):
+        self._callArchiva(
+            config,
+            'GET',
+            '/repository/{0}/{1}'.format(rms_pool, package),
+            download=package
+        )
 
     def rmsPoolCreate(self, config, rms_pool):
         res = self._callArchiva(
@@ -223,7 +213,10 @@ NOT IMPLEMENTED YET!
         if 'archivaUser' in env and 'archivaPassword' in env:
             kwargs['auth'] = (env['archivaUser'], env['archivaPassword'])
 
-        self._configutil.requestsOptions(env, kwargs)
-
         self._info('HTTP call {0} {1}'.format(method, url))
-        return self._ext.requests.request(method, url, **kwargs)
+        download = kwargs.pop('download', None)
+
+        if download:
+            return self._httputil.download(env, url, download, **kwargs)
+
+        return self._httputil.request(env, method, url, **kwargs)
@@ -50,40 +50,46 @@ Note 3: only the part before '/' of 'rms_pool' becomes actual RMS pool
         self._have_tool = True
 
     def rmsUpload(self, config, rms_pool, package_list):
-        ospath = self._ospath
         self._checkFileUpload(config, rms_pool, package_list)
+        # make sure JFrog CLI config is created before parallel calls
+        self._getServerConfig(config)
+        super(artifactoryTool, self).rmsUpload(config, rms_pool, package_list)
 
+    def _rmsUploadPackage(self, config, rms_pool, package):
+        ospath = self._ospath
         server_cfg = self._getServerConfig(config)
 
-        for package in package_list:
-            self._executil.callExternal([
-                config['env']['jfrogBin'],
-                'rt', 'upload',
-                '--server-id={0}'.format(server_cfg['serverId']),
-                '--url={0}'.format(config['rmsRepo']),
-                '--flat=true',
-                '--recursive=false',
-                '--regexp=false',
-                package,
-                '{0}/{1}'.format(rms_pool, ospath.basename(package))
-            ])
+        self._executil.callExternal([
+            config['env']['jfrogBin'],
+            'rt', 'upload',
+            '--server-id={0}'.format(server_cfg['serverId']),
+            '--url={0}'.format(config['rmsRepo']),
+            '--flat=true',
+            '--recursive=false',
+            '--regexp=false',
+            package,
+            '{0}/{1}'.format(rms_pool, ospath.basename(package))
+        ])
 
     def rmsPromote(self, config, src_pool, dst_pool, package_list):
         self._checkFileUpload(config, dst_pool, package_list)
+        self._getServerConfig(config)
+        super(artifactoryTool, self).rmsPromote(
+            config, src_pool, dst_pool, package_list)
 
+    def _rmsPromotePackage(self, config, src_pool, dst_pool, package):
         server_cfg = self._getServerConfig(config)
 
-        for package in package_list:
-            self._executil.callExternal([
-                config['env']['jfrogBin'],
-                'rt', 'copy',
-                '--server-id={0}'.format(server_cfg['serverId']),
-                '--url={0}'.format(config['rmsRepo']),
-                '--flat=true',
-                '--recursive=false',
-                '{0}/{1}'.format(src_pool, package),
-                '{0}/{1}'.format(dst_pool, package)
-            ])
+        self._executil.callExternal([
+            config['env']['jfrogBin'],
+            'rt', 'copy',
+            '--server-id={0}'.format(server_cfg['serverId']),
+            '--url={0}'.format(config['rmsRepo']),
+            '--flat=true',
+            '--recursive=false',
+            '{0}/{1}'.format(src_pool, package),
+            '{0}/{1}'.format(dst_pool, package)
+        ])
 
     def rmsGetList(self, config, rms_pool, package_hint):
         ospath = self._ospath
@@ -103,19 +109,23 @@ Note 3: only the part before '/' of 'rms_pool' becomes actual RMS pool
         result = [ospath.basename(r) for r in result['files']]
         return result
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
+    def rmsRetrieve(self, config, rms_pool, package_list, hashes=None):
+        self._getServerConfig(config)
+        super(artifactoryTool, self).rmsRetrieve(
+            config, rms_pool, package_list, hashes)
+
+    def _rmsRetrievePackage(self, config, rms_pool, package):
         server_cfg = self._getServerConfig(config)
 
-        for package in package_list:
-            self._executil.callExternal([
-                config['env']['jfrogBin'],
-                'rt', 'download',
-                '--server-id={0}'.format(server_cfg['serverId']),
-                '--url={0}'.format(config['rmsRepo']),
-                '--flat=true',
-                '--recursive=false',
-                '{0}/{1}'.format(rms_pool, package),
-                package])
+        self._executil.callExternal([
+            config['env']['jfrogBin'],
+            'rt', 'download',
+            '--server-id={0}'.format(server_cfg['serverId']),
+            '--url={0}'.format(config['rmsRepo']),
+            '--flat=true',
+            '--recursive=false',
+            '{0}/{1}'.format(rms_pool, package),
+            package])
 
     def rmsPoolCreate(self, config, rms_pool):
         rms_pool = rms_pool.split('/')[0]
@@ -189,8 +199,6 @@ Note 3: only the part before '/' of 'rms_pool' becomes actual RMS pool
         return result['checksums'][hash_type]
 
     def _callArtifactory(self, config, method, path, **kwargs):
-        import requests
-
         rms_repo = config['rmsRepo']
         if rms_repo[-1] == '/':
             path = path[1:]
@@ -205,10 +213,8 @@ Note 3: only the part before '/' of 'rms_pool' becomes actual RMS pool
         elif 'password' in server_cfg:
             kwargs['auth'] = (server_cfg['user'], server_cfg['password'])
 
-        self._configutil.requestsOptions(config['env'], kwargs)
-
         self._info('HTTP call {0} {1}'.format(method, url))
-        return requests.request(method, url, **kwargs)
+        return self._httputil.request(config['env'], method, url, **kwargs)
 
     def _getServerConfig(self, config, repeat=False):
         url = config['rmsRepo']
@@ -0,0 +1,38 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..runenvtool import RunEnvTool
+
+
+class brotliTool(RunEnvTool):
+    """Brotli - generic-purpose lossless compression algorithm.
+
+Home: https://github.com/google/brotli
+
+Auto-detected, if webcfg has mount points serving static files
+with .staticBrotli tune.
+"""
+    __slots__ = ()
+
+    def autoDetect(self, config):
+        return 'br' in self._ext.precompress.staticFormats(config)
+
+    def _installTool(self, env):
+        self._install.debrpm(['brotli'])
+        self._install.emerge(['app-arch/brotli'])
+        self._install.pacman(['brotli'])
+        self._install.apk(['brotli'])
+        self._install.brew('brotli')
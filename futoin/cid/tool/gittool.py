@@ -15,22 +15,22 @@
 #
 
 from ..vcstool import VcsTool
-from .bashtoolmixin import BashToolMixIn
 
 
-class gitTool(BashToolMixIn, VcsTool):
+class gitTool(VcsTool):
     """Git distributed version control system.
 
 Home: https://git-scm.com/
 
 Git tool forcibly sets user.email and user.name, 
 if not set by user.
+
+VCS cache of deploy directory borrows objects from host-wide mirror
+in ~/.cache/futoin-cid/vcs/ which is shared by all deploy directories
+of the same repository.
 """
     __slots__ = ()
 
-    def getDeps(self):
-        return ['bash', 'tar']
-
     def autoDetectFiles(self):
         return '.git'
 
@@ -41,23 +41,22 @@ if not set by user.
         self._install.apk(['git'])
         self._install.brew('git')
 
-    def _checkGitConfig(self, env):
+    def _gitSession(self, config, git_dir=None):
+        from ..details.vcssession import getSession, GitSession
+        git_dir = git_dir or self._ospath.join(self._os.getcwd(), '.git')
+        return getSession(GitSession, config['env']['gitBin'], git_dir)
+
+    def _checkGitConfig(self, config):
+        env = config['env']
         gitBin = env['gitBin']
+        session = self._gitSession(config)
         user_email = None
         user_name = None
 
         try:
-            user_email = self._executil.callExternal([
-                gitBin, 'config', 'user.email',
-            ], verbose=False).strip()
-        except:
-            pass
-
-        try:
-            user_name = self._executil.callExternal([
-                gitBin, 'config', 'user.name',
-            ], verbose=False).strip()
-        except:
+            user_email = session.config('user.email')
+            user_name = session.config('user.name')
+        except self._ext.subprocess.CalledProcessError:
             pass
 
         if not user_email:
@@ -74,21 +73,15 @@ if not set by user.
                 env.get('gitUserName', 'FutoIn CITool')
             ])
 
+        session.resetConfig()
+
     def _getCurrentBranch(self, config):
         return self._executil.callExternal([
             config['env']['gitBin'], 'rev-parse', '--abbrev-ref', 'HEAD'
         ], verbose=False).strip()
 
     def vcsGetRepo(self, config, wc_dir=None):
-        git_dir = wc_dir or self._ospath.join(self._os.getcwd(), '.git')
-
-        return self._executil.callExternal([
-            config['env']['gitBin'],
-            '--git-dir={0}'.format(git_dir),
-            'config',
-            '--get',
-            'remote.origin.url'
-        ], verbose=False).strip()
+        return self._gitSession(config, wc_dir).config('remote.origin.url') or ''
 
     def _gitCompareRepo(self, cfg, act):
         return cfg == act or ('ssh://' + cfg) == act
@@ -111,18 +104,14 @@ if not set by user.
             self._executil.callExternal(
                 [gitBin, 'clone', '-q', vcsRepo, wc_dir])
 
-            try:
-                self._executil.callExternal(
-                    [gitBin, 'rev-parse', 'HEAD'], verbose=False)
-            except self._ext.subprocess.CalledProcessError:
+            if self._gitSession(config).resolve('HEAD') is None:
                 # exit on empty repository
                 return
 
-        remote_branch = self._executil.callExternal([
-            gitBin, 'branch', '-q', '--all', '--list', 'origin/' + vcs_ref
-        ], verbose=False).strip()
+        session = self._gitSession(config)
+        remote_branch = session.resolve('refs/remotes/origin/' + vcs_ref)
 
-        if self._executil.callExternal([gitBin, 'branch', '-q', '--list', vcs_ref], verbose=False).strip():
+        if session.resolve('refs/heads/' + vcs_ref):
             self._executil.callExternal([gitBin, 'checkout', '-q', vcs_ref])
 
             if remote_branch:
@@ -137,9 +126,8 @@ if not set by user.
             self._executil.callExternal([gitBin, 'checkout', '-q', vcs_ref])
 
     def vcsCommit(self, config, message, files):
-        env = config['env']
-        gitBin = env['gitBin']
-        self._checkGitConfig(env)
+        gitBin = config['env']['gitBin']
+        self._checkGitConfig(config)
 
         if files:
             self._executil.callExternal([gitBin, 'add'] + files)
@@ -159,22 +147,20 @@ if not set by user.
         gitBin = config['env']['gitBin']
         repo = repo or 'origin'
 
-        if check_empty:
-            try:
-                self._executil.callExternal(
-                    [gitBin, 'rev-parse', 'HEAD'], verbose=False)
-            except self._ext.subprocess.CalledProcessError:
-                # exit on empty repository
-                return
+        if check_empty and self._gitSession(config).resolve('HEAD') is None:
+            # exit on empty repository
+            return
 
         self._executil.callExternal(
             [gitBin, '-c', 'push.default=current', 'push', '-q', repo] + refs)
 
     def vcsGetRevision(self, config):
-        gitBin = config['env']['gitBin']
-        return self._executil.callExternal([
-            gitBin, 'rev-parse', 'HEAD'
-        ], verbose=False).strip()
+        res = self._gitSession(config).resolve('HEAD')
+
+        if res is None:
+            self._errorExit('Unable to get revision of Git HEAD')
+
+        return res
 
     def vcsGetRefRevision(self, config, vcs_cache_dir, branch):
         res = self._executil.callExternal([
@@ -223,46 +209,71 @@ if not set by user.
         return res
 
     def vcsExport(self, config, vcs_cache_dir, vcs_ref, dst_path):
-        ospath = self._ospath
-        env = config['env']
-        gitBin = env['gitBin']
+        gitBin = config['env']['gitBin']
         vcsRepo = config['vcsRepo']
 
+        self._pathutil.rmTree(dst_path)
+        self._os.makedirs(dst_path)
+
         if vcs_cache_dir is None:
-            cache_repo = vcsRepo
-        else:
-            if ospath.exists(vcs_cache_dir):
-                remote_url = self.vcsGetRepo(config, vcs_cache_dir)
+            self._gitArchiveExtract(
+                [gitBin, 'archive', '--remote=' + vcsRepo,
+                    '--format=tar', vcs_ref],
+                dst_path)
+            return
 
-                if not self._gitCompareRepo(vcsRepo,  remote_url):
-                    self._warn('removing git cache on remote URL mismatch: {0} != {1}'
-                               .format(remote_url, vcsRepo))
-                    self._pathutil.rmTree(vcs_cache_dir)
+        from ..details.gitmirror import GitMirror
+        mirror = GitMirror(gitBin, vcsRepo)
 
-            if not ospath.exists(vcs_cache_dir):
-                self._executil.callExternal([
-                    env['gitBin'],
-                    'clone',
-                    '--mirror',
-                    '--depth=1',
-                    '--no-single-branch',
-                    vcsRepo,
-                    vcs_cache_dir
-                ])
-            else:
-                self._executil.callExternal([
-                    env['gitBin'],
-                    '--git-dir={0}'.format(vcs_cache_dir),
-                    'fetch'
-                ])
+        try:
+            mirror.lock(exclusive=True)
+            mirror.update()
+            mirror.attach(vcs_cache_dir)
+            mirror.collect()
 
-            cache_repo = 'file://' + vcs_cache_dir
+            # allow parallel exports
+            mirror.lock(exclusive=False)
+            self._gitArchiveExtract(
+                [gitBin, '--git-dir=' + mirror.gitDir(),
+                    'archive', '--format=tar', vcs_ref],
+                dst_path)
+        finally:
+            mirror.unlock()
 
-        self._pathutil.rmTree(dst_path)
-        self._os.makedirs(dst_path)
+    def _gitArchiveExtract(self, cmd, dst_path):
+        subprocess = self._ext.subprocess
+        tarfile = self._ext.tarfile
+
+        self._infoLabel('Call: ', subprocess.list2cmdline(cmd))
+
+        extract_args = {}
 
-        self._callBash(env, '{0} archive --remote={1} --format=tar {2} | {3} x -C {4}'
-                       .format(config['env']['gitBin'], cache_repo, vcs_ref, env['tarBin'], dst_path))
+        if hasattr(tarfile, 'tar_filter'):
+            extract_args['filter'] = 'tar'
+
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        tar_error = None
+
+        try:
+            tar = tarfile.open(fileobj=p.stdout, mode='r|')
+            tar.extractall(dst_path, **extract_args)
+            tar.close()
+        except tarfile.TarError as e:
+            tar_error = e
+        finally:
+            # git still writing gets SIGPIPE on close
+            p.stdout.close()
+            p.wait()
+
+        broken_pipe = (p.returncode == -self._ext.signal.SIGPIPE)
+
+        # error of git itself is the actual cause then
+        if p.returncode != 0 and not (tar_error and broken_pipe):
+            raise subprocess.CalledProcessError(p.returncode, cmd)
+
+        if tar_error is not None:
+            self._errorExit('Failed to extract archive into {0}: {1}'.format(
+                dst_path, tar_error))
 
     def vcsBranch(self, config, vcs_ref):
         env = config['env']
@@ -22,8 +22,12 @@ class gzipTool(BuildTool):
 
 Home: http://www.gzip.org/
 
-Auto-detected, if webcfg has mount points serving static files with gzip
-static enabled.
+Auto-detected, if webcfg has mount points serving static files with any
+static precompression enabled.
+
+Static content is precompressed in parallel processes. Brotli and
+Zstandard siblings are created as well for mount points with
+.staticBrotli and .staticZstd tune. Only changed files are processed.
 
 Tune:
 * toGzipRe = '\.(js|json|css|svg|txt|xml|html)$'
@@ -32,29 +36,7 @@ Tune:
     __TO_GZIP = '\.(js|json|css|svg|txt|xml|html)$'
 
     def autoDetect(self, config):
-        if not config.get('packageGzipStatic', True):
-            return False
-
-        webcfg = config.get('webcfg', {})
-        webroot = webcfg.get('root', '.')
-
-        for (m, v) in webcfg.get('mounts', {}).items():
-            if not isinstance(v, dict):
-                continue
-
-            if v.get('static', False):
-                pass
-            elif v.get('app', None) is None:
-                pass
-            elif m == '/' and webroot.get('main', None) is not None:
-                pass
-            else:
-                continue
-
-            if v.get('tune', {}).get('staticGzip', True):
-                return True
-
-        return False
+        return bool(self._ext.precompress.staticFormats(config))
 
     def _installTool(self, env):
         self._install.debrpm(['gzip'])
@@ -71,23 +53,39 @@ Tune:
         super(gzipTool, self).initEnv(env, bin_name)
 
     def onBuild(self, config):
-        if not self.autoDetect(config):
+        precompress = self._ext.precompress
+        formats = {}
+        env = config['env']
+
+        for fmt in precompress.staticFormats(config):
+            if fmt == 'gz':
+                formats[fmt] = None
+                continue
+
+            fmt_bin = env.get({'br': 'brotliBin', 'zst': 'zstdBin'}[fmt], None)
+
+            if fmt_bin:
+                formats[fmt] = fmt_bin
+            else:
+                self._warn(
+                    'Skipping "{0}" precompression: no tool'.format(fmt))
+
+        if not formats:
             return
 
-        self._info('Generating GZip files of static content')
+        self._info('Generating {0} files of static content'.format(
+            ', '.join(sorted(formats.keys()))))
         webroot = config.get('webcfg', {}).get('root', '.')
         re = self._ext.re
         to_gzip_re = self._getTune(config, 'toGzipRe', self.__TO_GZIP)
         to_gzip_re = re.compile(to_gzip_re, re.I)
 
-        ospath = self._ospath
-        gzip = self._ext.gzip
-        shutil = self._ext.shutil
-
-        for (path, dirs, files) in self._os.walk(webroot):
-            for f in files:
-                if to_gzip_re.search(f):
-                    f = ospath.join(path, f)
-                    with open(f, 'rb') as f_in:
-                        with gzip.open(f + '.gz', 'wb', 9) as f_out:
-                            shutil.copyfileobj(f_in, f_out)
+        basename = self._ospath.basename
+        files = [
+            f for f in self._hashutil.walkFiles([webroot])
+            if to_gzip_re.search(basename(f))
+        ]
+
+        count = precompress.precompress(files, formats)
+        self._info('Compressed {0} of {1}'.format(
+            count, len(files) * len(formats)))
@@ -38,21 +38,19 @@ Home: https://www.mercurial-scm.org/
     def autoDetectFiles(self):
         return '.hg'
 
+    def _hgSession(self, config, repo_dir=None):
+        from ..details.vcssession import getSession, HgSession
+        repo_dir = repo_dir or self._os.getcwd()
+        return getSession(HgSession, config['env']['hgBin'], repo_dir)
+
     def _getCurrentBranch(self, config):
-        return self._executil.callExternal([
-            config['env']['hgBin'], 'branch'
-        ]).strip()
+        return self._hgSession(config).run(['branch']).strip()
 
     def vcsGetRepo(self, config, wc_dir=None):
-        wc_dir = wc_dir or self._os.getcwd()
-        return self._executil.callExternal([
-            config['env']['hgBin'], '--repository', wc_dir, 'paths', 'default'
-        ], verbose=False).strip()
+        return self._hgSession(config, wc_dir).run(['paths', 'default']).strip()
 
     def _hgCheckoutTool(self, config):
-        hgBin = config['env']['hgBin']
-        help_res = self._executil.callExternal(
-            [hgBin, 'checkout', '--help'], verbose=False)
+        help_res = self._hgSession(config).run(['checkout', '--help'])
         tool_args = []
 
         if help_res.find('--tool') > 0:
@@ -80,11 +78,13 @@ Home: https://www.mercurial-scm.org/
             # skip default branch
             return
 
-        for v in self._executil.callExternal([hgBin, 'branches'], verbose=False).strip().split("\n"):
+        session = self._hgSession(config)
+
+        for v in session.run(['branches']).strip().split("\n"):
             if v and v.split()[0] == vcs_ref:
                 break
         else:
-            for v in self._executil.callExternal([hgBin, 'tags'], verbose=False).strip().split("\n"):
+            for v in session.run(['tags']).strip().split("\n"):
                 if v and v.split()[0] == vcs_ref:
                     break
             else:
@@ -124,8 +124,7 @@ Home: https://www.mercurial-scm.org/
         self._executil.callExternal([hgBin, 'push'] + opts)
 
     def vcsGetRevision(self, config):
-        hgBin = config['env']['hgBin']
-        return self._executil.callExternal([hgBin, 'identify', '--id'], verbose=False).strip()
+        return self._hgSession(config).run(['identify', '--id']).strip()
 
     def _hgCache(self, config, vcs_cache_dir):
         ospath = self._ospath
@@ -150,6 +149,7 @@ Home: https://www.mercurial-scm.org/
             if remote_info != vcsrepo:
                 self._warn('removing Hg cache on remote URL mismatch: {0} != {1}'
                            .format(remote_info, vcsrepo))
+                self.__forgetSession(vcs_cache_dir)
                 self._pathutil.rmTree(vcs_cache_dir)
             else:
                 self._executil.callExternal(
@@ -161,14 +161,15 @@ Home: https://www.mercurial-scm.org/
 
         return vcs_cache_dir
 
+    def __forgetSession(self, repo_dir):
+        from ..details.vcssession import forgetSession
+        forgetSession(repo_dir)
+
     def vcsGetRefRevision(self, config, vcs_cache_dir, branch):
         vcs_cache_dir = self._hgCache(config, vcs_cache_dir)
 
-        hgBin = config['env']['hgBin']
-
-        res = self._executil.callExternal([
-            hgBin, '--repository', vcs_cache_dir, 'branches'
-        ], verbose=False).strip().split("\n")
+        res = self._hgSession(config, vcs_cache_dir).run(
+            ['branches']).strip().split("\n")
 
         for r in res:
             r = r.split()
@@ -181,11 +182,8 @@ Home: https://www.mercurial-scm.org/
     def vcsListTags(self, config, vcs_cache_dir, tag_hint):
         vcs_cache_dir = self._hgCache(config, vcs_cache_dir)
 
-        hgBin = config['env']['hgBin']
-
-        res = self._executil.callExternal([
-            hgBin, '--repository', vcs_cache_dir, 'tags'
-        ], verbose=False).strip().split("\n")
+        res = self._hgSession(config, vcs_cache_dir).run(
+            ['tags']).strip().split("\n")
 
         res = [v and v.split()[0] or '' for v in res]
         res = list(filter(None, res))
@@ -195,11 +193,8 @@ Home: https://www.mercurial-scm.org/
     def vcsListBranches(self, config, vcs_cache_dir, branch_hint):
         vcs_cache_dir = self._hgCache(config, vcs_cache_dir)
 
-        hgBin = config['env']['hgBin']
-
-        res = self._executil.callExternal([
-            hgBin, '--repository', vcs_cache_dir, 'branches'
-        ], verbose=False).strip().split("\n")
+        res = self._hgSession(config, vcs_cache_dir).run(
+            ['branches']).strip().split("\n")
 
         res = [v and v.split()[0] or '' for v in res]
         res = list(filter(None, res))
@@ -278,12 +273,11 @@ Home: https://www.mercurial-scm.org/
         ])
 
     def vcsIsMerged(self, config, vcs_ref):
-        res = self._executil.callExternal([
-            config['env']['hgBin'],
+        res = self._hgSession(config).run([
             'merge', '--preview',
             '--tool=internal:merge',
             vcs_ref
-        ], verbose=False).strip()
+        ]).strip()
         return res == ''
 
     def vcsClean(self, config):
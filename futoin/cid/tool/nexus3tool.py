@@ -37,19 +37,18 @@ avoid setting these variables in process environment.
     def initEnv(self, env):
         self._have_tool = True
 
-    def rmsUpload(self, config, rms_pool, package_list):
+    def _rmsUploadPackage(self, config, rms_pool, package):
         ospath = self._ospath
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
+        package_basename = ospath.basename(package)
 
-            with open(package, 'rb') as pf:
-                self._callNexus(
-                    config,
-                    'PUT',
-                    '/repository/{0}/{1}'.format(rms_pool, package_basename),
-                    data=pf
-                )
+        with open(package, 'rb') as pf:
+            self._callNexus(
+                config,
+                'PUT',
+                '/repository/{0}/{1}'.format(rms_pool, package_basename),
+                data=pf
+            )
 
     def rmsPromote(self, config, src_pool, dst_pool, package_list):
         # TODO: use Groovy API to transfer on server
@@ -70,19 +69,13 @@ avoid setting these variables in process environment.
         """
         raise NotImplementedError(self._name)
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
-        for package in package_list:
-            result = self._callNexus(
-                config,
-                'GET',
-                '/repository/{0}/{1}'.format(rms_pool, package),
-                stream=True
-            )
-            result.raise_for_status()
-
-            with open(package, 'wb') as f:
-                result.raw.decode_content = True
-                self._ext.shutil.copyfileobj(result.raw, f)
+    def _rmsRetrievePackage(self, config, rms_pool, package):
+        self._callNexus(
+            config,
+            'GET',
+            '/repository/{0}/{1}'.format(rms_pool, package),
+            download=package
+        )
 
     def rmsPoolCreate(self, config, rms_pool):
         pool = rms_pool.split('/', 1)[0]
@@ -144,7 +137,10 @@ avoid setting these variables in process environment.
         if 'nexus3User' in env and 'nexus3Password' in env:
             kwargs['auth'] = (env['nexus3User'], env['nexus3Password'])
 
-        self._configutil.requestsOptions(env, kwargs)
-
         self._info('HTTP call {0} {1}'.format(method, url))
-        return self._ext.requests.request(method, url, **kwargs)
+        download = kwargs.pop('download', None)
+
+        if download:
+            return self._httputil.download(env, url, download, **kwargs)
+
+        return self._httputil.request(env, method, url, **kwargs)
@@ -34,25 +34,24 @@ avoid setting these variables in process environment.
     def initEnv(self, env):
         self._have_tool = True
 
-    def rmsUpload(self, config, rms_pool, package_list):
+    def _rmsUploadPackage(self, config, rms_pool, package):
         ospath = self._ospath
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
-            path = '/content/repositories/{0}/{1}'.format(
-                rms_pool, package_basename)
+        package_basename = ospath.basename(package)
+        path = '/content/repositories/{0}/{1}'.format(
+            rms_pool, package_basename)
 
-            if self._callNexus(config, 'HEAD', path).ok:
-                self._errorExit(
-                    'Package {0} already exists on RMS'.format(package_basename))
+        if self._callNexus(config, 'HEAD', path).ok:
+            self._errorExit(
+                'Package {0} already exists on RMS'.format(package_basename))
 
-            with open(package, 'rb') as pf:
-                res = self._callNexus(
-                    config,
-                    'PUT', path,
-                    data=pf
-                )
-                res.raise_for_status()
+        with open(package, 'rb') as pf:
+            res = self._callNexus(
+                config,
+                'PUT', path,
+                data=pf
+            )
+            res.raise_for_status()
 
     def rmsPromote(self, config, src_pool, dst_pool, package_list):
         # TODO: find out how to copy on server
@@ -86,21 +85,13 @@ avoid setting these variables in process environment.
         res = list(filter(None, res))
         return res
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
-        shutil = self._ext.shutil
-
-        for package in package_list:
-            result = self._callNexus(
-                config,
-                'GET',
-                '/content/repositories/{0}/{1}'.format(rms_pool, package),
-                stream=True
-            )
-            result.raise_for_status()
-
-            with open(package, 'wb') as f:
-                result.raw.decode_content = True
-                shutil.copyfileobj(result.raw, f)
+    def _rmsRetrievePackage(self, config, rms_pool, package):
+        self._callNexus(
+            config,
+            'GET',
+            '/content/repositories/{0}/{1}'.format(rms_pool, package),
+            download=package
+        )
 
     def rmsPoolCreate(self, config, rms_pool):
         res = self._callNexus(
@@ -173,7 +164,10 @@ avoid setting these variables in process environment.
         if 'nexusUser' in env and 'nexusPassword' in env:
             kwargs['auth'] = (env['nexusUser'], env['nexusPassword'])
 
-        self._configutil.requestsOptions(env, kwargs)
-
         self._info('HTTP call {0} {1}'.format(method, url))
-        return self._ext.requests.request(method, url, **kwargs)
+        download = kwargs.pop('download', None)
+
+        if download:
+            return self._httputil.download(env, url, download, **kwargs)
+
+        return self._httputil.request(env, method, url, **kwargs)
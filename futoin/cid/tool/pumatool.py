@@ -44,6 +44,7 @@ bundler
             'reloadable': True,
             'multiCore': False,  # use workers on service level
             'maxRequestSize': '1M',
+            'socketActivation': True,
         }
 
     def onRun(self, config, svc, args):
@@ -34,6 +34,8 @@ More details:
 * SSH shell access is required to remote as well (restricted shell is not suitable)
 * SCP itself is used only for upload & retrieval. The rest is done through SSH.
 * {hash_type}sum utilities must be present on remote for hash calculation support.
+* All remote calls share one SSH master connection per user@host:port.
+  Remote operations for multiple packages are batched into single calls.
 """
     __slots__ = ()
 
@@ -48,78 +50,103 @@ More details:
     def rmsUpload(self, config, rms_pool, package_list):
         ospath = self._ospath
         re = self._ext.re
-        scpBin = config['env']['scpBin']
-        rms_repo = config['rmsRepo']
+        remote = re.match(self.REMOTE_PATTERN, config['rmsRepo'])
 
-        remote = re.match(self.REMOTE_PATTERN, rms_repo)
-        if remote:
-            user_host = remote.group(self.REMOTE_GRP_USER_HOST)
-            port = remote.group(self.REMOTE_GRP_PORT)
-            path = remote.group(self.REMOTE_GRP_PATH)
+        if not remote:
+            return super(scpTool, self).rmsUpload(
+                config, rms_pool, package_list)
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
+        user_host = remote.group(self.REMOTE_GRP_USER_HOST)
+        port = remote.group(self.REMOTE_GRP_PORT)
+        path = ospath.join(remote.group(self.REMOTE_GRP_PATH), rms_pool)
 
-            if remote:
-                dst = "{0}:{1}".format(
-                    user_host,
-                    ospath.join(path, rms_pool, package_basename)
-                )
+        if '/' in rms_pool:
+            cmd = "mkdir -p {0}".format(path)
+            self._callSSH(config, user_host, port, cmd)
 
-                if '/' in rms_pool:
-                    cmd = "mkdir -p {0}".format(ospath.join(path, rms_pool))
-                    self._callSSH(config, user_host, port, cmd)
+        uploaded = []
 
-                self._callRemoteSCP(config, port, package, dst)
+        def upload(package):
+            dst = ospath.join(path, ospath.basename(package))
+            self._callRemoteSCP(config, user_host, port, package,
+                                "{0}:{1}".format(user_host, dst))
+            uploaded.append(dst)
 
-                cmd = "chmod ugo-wx {0}".format(
-                    ospath.join(path, rms_pool, package_basename))
+        try:
+            self._rmsForEach(config, 'Upload', package_list, upload,
+                             lambda package: package)
+        finally:
+            if uploaded:
+                cmd = "chmod ugo-wx {0}".format(' '.join(uploaded))
                 self._callSSH(config, user_host, port, cmd)
-            else:
-                dst = ospath.join(rms_repo, rms_pool, package_basename)
-
-                if '/' in rms_pool:
-                    self._executil.callExternal(
-                        ['mkdir', '-p', ospath.join(rms_repo, rms_pool)])
-
-                self._executil.callExternal([scpBin, '-Bq', package, dst])
-                self._executil.callExternal(['chmod', 'ugo-wx', dst])
 
     def rmsPromote(self, config, src_pool, dst_pool, package_list):
         ospath = self._ospath
         re = self._ext.re
-        scpBin = config['env']['scpBin']
-        rms_repo = config['rmsRepo']
+        remote = re.match(self.REMOTE_PATTERN, config['rmsRepo'])
 
-        remote = re.match(self.REMOTE_PATTERN, rms_repo)
-        if remote:
-            user_host = remote.group(self.REMOTE_GRP_USER_HOST)
-            port = remote.group(self.REMOTE_GRP_PORT)
-            path = remote.group(self.REMOTE_GRP_PATH)
+        if not remote:
+            return super(scpTool, self).rmsPromote(
+                config, src_pool, dst_pool, package_list)
 
+        user_host = remote.group(self.REMOTE_GRP_USER_HOST)
+        port = remote.group(self.REMOTE_GRP_PORT)
+        path = remote.group(self.REMOTE_GRP_PATH)
+        cmd = []
+
+        if '/' in dst_pool:
+            cmd.append("mkdir -p {0}".format(ospath.join(path, dst_pool)))
+
+        # every package is processed, failures are reported together
         for package in package_list:
             package_basename = ospath.basename(package)
+            cmd.append(
+                '{{ cp -a {0} {1} && chmod ugo-wx {1}; }} || echo FAIL:{2}'.format(
+                    ospath.join(path, src_pool, package_basename),
+                    ospath.join(path, dst_pool, package_basename),
+                    package
+                ))
 
-            if remote:
-                if '/' in dst_pool:
-                    cmd = "mkdir -p {0}".format(ospath.join(path, dst_pool))
-                    self._callSSH(config, user_host, port, cmd)
+        res = self._callSSH(config, user_host, port, '; '.join(cmd))
+        failed = [l[5:] for l in res.split("\n") if l.startswith('FAIL:')]
 
-                cmd = 'cp -a {0} {1} && chmod ugo-wx {1}'.format(
-                    ospath.join(path, src_pool, package_basename),
-                    ospath.join(path, dst_pool, package_basename)
-                )
-                self._callSSH(config, user_host, port, cmd)
-            else:
-                src = ospath.join(rms_repo, src_pool, package_basename)
-                dst = ospath.join(rms_repo, dst_pool, package_basename)
+        for package in failed:
+            self._warn('Promote of {0} failed'.format(package))
+
+        if failed:
+            self._errorExit('Promote failed for {0} of {1} packages'.format(
+                len(failed), len(package_list)))
+
+    def _rmsUploadPackage(self, config, rms_pool, package):
+        ospath = self._ospath
+        scpBin = config['env']['scpBin']
+        rms_repo = config['rmsRepo']
+
+        package_basename = ospath.basename(package)
+        dst = ospath.join(rms_repo, rms_pool, package_basename)
 
-                if '/' in dst_pool:
-                    self._executil.callExternal(
-                        ['mkdir', '-p', ospath.join(rms_repo, dst_pool)])
+        if '/' in rms_pool:
+            self._executil.callExternal(
+                ['mkdir', '-p', ospath.join(rms_repo, rms_pool)])
 
-                self._executil.callExternal([scpBin, '-Bq', src, dst])
-                self._executil.callExternal(['chmod', 'ugo-wx', dst])
+        self._executil.callExternal([scpBin, '-Bq', package, dst])
+        self._executil.callExternal(['chmod', 'ugo-wx', dst])
+
+    def _rmsPromotePackage(self, config, src_pool, dst_pool, package):
+        ospath = self._ospath
+        scpBin = config['env']['scpBin']
+        rms_repo = config['rmsRepo']
+
+        package_basename = ospath.basename(package)
+        src = ospath.join(rms_repo, src_pool, package_basename)
+        dst = ospath.join(rms_repo, dst_pool, package_basename)
+
+        if '/' in dst_pool:
+            self._executil.callExternal(
+                ['mkdir', '-p', ospath.join(rms_repo, dst_pool)])
+
+        self._executil.callExternal([scpBin, '-Bq', src, dst])
+        self._executil.callExternal(['chmod', 'ugo-wx', dst])
 
     def rmsGetList(self, config, rms_pool, package_hint):
         ospath = self._ospath
@@ -141,7 +168,7 @@ More details:
 
         return ret
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
+    def _rmsRetrievePackage(self, config, rms_pool, package):
         ospath = self._ospath
         re = self._ext.re
 
@@ -154,19 +181,19 @@ More details:
             port = remote.group(self.REMOTE_GRP_PORT)
             path = remote.group(self.REMOTE_GRP_PATH)
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
+        package_basename = ospath.basename(package)
 
-            if remote:
-                src = "{0}:{1}".format(
-                    user_host,
-                    ospath.join(path, rms_pool, package_basename)
-                )
-                self._callRemoteSCP(config, port, src, package_basename)
-            else:
-                src = ospath.join(rms_repo, rms_pool, package_basename)
-                self._executil.callExternal(
-                    [scpBin, '-Bq', src, package_basename])
+        if remote:
+            src = "{0}:{1}".format(
+                user_host,
+                ospath.join(path, rms_pool, package_basename)
+            )
+            self._callRemoteSCP(config, user_host, port,
+                                src, package_basename)
+        else:
+            src = ospath.join(rms_repo, rms_pool, package_basename)
+            self._executil.callExternal(
+                [scpBin, '-Bq', src, package_basename])
 
     def rmsGetHash(self, config, rms_pool, package, hash_type):
         ospath = self._ospath
@@ -190,6 +217,48 @@ More details:
 
         return ret
 
+    def _rmsGetHashes(self, config, rms_pool, hash_types):
+        ospath = self._ospath
+        re = self._ext.re
+        remote = re.match(self.REMOTE_PATTERN, config['rmsRepo'])
+
+        if not remote:
+            return super(scpTool, self)._rmsGetHashes(
+                config, rms_pool, hash_types)
+
+        user_host = remote.group(self.REMOTE_GRP_USER_HOST)
+        port = remote.group(self.REMOTE_GRP_PORT)
+        path = ospath.join(remote.group(self.REMOTE_GRP_PATH), rms_pool)
+
+        # all hashes in one remote call
+        by_type = {}
+
+        for (package, hash_type) in hash_types.items():
+            by_type.setdefault(hash_type, []).append(package)
+
+        cmd = ['cd {0}'.format(path)]
+
+        for (hash_type, packages) in sorted(by_type.items()):
+            cmd.append('{0}sum {1}'.format(hash_type, ' '.join(packages)))
+
+        out = self._callSSH(config, user_host, port, ' && '.join(cmd),
+                            verbose=False)
+        ret = {}
+
+        for line in out.split("\n"):
+            line = line.split(None, 1)
+
+            if len(line) == 2:
+                ret[line[1].lstrip('*')] = line[0]
+
+        missing = [p for p in hash_types if p not in ret]
+
+        if missing:
+            self._errorExit('Failed to get hash of {0}'.format(
+                ', '.join(missing)))
+
+        return ret
+
     def rmsPoolCreate(self, config, rms_pool):
         ospath = self._ospath
         re = self._ext.re
@@ -229,7 +298,9 @@ More details:
 
         return ret
 
-    def _callRemoteSCP(self, config, port, src, dst):
+    def _callRemoteSCP(self, config, user_host, port, src, dst):
+        from ..details.sshmaster import controlOptions
+
         port = port or '22'
         env = config['env']
         self._executil.callExternal([
@@ -237,10 +308,13 @@ More details:
             '-Bq', '-P', port,
             '-o', 'StrictHostKeyChecking={0}'.format(
                 env['sshStrictHostKeyChecking']),
+        ] + controlOptions(env, user_host, port) + [
             src, dst
         ])
 
     def _callSSH(self, config, user_host, port, cmd, **kwargs):
+        from ..details.sshmaster import controlOptions
+
         port = port or '22'
         env = config['env']
         return self._executil.callExternal([
@@ -250,5 +324,6 @@ More details:
             '-o', 'StrictHostKeyChecking={0}'.format(
                 env['sshStrictHostKeyChecking']),
             '-p', port,
+        ] + controlOptions(env, user_host, port) + [
             user_host, '--', cmd
         ], **kwargs)
@@ -257,22 +257,21 @@ Home: https://subversion.apache.org/
             if wcstatus[0].getAttribute('item') in ('unversioned', 'ignored'):
                 pathutil.rmTree(p)
 
-    def rmsUpload(self, config, rms_pool, package_list):
+    def _rmsUploadPackage(self, config, rms_pool, package):
         ospath = self._ospath
         rms_repo = config['rmsRepo']
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
+        package_basename = ospath.basename(package)
 
-            dst = '{0}/{1}/{2}'.format(rms_repo, rms_pool, package_basename)
+        dst = '{0}/{1}/{2}'.format(rms_repo, rms_pool, package_basename)
 
-            self._callRMSSVN(config, [
-                'import',
-                '-m', 'FutoIn CID upload',
-                package, dst,
-            ])
+        self._callRMSSVN(config, [
+            'import',
+            '-m', 'FutoIn CID upload',
+            package, dst,
+        ])
 
-    def rmsPromote(self, config, src_pool, dst_pool, package_list):
+    def _rmsPromotePackage(self, config, src_pool, dst_pool, package):
         ospath = self._ospath
         rms_repo = config['rmsRepo']
 
@@ -281,42 +280,32 @@ Home: https://subversion.apache.org/
         if '/' in dst_pool:
             args += ['--parents']
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
+        package_basename = ospath.basename(package)
 
-            src = '{0}/{1}/{2}'.format(rms_repo, src_pool, package_basename)
-            dst = '{0}/{1}/{2}'.format(rms_repo, dst_pool, package_basename)
+        src = '{0}/{1}/{2}'.format(rms_repo, src_pool, package_basename)
+        dst = '{0}/{1}/{2}'.format(rms_repo, dst_pool, package_basename)
 
-            self._callRMSSVN(config, [
-                'copy',
-                '-m', 'FutoIn CID promotion',
-                src, dst,
-            ] + args)
+        self._callRMSSVN(config, [
+            'copy',
+            '-m', 'FutoIn CID promotion',
+            src, dst,
+        ] + args)
 
     def rmsGetList(self, config, rms_pool, package_hint):
         return self._svnListCommon(config, 'rmsRepo', None, rms_pool)
 
-    def rmsRetrieve(self, config, rms_pool, package_list):
-        self._rmsRetrieve(config, rms_pool, package_list)
-
-    def _rmsRetrieve(self, config, rms_pool, package_list, dst_dir=None):
+    def _rmsRetrievePackage(self, config, rms_pool, package):
         ospath = self._ospath
         rms_repo = config['rmsRepo']
 
-        for package in package_list:
-            package_basename = ospath.basename(package)
-
-            src = '{0}/{1}/{2}'.format(rms_repo, rms_pool, package_basename)
+        package_basename = ospath.basename(package)
 
-            if dst_dir:
-                dst = ospath.join(dst_dir, package_basename)
-            else:
-                dst = package_basename
+        src = '{0}/{1}/{2}'.format(rms_repo, rms_pool, package_basename)
 
-            self._callRMSSVN(config, [
-                'export',
-                src, package_basename,
-            ])
+        self._callRMSSVN(config, [
+            'export',
+            src, package_basename,
+        ])
 
     def rmsPoolCreate(self, config, rms_pool):
         rms_repo = config['rmsRepo']
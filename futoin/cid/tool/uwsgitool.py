@@ -40,6 +40,7 @@ It's possible to override uWSGI options with .tune.uwsgi parameter map.
             'reloadable': False,  # there are too many gotchas for graceful reload
             'multiCore': False,  # make there is no uWSGI master bottleneck
             'maxRequestSize': '1M',
+            'socketActivation': True,
         }
 
     def onPreConfigure(self, config, runtime_dir, svc, cfg_svc_tune):
@@ -0,0 +1,41 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..runenvtool import RunEnvTool
+
+
+class zstdTool(RunEnvTool):
+    """Zstandard - Fast real-time compression algorithm.
+
+Home: https://facebook.github.io/zstd/
+
+Auto-detected, if .tzst packages are built or webcfg has mount points
+serving static files with .staticZstd tune.
+"""
+    __slots__ = ()
+
+    def autoDetect(self, config):
+        if config.get('packageFormat', None) == 'tzst':
+            return True
+
+        return 'zst' in self._ext.precompress.staticFormats(config)
+
+    def _installTool(self, env):
+        self._install.debrpm(['zstd'])
+        self._install.emerge(['app-arch/zstd'])
+        self._install.pacman(['zstd'])
+        self._install.apk(['zstd'])
+        self._install.brew('zstd')
@@ -0,0 +1,239 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Host-wide cache of downloaded artifacts.
+
+Files are stored read-only in objects/ by SHA-256 of content, so the same
+package in different RMS pools is stored once. Keys like RMS URL, pool,
+package name and expected hashes point to objects through small files
+in keys/. Files are copied in and out of the store, so changes of
+destination never affect cached objects. Objects not matching expected
+hashes are never used.
+
+Entries not used for env.artifactCacheDays are removed. The least
+recently used ones are also removed while total size is above
+env.artifactCacheSize. Cache is disabled with artifactCacheSize "0".
+"""
+
+from ..mixins.ondemand import ext as _ext
+from . import log as _log
+
+_CACHE_KEY = 'artifacts'
+_LOCK_FILE = '.lock'
+_OBJECTS_DIR = 'objects'
+_KEYS_DIR = 'keys'
+
+
+def fetch(env, key, dst, hashes=None):
+    """Put cached file for key list at dst. Return True on cache hit.
+
+Optional hashes is dict of hash type to expected hexdigest.
+"""
+    if not isEnabled(env):
+        return False
+
+    os = _ext.os
+    ospath = _ext.ospath
+    cache_dir = _ext.pathutil.cacheDir(_CACHE_KEY)
+    key_file = _keyFile(cache_dir, key, hashes)
+    lockfd = _lock(cache_dir, False)
+
+    try:
+        try:
+            with open(key_file, 'r') as f:
+                digest = f.read().strip()
+        except (IOError, OSError):
+            return False
+
+        obj = _objectFile(cache_dir, digest)
+
+        if not ospath.exists(obj):
+            return False
+
+        if not _checkHashes(obj, digest, hashes):
+            _log.warn('Ignoring cached {0} with unexpected hash'.format(
+                ospath.basename(dst)))
+            return False
+
+        _copy(obj, dst)
+
+        # mtime is used for LRU as atime is often disabled
+        os.utime(obj, None)
+        os.utime(key_file, None)
+    finally:
+        os.close(lockfd)
+
+    _log.info('Using cached {0}'.format(ospath.basename(dst)))
+    return True
+
+
+def store(env, key, src, hashes=None):
+    """Add file to cache under key list and run eviction.
+
+File is not cached, if it does not match optional expected hashes.
+"""
+    if not isEnabled(env):
+        return
+
+    os = _ext.os
+    ospath = _ext.ospath
+    cache_dir = _ext.pathutil.cacheDir(_CACHE_KEY)
+    digest = _ext.hashutil.fileHashes(src, ['sha256'])['sha256']
+
+    if not _checkHashes(src, digest, hashes):
+        _log.warn('Not caching {0} with unexpected hash'.format(src))
+        return
+
+    obj = _objectFile(cache_dir, digest)
+    key_file = _keyFile(cache_dir, key, hashes)
+    lockfd = _lock(cache_dir, True)
+
+    try:
+        if not ospath.exists(obj):
+            obj_tmp = '{0}.{1}.tmp'.format(obj, os.getpid())
+            _ext.shutil.copyfile(src, obj_tmp)
+            os.chmod(obj_tmp, 0o444)
+            os.rename(obj_tmp, obj)
+
+        os.utime(obj, None)
+
+        key_tmp = '{0}.{1}.tmp'.format(key_file, os.getpid())
+        _ext.pathutil.writeTextFile(key_tmp, digest)
+        os.rename(key_tmp, key_file)
+
+        _evict(env, cache_dir)
+    except (IOError, OSError) as e:
+        _log.warn('Failed to cache {0}: {1}'.format(src, e))
+    finally:
+        os.close(lockfd)
+
+
+def isEnabled(env):
+    return env['artifactCacheSize'] != '0'
+
+
+def _lock(cache_dir, exclusive):
+    os = _ext.os
+    fcntl = _ext.fcntl
+    lockfd = os.open(_ext.ospath.join(cache_dir, _LOCK_FILE),
+                     os.O_WRONLY | os.O_CREAT, 0o600)
+
+    if exclusive:
+        fcntl.flock(lockfd, fcntl.LOCK_EX)
+    else:
+        fcntl.flock(lockfd, fcntl.LOCK_SH)
+
+    return lockfd
+
+
+def _keyFile(cache_dir, key, hashes):
+    if hashes:
+        key = list(key) + [sorted((t, v.lower()) for (t, v) in hashes.items())]
+
+    key = _ext.json.dumps(key).encode('utf8')
+    key = _ext.hashlib.sha256(key).hexdigest()
+    return _fanOut(cache_dir, _KEYS_DIR, key)
+
+
+def _objectFile(cache_dir, digest):
+    return _fanOut(cache_dir, _OBJECTS_DIR, digest)
+
+
+def _fanOut(cache_dir, sub_dir, name):
+    ospath = _ext.ospath
+    parent = ospath.join(cache_dir, sub_dir, name[:2])
+
+    if not ospath.isdir(parent):
+        _ext.os.makedirs(parent)
+
+    return ospath.join(parent, name)
+
+
+def _copy(src, dst):
+    os = _ext.os
+    dst_tmp = '{0}.{1}.tmp'.format(dst, os.getpid())
+    _ext.shutil.copyfile(src, dst_tmp)
+    os.rename(dst_tmp, dst)
+
+
+def _checkHashes(file_name, digest, hashes):
+    """Check file with known SHA-256 digest against expected hashes."""
+    if not hashes:
+        return True
+
+    hashes = dict(hashes)
+    expected = hashes.pop('sha256', digest)
+
+    if expected.lower() != digest:
+        return False
+
+    if hashes:
+        actual = _ext.hashutil.fileHashes(file_name, list(hashes.keys()))
+
+        for (hash_type, v) in hashes.items():
+            if actual[hash_type] != v.lower():
+                return False
+
+    return True
+
+
+def _listEntries(cache_dir, sub_dir):
+    os = _ext.os
+    ospath = _ext.ospath
+    base_dir = ospath.join(cache_dir, sub_dir)
+    res = []
+
+    if not ospath.isdir(base_dir):
+        return res
+
+    for d in os.listdir(base_dir):
+        d = ospath.join(base_dir, d)
+
+        for f in os.listdir(d):
+            if f.endswith('.tmp'):
+                continue
+
+            f = ospath.join(d, f)
+            st = os.stat(f)
+            res.append((st.st_mtime, st.st_size, f))
+
+    return res
+
+
+def _evict(env, cache_dir):
+    os = _ext.os
+    ospath = _ext.ospath
+    max_size = _ext.configutil.parseMemory(env['artifactCacheSize'])
+    min_mtime = _ext.time.time() - env['artifactCacheDays'] * 24 * 3600
+
+    objects = _listEntries(cache_dir, _OBJECTS_DIR)
+    objects.sort()
+    total = sum(e[1] for e in objects)
+
+    for (mtime, size, f) in objects:
+        if mtime >= min_mtime and total <= max_size:
+            break
+
+        _log.info('Evicting cached {0}'.format(ospath.basename(f)))
+        os.unlink(f)
+        total -= size
+
+    for (mtime, size, f) in _listEntries(cache_dir, _KEYS_DIR):
+        with open(f, 'r') as fh:
+            digest = fh.read().strip()
+
+        if mtime < min_mtime or not ospath.exists(_objectFile(cache_dir, digest)):
+            os.unlink(f)
@@ -0,0 +1,144 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Compiled docopt usage of CLI.
+
+Parsing and normalization of the usage grammar is the most of docopt
+time, but the result depends only on usage text. It is compiled once
+and cached as JSON by CID version, docopt version and hash of usage.
+Command line is matched against the compiled pattern with docopt's own
+routines, so syntax, --help, --version and errors stay the same.
+"""
+
+from ..mixins.ondemand import ext as _ext
+
+try:
+    import docopt as _docopt
+except ImportError:
+    # fallback to "hardcoded"
+    from ..contrib import docopt as _docopt
+
+_CACHE_KEY = 'cli'
+_PARENTS = ('Required', 'Optional', 'AnyOptions', 'OneOrMore', 'Either')
+
+
+def docopt(doc, version=None):
+    """Drop-in replacement of docopt() for sys.argv."""
+    try:
+        compiled = _loadCompiled(doc)
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        # unexpected docopt implementation or broken cache
+        compiled = None
+
+    if compiled is None:
+        return _docopt.docopt(doc, version=version)
+
+    (options, pattern) = compiled
+    DocoptExit = _docopt.DocoptExit
+    DocoptExit.usage = _docopt.printable_usage(doc)
+
+    argv = _docopt.parse_argv(
+        _docopt.TokenStream(_ext.sys.argv[1:], DocoptExit), options, False)
+    _docopt.extras(True, version, argv, doc)
+
+    matched, left, collected = pattern.match(argv)
+
+    if matched and left == []:
+        return _docopt.Dict((a.name, a.value)
+                            for a in (pattern.flat() + collected))
+
+    raise DocoptExit()
+
+
+def compileUsage(doc):
+    """Get JSON-friendly (options, pattern) of usage."""
+    usage = _docopt.printable_usage(doc)
+    options = _docopt.parse_defaults(doc)
+    pattern = _docopt.parse_pattern(_docopt.formal_usage(usage), options)
+    pattern_options = set(pattern.flat(_docopt.Option))
+
+    for ao in pattern.flat(_docopt.AnyOptions):
+        ao.children = list(set(_docopt.parse_defaults(doc)) - pattern_options)
+
+    return {
+        'options': [_dumpNode(o) for o in options],
+        'pattern': _dumpNode(pattern.fix()),
+    }
+
+
+def _loadCompiled(doc):
+    os = _ext.os
+    ospath = _ext.ospath
+    json = _ext.json
+    from .. import __version__
+
+    key = '{0}\n{1}\n{2}'.format(__version__, _docopt.__version__, doc)
+    key = _ext.hashlib.sha256(key.encode('utf8')).hexdigest()
+
+    try:
+        cache_file = ospath.join(
+            _ext.pathutil.cacheDir(_CACHE_KEY), key + '.json')
+    except (KeyError, OSError):
+        # no HOME or it is read-only
+        cache_file = None
+
+    compiled = None
+
+    if cache_file:
+        try:
+            with open(cache_file, 'r') as f:
+                compiled = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+
+    if compiled is None:
+        compiled = compileUsage(doc)
+
+        if cache_file:
+            tmp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+
+            try:
+                with open(tmp_file, 'w') as f:
+                    json.dump(compiled, f)
+
+                os.rename(tmp_file, cache_file)
+            except (IOError, OSError):
+                pass
+
+    return (
+        [_loadNode(o) for o in compiled['options']],
+        _loadNode(compiled['pattern']),
+    )
+
+
+def _dumpNode(node):
+    cls = type(node).__name__
+
+    if cls in _PARENTS:
+        return [cls, [_dumpNode(c) for c in node.children]]
+    elif cls == 'Option':
+        return [cls, node.short, node.long, node.argcount, node.value]
+    else:
+        return [cls, node.name, node.value]
+
+
+def _loadNode(data):
+    cls = getattr(_docopt, data[0])
+
+    if data[0] in _PARENTS:
+        return cls(*[_loadNode(c) for c in data[1]])
+
+    return cls(*data[1:])
@@ -76,6 +76,27 @@ def toMemory(val):
 #==================
 
 
+def parseBatch(val, total):
+    """Get batch size out of count or "NN%" of total, at least one."""
+    val = str(val)
+
+    if val.endswith('%'):
+        pct = int(val[:-1])
+
+        if pct <= 0 or pct > 100:
+            raise ValueError('Batch percentage must be in 1..100 range')
+
+        return max(int(total * pct / 100), 1)
+
+    res = int(val)
+
+    if res <= 0:
+        raise ValueError('Batch size must be positive')
+
+    return res
+#==================
+
+
 def listify(val):
     if isinstance(val, list):
         return val
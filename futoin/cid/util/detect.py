@@ -72,6 +72,27 @@ def isSLES():
     return _ext.platform.linux_distribution()[0].startswith('SUSE Linux Enterprise')
 
 
+@_simple_memo
+def hostKey():
+    """Get OS, distribution and architecture of host as string.
+
+It keys caches of host dependent data, as home folder may be shared
+between hosts and containers.
+"""
+    platform = _ext.platform
+    res = [platform.system(), platform.machine()]
+
+    try:
+        with open('/etc/os-release', 'r') as f:
+            for l in f.readlines():
+                if l.startswith('ID=') or l.startswith('VERSION_ID='):
+                    res.append(l.strip())
+    except (IOError, OSError):
+        pass
+
+    return ' '.join(res)
+
+
 @_simple_memo
 def isAlpineLinux():
     return _ext.ospath.exists('/etc/alpine-release')
@@ -18,6 +18,7 @@ from ..mixins.ondemand import ext as _ext
 from . import log as _log
 
 _dev_null = None
+_sudo_lock = _ext.threading.Lock()
 
 
 def devNull():
@@ -45,6 +46,8 @@ def callExternal(cmd, suppress_fail=False, verbose=True,
 
     sys = _ext.sys
     subprocess = _ext.subprocess
+    span = _ext.tracing.span('exec', _ext.ospath.basename(cmd[0]),
+                             cmd=subprocess.list2cmdline(cmd))
 
     if verbose and not suppress_fail:
         _log.infoLabel('Call: ', subprocess.list2cmdline(cmd))
@@ -68,6 +71,13 @@ def callExternal(cmd, suppress_fail=False, verbose=True,
         else:
             stderr = devNull()
 
+        label = _log.threadLabel()
+
+        if label and stderr is sys.stderr:
+            stderr = subprocess.PIPE
+        else:
+            label = None
+
         if user_interaction and not output_handler:
             stdout = None
         elif show_output:
@@ -77,10 +87,17 @@ def callExternal(cmd, suppress_fail=False, verbose=True,
 
         chunk_size = 65536
         res_buffers = []
+        output_bytes = 0
         p = subprocess.Popen(cmd, stdin=stdin, stderr=stderr,
                              bufsize=chunk_size * 2, close_fds=True,
                              stdout=stdout, cwd=cwd)
 
+        if label:
+            stderr_thread = _ext.threading.Thread(
+                target=_labelOutput, args=(p.stderr, label))
+            stderr_thread.daemon = True
+            stderr_thread.start()
+
         if input:
             if not binary_input:
                 input = toBytes(input, encoding)
@@ -115,6 +132,7 @@ def callExternal(cmd, suppress_fail=False, verbose=True,
                     chunk = p.stdout.read(chunk_size)
 
                     if chunk:
+                        output_bytes += len(chunk)
                         on_chunk(chunk)
                     else:
                         break
@@ -124,6 +142,12 @@ def callExternal(cmd, suppress_fail=False, verbose=True,
 
         p.wait()
 
+        if label:
+            stderr_thread.join()
+
+        span.set('exit_code', p.returncode)
+        span.set('output_bytes', output_bytes)
+
         if binary_output:
             res = b''.join(res_buffers)
         else:
@@ -137,6 +161,18 @@ def callExternal(cmd, suppress_fail=False, verbose=True,
         if suppress_fail:
             return None
         raise
+    finally:
+        span.end()
+
+
+def _labelOutput(stream, label):
+    _log.setThreadLabel(label)
+
+    try:
+        for line in iter(stream.readline, b''):
+            _log.printLine(toString(line).rstrip())
+    finally:
+        stream.close()
 
 
 def callInteractive(cmd, replace=True, search_path=False, *args, **kwargs):
@@ -153,6 +189,11 @@ def callInteractive(cmd, replace=True, search_path=False, *args, **kwargs):
         sys.stdout.flush()
         sys.stderr.flush()
 
+        tracing = _ext.tracing
+        tracing.instant('exec', os.path.basename(cmd[0]),
+                        cmd=subprocess.list2cmdline(cmd))
+        tracing.finish(exec_next=True)
+
         # There is a problem of left FDs in Python 2
         #---
         import resource
@@ -162,7 +203,13 @@ def callInteractive(cmd, replace=True, search_path=False, *args, **kwargs):
         if (maxfd == resource.RLIM_INFINITY):
             maxfd = 10240
 
-        for fd in range(3, maxfd):
+        # keep sockets passed for socket activation
+        first_fd = 3
+
+        if os.environ.get('LISTEN_PID', None) == str(os.getpid()):
+            first_fd += int(os.environ.get('LISTEN_FDS', 0))
+
+        for fd in range(first_fd, maxfd):
             try:
                 os.close(fd)
             except OSError:
@@ -178,6 +225,12 @@ def callInteractive(cmd, replace=True, search_path=False, *args, **kwargs):
 
 
 def trySudoCall(cmd, errmsg=None, **kwargs):
+    # system package managers do not support parallel calls
+    with _sudo_lock:
+        _trySudoCall(cmd, errmsg, **kwargs)
+
+
+def _trySudoCall(cmd, errmsg, **kwargs):
     try:
         if _ext.detect.isAdmin():
             callExternal(cmd, **kwargs)
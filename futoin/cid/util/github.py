@@ -23,12 +23,11 @@ _api_ver = 'application/vnd.github.v3+json'
 
 def api_call(env, method, path, **kwargs):
     url = _api_url + path
-    _ext.configutil.requestsOptions(env, kwargs)
 
     headers = kwargs.setdefault('headers', {})
     headers.setdefault('Accept', _api_ver)
 
-    return _ext.requests.request(method, url, **kwargs)
+    return _ext.httputil.request(env, method, url, **kwargs)
 
 
 def listReleases(env, repo):
@@ -0,0 +1,294 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.ondemand import ext as _ext
+from . import log as _log
+
+_READ_CHUNK = 65536
+_MMAP_THRESHOLD = 1024 * 1024
+_CACHE_FORMAT = 1
+_MULTI_BUF_SIZE = 4 * 1024 * 1024
+
+_hashes_cache = {}
+_hashes_lock = _ext.threading.Lock()
+
+
+def walkTree(items, exclude=None):
+    """Yield (path, type) of items in os.walk(topdown) order.
+
+Type is "d" for directory, "l" for symlink to directory and "f" for
+anything else. Directory entries are sorted with files going before
+subdirectories. Symlinks to directories are not followed like in
+os.walk(). Exclude is a list of fnmatch patterns for entry names.
+"""
+    os = _ext.os
+    ospath = _ext.ospath
+    fnmatch = _ext.fnmatch
+    scandir = getattr(os, 'scandir', None)
+    exclude = exclude or []
+
+    def excluded(n):
+        for p in exclude:
+            if fnmatch.fnmatch(n, p):
+                return True
+
+        return False
+
+    for item in sorted(items):
+        if excluded(ospath.basename(item)):
+            continue
+
+        if ospath.isfile(item):
+            yield (item, 'f')
+
+        if not ospath.isdir(item):
+            continue
+
+        dir_stack = [item]
+
+        while dir_stack:
+            path = dir_stack.pop()
+            entries = []
+            dirs = []
+
+            if scandir:
+                for e in scandir(path):
+                    if excluded(e.name):
+                        pass
+                    elif not e.is_dir():
+                        entries.append((e.name, 'f'))
+                    elif e.is_symlink():
+                        entries.append((e.name, 'l'))
+                    else:
+                        dirs.append(e.name)
+            else:
+                for n in os.listdir(path):
+                    f = ospath.join(path, n)
+
+                    if excluded(n):
+                        pass
+                    elif not ospath.isdir(f):
+                        entries.append((n, 'f'))
+                    elif ospath.islink(f):
+                        entries.append((n, 'l'))
+                    else:
+                        dirs.append(n)
+
+            yield (path, 'd')
+
+            for (n, t) in sorted(entries):
+                yield (ospath.join(path, n), t)
+
+            for d in sorted(dirs, reverse=True):
+                dir_stack.append(ospath.join(path, d))
+
+
+def walkFiles(items, exclude=None):
+    """Yield files of items in os.walk(topdown) order with sorted entries.
+"""
+    for (path, t) in walkTree(items, exclude):
+        if t == 'f':
+            yield path
+
+
+def fileDigest(file_name, hash_type='sha512'):
+    hasher = _ext.hashlib.new(hash_type)
+
+    with open(file_name, 'rb') as f_in:
+        size = _ext.os.fstat(f_in.fileno()).st_size
+
+        if size >= _MMAP_THRESHOLD:
+            mmap = _ext.mmap
+            mm = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+
+            try:
+                hasher.update(mm)
+            finally:
+                mm.close()
+        else:
+            for chunk in iter(lambda: f_in.read(_READ_CHUNK), b''):
+                hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def fileHashes(file_name, hash_types):
+    """Get dict of hash type to hexdigest for file.
+
+Results are cached per file path, size, mtime and inode for the life
+of process, so the same file is read again only for new hash types.
+"""
+    os = _ext.os
+    st = os.stat(file_name)
+    key = (_ext.ospath.realpath(file_name),
+           st.st_size, st.st_mtime, st.st_ino)
+
+    with _hashes_lock:
+        cached = _hashes_cache.setdefault(key, {})
+        missing = [t for t in hash_types if t not in cached]
+
+    if missing:
+        res = _calcHashes(file_name, missing)
+
+        with _hashes_lock:
+            cached.update(res)
+
+    return dict((t, cached[t]) for t in hash_types)
+
+
+def rememberFileHashes(file_name, hashes):
+    """Add hashes calculated elsewhere, e.g. while downloading, to cache."""
+    st = _ext.os.stat(file_name)
+    key = (_ext.ospath.realpath(file_name),
+           st.st_size, st.st_mtime, st.st_ino)
+
+    with _hashes_lock:
+        _hashes_cache.setdefault(key, {}).update(hashes)
+
+
+def _calcHashes(file_name, hash_types):
+    hashlib = _ext.hashlib
+    hashers = [hashlib.new(t) for t in hash_types]
+
+    # Double buffering: next chunk is read while previous one is fed
+    # into all digests in parallel. hashlib releases GIL on large updates.
+    buffers = [bytearray(_MULTI_BUF_SIZE), bytearray(_MULTI_BUF_SIZE)]
+    buf_idx = 0
+    pending = None
+
+    if len(hashers) > 1:
+        pool = _ext.threadpool(len(hashers))
+    else:
+        pool = None
+
+    try:
+        with open(file_name, 'rb') as f:
+            while True:
+                buf = buffers[buf_idx]
+                size = f.readinto(buf)
+
+                if pending is not None:
+                    pending.get()
+                    pending = None
+
+                if not size:
+                    break
+
+                chunk = memoryview(buf)[:size]
+
+                if pool:
+                    pending = pool.map_async(
+                        lambda h, c=chunk: h.update(c), hashers)
+                else:
+                    hashers[0].update(chunk)
+
+                buf_idx = 1 - buf_idx
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    return dict((t, h.hexdigest()) for (t, h) in zip(hash_types, hashers))
+
+
+def fileDigests(files, hash_type='sha512', cache_file=None, jobs=None):
+    """Get list of (file, hexdigest) pairs in order of files.
+
+Files may be any iterable. It gets consumed by a separate thread
+while a pool of threads calculates digests. Optional persistent cache
+maps file to (size, mtime, inode) and digest to skip unchanged files.
+"""
+    os = _ext.os
+
+    if cache_file:
+        cache = _loadCache(cache_file, hash_type)
+    else:
+        cache = {}
+
+    new_cache = {}
+
+    def digest(f):
+        st = os.stat(f)
+        key = [st.st_size, st.st_mtime, st.st_ino]
+        cached = cache.get(f, None)
+
+        if cached and cached[:3] == key:
+            res = cached[3]
+        else:
+            res = fileDigest(f, hash_type)
+
+        new_cache[f] = key + [res]
+        return (f, res)
+
+    if jobs is None:
+        try:
+            jobs = _ext.multiprocessing.cpu_count()
+        except NotImplementedError:
+            jobs = 1
+
+    # exception in producer would stall imap() on some Python versions
+    walk_errors = []
+
+    def producer():
+        try:
+            for f in files:
+                yield f
+        except Exception as e:
+            walk_errors.append(e)
+
+    pool = _ext.threadpool(max(jobs, 1))
+
+    try:
+        res = list(pool.imap(digest, producer(), 16))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if walk_errors:
+        raise walk_errors[0]
+
+    if cache_file:
+        _saveCache(cache_file, hash_type, new_cache)
+
+    return res
+
+
+def _loadCache(cache_file, hash_type):
+    try:
+        cache = _ext.pathutil.loadJSONConfig(cache_file, {})
+    except ValueError:
+        return {}
+
+    if (cache.get('format', None) != _CACHE_FORMAT or
+            cache.get('hashType', None) != hash_type):
+        return {}
+
+    return cache.get('files', {})
+
+
+def _saveCache(cache_file, hash_type, files):
+    os = _ext.os
+    cache_tmp = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+
+    try:
+        _ext.pathutil.writeJSONConfig(cache_tmp, {
+            'format': _CACHE_FORMAT,
+            'hashType': hash_type,
+            'files': files,
+        }, indent=None, separators=(',', ':'))
+        os.rename(cache_tmp, cache_file)
+    except (IOError, OSError) as e:
+        _log.warn('Failed to save checksum cache: {0}'.format(e))
@@ -0,0 +1,394 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.ondemand import ext as _ext
+from . import log as _log
+
+_POOL_CONNECTIONS = 4
+_POOL_MAXSIZE = 16
+_RETRIES = 3
+_RETRY_BACKOFF = 0.5
+_RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+_RETRY_STATUS = (502, 503, 504)
+_DL_BLOCK = 1024 * 1024
+_DL_PART_MIN = 8 * 1024 * 1024
+_DL_PARALLEL = 4
+_DL_STATE_EVERY = 16 * 1024 * 1024
+_DL_HASH = 'sha256'
+
+_sessions = {}
+_sessions_lock = _ext.threading.Lock()
+
+
+def session(url):
+    """Get shared requests.Session for scheme and host of url.
+
+Connections are kept alive and reused by all calls to the same server,
+including calls from parallel threads.
+"""
+    requests = _ext.requests
+    parsed = _ext.urlparse.urlsplit(url)
+    key = '{0}://{1}'.format(parsed.scheme, parsed.netloc)
+
+    with _sessions_lock:
+        s = _sessions.get(key, None)
+
+        if s is None:
+            s = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=_POOL_CONNECTIONS,
+                pool_maxsize=_POOL_MAXSIZE,
+            )
+            s.mount('http://', adapter)
+            s.mount('https://', adapter)
+            _sessions[key] = s
+
+    return s
+
+
+def request(env, method, url, **kwargs):
+    """Make HTTP request through pooled session.
+
+Timeouts are set from env. Idempotent calls are retried with exponential
+backoff on connection errors and gateway failures. Seekable request body
+is rewound for every attempt, other streams are sent only once.
+"""
+    requests = _ext.requests
+    _ext.configutil.requestsOptions(env, kwargs)
+
+    if method.upper() in _RETRY_METHODS:
+        retries = _RETRIES
+    else:
+        retries = 0
+
+    data = kwargs.get('data', None)
+    data_pos = None
+
+    if hasattr(data, 'read'):
+        try:
+            data_pos = data.tell()
+        except (AttributeError, IOError, OSError):
+            retries = 0
+
+    s = session(url)
+    attempt = 0
+
+    while True:
+        try:
+            res = s.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+
+            _log.warn('HTTP call {0} {1} failed: {2}'.format(method, url, e))
+        else:
+            if attempt >= retries or res.status_code not in _RETRY_STATUS:
+                return res
+
+            _log.warn('HTTP call {0} {1} failed: {2}'.format(
+                method, url, res.status_code))
+            res.close()
+
+        _ext.time.sleep(_RETRY_BACKOFF * (2 ** attempt))
+        attempt += 1
+
+        if data_pos is not None:
+            data.seek(data_pos)
+
+
+def download(env, url, dst, hashes=None, **kwargs):
+    """Download url into dst file through pooled session.
+
+Large files are fetched in parallel byte ranges into preallocated
+file, if server supports ranges. Interrupted transfers are continued
+from the last position on retry and on the next call, if server
+validators (ETag or Last-Modified) still match. Hashes are calculated
+while data arrives and checked against optional dict of expected
+hashes. Return dict of calculated hashes, sha256 is always included.
+"""
+    os = _ext.os
+    dst_tmp = dst + '.tmp'
+    state_file = dst_tmp + '.state'
+    hashes = hashes or {}
+    hash_types = sorted(set([_DL_HASH] + list(hashes.keys())))
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    headers['Accept-Encoding'] = 'identity'
+
+    probe = request(env, 'GET', url, stream=True,
+                    headers=dict(headers), **kwargs)
+
+    try:
+        probe.raise_for_status()
+        size = probe.headers.get('Content-Length', None)
+        encoded = probe.headers.get(
+            'Content-Encoding', 'identity') != 'identity'
+
+        if size is not None and not encoded:
+            size = int(size)
+        else:
+            size = None
+
+        ranges = (size is not None and
+                  probe.headers.get('Accept-Ranges', '') == 'bytes')
+        validator = (probe.headers.get('ETag', None) or
+                     probe.headers.get('Last-Modified', None))
+
+        state = None
+
+        if ranges:
+            state = _loadState(state_file, dst_tmp, url, size, validator)
+
+        if state is None:
+            state = _newState(dst_tmp, state_file, url, size, validator,
+                              ranges)
+        else:
+            done = sum(p[1] - p[0] for p in state['parts'])
+            _log.info('Resuming download of {0} at {1} of {2} bytes'.format(
+                url, done, size))
+
+        if len(state['parts']) > 1:
+            _log.info('Downloading {0} in {1} parts'.format(
+                url, len(state['parts'])))
+
+        res_hashes = _fetchParts(env, url, dst_tmp, state_file, state,
+                                 probe, ranges, encoded, headers,
+                                 hash_types, kwargs)
+    finally:
+        probe.close()
+
+    for (t, v) in hashes.items():
+        if res_hashes[t] != v.lower():
+            _removeFiles(dst_tmp, state_file)
+            _log.errorExit('Hash mismatch of {0}: "{1}:{2}" != "{1}:{3}"'.format(
+                url, t, res_hashes[t], v))
+
+    _removeFiles(state_file)
+    os.rename(dst_tmp, dst)
+    _ext.hashutil.rememberFileHashes(dst, res_hashes)
+    return res_hashes
+
+
+def _newState(dst_tmp, state_file, url, size, validator, ranges):
+    os = _ext.os
+    _removeFiles(dst_tmp, state_file)
+
+    if ranges:
+        count = max(1, min(_DL_PARALLEL, size // _DL_PART_MIN))
+    else:
+        count = 1
+
+    parts = []
+
+    for i in range(count):
+        start = i * (size or 0) // count
+
+        if i + 1 < count:
+            end = (i + 1) * size // count
+        else:
+            end = size
+
+        parts.append([start, start, end])
+
+    with open(dst_tmp, 'wb') as f:
+        if size:
+            f.truncate(size)
+            fallocate = getattr(os, 'posix_fallocate', None)
+
+            if fallocate:
+                try:
+                    fallocate(f.fileno(), 0, size)
+                except OSError:
+                    pass
+
+    return {
+        'url': url,
+        'size': size,
+        'validator': validator,
+        'parts': parts,
+    }
+
+
+def _loadState(state_file, dst_tmp, url, size, validator):
+    try:
+        with open(state_file, 'r') as f:
+            state = _ext.json.load(f)
+
+        if (validator and
+                state['url'] == url and
+                state['size'] == size and
+                state['validator'] == validator and
+                _ext.ospath.getsize(dst_tmp) == size):
+            return state
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+
+    return None
+
+
+def _saveState(state_file, state):
+    os = _ext.os
+    state_tmp = '{0}.{1}.tmp'.format(state_file, os.getpid())
+
+    with open(state_tmp, 'w') as f:
+        _ext.json.dump(state, f)
+
+    os.rename(state_tmp, state_file)
+
+
+def _removeFiles(*files):
+    for f in files:
+        try:
+            _ext.os.remove(f)
+        except OSError:
+            pass
+
+
+def _hashRange(file_name, hashers, start, end):
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+
+        while start < end:
+            chunk = f.read(min(_DL_BLOCK, end - start))
+
+            if not chunk:
+                break
+
+            for h in hashers:
+                h.update(chunk)
+
+            start += len(chunk)
+
+
+def _fetchParts(env, url, dst_tmp, state_file, state, probe,
+                ranges, encoded, headers, hash_types, kwargs):
+    hashlib = _ext.hashlib
+    parts = state['parts']
+    hashers = [hashlib.new(t) for t in hash_types]
+    state_lock = _ext.threading.Lock()
+    unsaved = [0]
+    aborted = []
+
+    # first part is hashed inline, the rest as soon as they are complete
+    _hashRange(dst_tmp, hashers, parts[0][0], parts[0][1])
+
+    def progress(part, size):
+        with state_lock:
+            part[1] += size
+            unsaved[0] += size
+
+            if ranges and unsaved[0] >= _DL_STATE_EVERY:
+                _saveState(state_file, state)
+                unsaved[0] = 0
+
+    def fetch(idx):
+        part = parts[idx]
+        res = None
+        attempt = 0
+
+        if idx == 0 and part[1] == 0:
+            res = probe
+
+        with open(dst_tmp, 'r+b') as f:
+            while part[2] is None or part[1] < part[2]:
+                try:
+                    if res is None:
+                        range_headers = dict(headers)
+                        range_headers['Range'] = 'bytes={0}-{1}'.format(
+                            part[1], part[2] - 1)
+                        res = request(env, 'GET', url, stream=True,
+                                      headers=range_headers, **kwargs)
+                        res.raise_for_status()
+
+                        if res.status_code != 206:
+                            _log.errorExit(
+                                'Server ignored range request for {0}'.format(url))
+
+                    res.raw.decode_content = encoded
+                    f.seek(part[1])
+
+                    while part[2] is None or part[1] < part[2]:
+                        if aborted:
+                            return
+
+                        if part[2] is None:
+                            chunk = res.raw.read(_DL_BLOCK)
+                        else:
+                            chunk = res.raw.read(
+                                min(_DL_BLOCK, part[2] - part[1]))
+
+                        if not chunk:
+                            break
+
+                        f.write(chunk)
+
+                        if idx == 0:
+                            for h in hashers:
+                                h.update(chunk)
+
+                        progress(part, len(chunk))
+
+                    if part[2] is None:
+                        break
+                    elif part[1] < part[2]:
+                        raise IOError('Connection closed at {0} of {1}'.format(
+                            part[1], part[2]))
+                except RuntimeError:
+                    raise
+                except Exception as e:
+                    if not ranges or attempt >= _RETRIES:
+                        raise
+
+                    _log.warn('Download of {0} interrupted at {1}: {2}'.format(
+                        url, part[1], e))
+                    _ext.time.sleep(_RETRY_BACKOFF * (2 ** attempt))
+                    attempt += 1
+                finally:
+                    if res is not None and res is not probe:
+                        res.close()
+
+                    res = None
+
+    try:
+        if len(parts) > 1:
+            pool = _ext.threadpool(len(parts))
+
+            try:
+                results = [pool.apply_async(fetch, (i,))
+                           for i in range(len(parts))]
+                results[0].get()
+
+                for (i, r) in enumerate(results[1:], 1):
+                    r.get()
+                    _hashRange(dst_tmp, hashers, parts[i][0], parts[i][2])
+            except:
+                aborted.append(True)
+                raise
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            fetch(0)
+    except:
+        if ranges:
+            with state_lock:
+                _saveState(state_file, state)
+        else:
+            _removeFiles(dst_tmp, state_file)
+
+        raise
+
+    return dict((t, h.hexdigest()) for (t, h) in zip(hash_types, hashers))
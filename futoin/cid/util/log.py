@@ -19,23 +19,42 @@ from __future__ import print_function
 from ..coloring import Coloring
 from ..mixins.ondemand import ext as _ext
 
+_thread_data = _ext.threading.local()
+
+
+def setThreadLabel(label):
+    """Prefix output of current thread, e.g. for parallel tool install."""
+    _thread_data.label = label
+
+
+def threadLabel():
+    return getattr(_thread_data, 'label', None)
+
+
+def printLine(line):
+    label = threadLabel()
+
+    if label:
+        line = '[{0}] {1}'.format(label, line)
+
+    # single write to keep lines of parallel threads apart
+    _ext.sys.stderr.write(line + "\n")
+
 
 def info(msg, label=None):
     if label:  # for backward compatibility
         infoLabel(label, msg)
         return
 
-    line = Coloring.info('INFO: ' + msg)
-    print(line, file=_ext.sys.stderr)
+    printLine(Coloring.info('INFO: ' + msg))
 
 
 def infoLabel(label, msg):
-    line = Coloring.infoLabel(label) + Coloring.info(msg)
-    print(line, file=_ext.sys.stderr)
+    printLine(Coloring.infoLabel(label) + Coloring.info(msg))
 
 
 def warn(msg):
-    print(Coloring.warn('WARNING: ' + msg), file=_ext.sys.stderr)
+    printLine(Coloring.warn('WARNING: ' + msg))
 
 
 def errorExit(msg):
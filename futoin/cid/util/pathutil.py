@@ -18,6 +18,8 @@ from ..mixins.ondemand import ext as _ext
 from . import log as _log
 from . import complex_memo as _complex_memo
 
+_env_path_lock = _ext.threading.Lock()
+
 
 def which(program):
     return cachedWhich(program, _ext.os.environ["PATH"])
@@ -53,18 +55,19 @@ def addEnvPath(env_name, add_dir, first=False):
     os = _ext.os
     environ = os.environ
 
-    if env_name in os.environ:
-        dir_list = os.environ[env_name].split(os.pathsep)
-    else:
-        dir_list = []
-
-    if add_dir not in dir_list:
-        if first:
-            dir_list[0:0] = [add_dir]
+    with _env_path_lock:
+        if env_name in os.environ:
+            dir_list = os.environ[env_name].split(os.pathsep)
         else:
-            dir_list.append(add_dir)
+            dir_list = []
 
-        os.environ[env_name] = os.pathsep.join(dir_list)
+        if add_dir not in dir_list:
+            if first:
+                dir_list[0:0] = [add_dir]
+            else:
+                dir_list.append(add_dir)
+
+            os.environ[env_name] = os.pathsep.join(dir_list)
 
 
 def delEnvPath(env_name, del_dir, fail=False):
@@ -201,57 +204,238 @@ def mkDir(dir):
             raise
 
 
-def rmTree(dir, verbose=True):
+def rmTree(dir, verbose=True, parallel=False):
+    """Remove file or directory tree regardless of permissions.
+
+Only directories get permissions changed as required for removal.
+Note: files may be hardlinked to other deployments.
+"""
+    os = _ext.os
     stat = _ext.stat
 
-    if not _ext.ospath.exists(dir):
+    try:
+        st_mode = os.lstat(dir).st_mode
+    except OSError:
         return
 
     if verbose:
         _log.infoLabel('Removing: ', dir)
 
-    chmodTree(dir, stat.S_IRWXU, stat.S_IRUSR | stat.S_IWUSR)
+    if not stat.S_ISDIR(st_mode):
+        os.unlink(dir)
+    elif _hasTreeFdOps():
+        if (st_mode & stat.S_IRWXU) != stat.S_IRWXU:
+            os.chmod(dir, st_mode | stat.S_IRWXU)
 
-    if _ext.ospath.isdir(dir):
-        _ext.shutil.rmtree(dir)
+        _forTopDirFd(dir, _rmDirFd, _rmSubdirFd, parallel)
+        os.rmdir(dir)
     else:
-        _ext.os.unlink(dir)
+        chmodTree(dir, stat.S_IRWXU, None)
+        _ext.shutil.rmtree(dir)
 
 
-def chmodTree(dir, dperm, fperm, keep_execute=False):
+def chmodTree(dir, dperm, fperm, keep_execute=False, skip=None,
+              parallel=False):
+    """Change permissions of directory tree.
+
+Files are left untouched, if fperm is None. Paths in skip set are
+left untouched as well. Permissions are changed only if different.
+"""
     os = _ext.os
-    ospath = _ext.ospath
     stat = _ext.stat
 
     st_mode = os.lstat(dir).st_mode
 
-    if stat.S_ISLNK(st_mode):
+    if fperm is None and not stat.S_ISDIR(st_mode):
+        return
+    elif stat.S_ISLNK(st_mode):
         lchmod(dir, fperm)
         return
     elif not stat.S_ISDIR(st_mode):
-        os.chmod(dir, fperm)
+        _chmodEntry(dir, st_mode, fperm, keep_execute)
         return
 
-    walk_list = os.walk(dir)
-    os.chmod(dir, dperm)
+    _chmodEntry(dir, st_mode, dperm, False)
 
-    for (path, dirs, files) in walk_list:
+    if _hasTreeFdOps():
+        args = (dperm, fperm, keep_execute, skip)
+
+        def walk(fd, path, subdirs=None):
+            _chmodDirFd(fd, path, args, subdirs)
+
+        def sub(fd, path, name, st_mode):
+            _chmodSubdirFd(fd, path, name, st_mode, args)
+
+        _forTopDirFd(dir, walk, sub, parallel)
+        return
+
+    for (path, dirs, files) in os.walk(dir):
         for f in dirs + files:
             f = os.path.join(path, f)
 
             st_mode = os.lstat(f).st_mode
 
-            if stat.S_ISLNK(st_mode):
-                lchmod(f, fperm)
+            if stat.S_ISDIR(st_mode):
+                _chmodEntry(f, st_mode, dperm, False)
+            elif fperm is None or (skip and f in skip):
                 continue
+            elif stat.S_ISLNK(st_mode):
+                lchmod(f, fperm)
+            else:
+                _chmodEntry(f, st_mode, fperm, keep_execute)
 
-            if stat.S_ISDIR(st_mode):
-                os.chmod(f, dperm)
-            elif keep_execute:
-                xperm = st_mode & (stat.S_IXUSR | stat.S_IXGRP)
-                os.chmod(f, fperm | xperm)
+
+def _hasTreeFdOps():
+    os = _ext.os
+    supports_fd = getattr(os, 'supports_fd', set())
+    supports_dir_fd = getattr(os, 'supports_dir_fd', set())
+
+    return (
+        getattr(os, 'scandir', None) in supports_fd and
+        os.open in supports_dir_fd and
+        os.chmod in supports_dir_fd and
+        os.unlink in supports_dir_fd and
+        os.rmdir in supports_dir_fd
+    )
+
+
+def _chmodEntry(path, st_mode, perm, keep_execute, dir_fd=None):
+    stat = _ext.stat
+
+    if keep_execute:
+        perm |= st_mode & (stat.S_IXUSR | stat.S_IXGRP)
+
+    if stat.S_IMODE(st_mode) == perm:
+        return
+
+    if dir_fd is None:
+        _ext.os.chmod(path, perm)
+    else:
+        _ext.os.chmod(path, perm, dir_fd=dir_fd)
+
+
+def _openDirFd(name, dir_fd=None):
+    os = _ext.os
+    flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+
+    if dir_fd is None:
+        return os.open(name, flags)
+
+    return os.open(name, flags, dir_fd=dir_fd)
+
+
+def _scanDirFd(fd):
+    """Get list of (name, st_mode) without following symlinks."""
+    return [
+        (e.name, e.stat(follow_symlinks=False).st_mode)
+        for e in _ext.os.scandir(fd)
+    ]
+
+
+def _forTopDirFd(dir, walk, sub, parallel):
+    """Process directory tree through fd-relative calls.
+
+With parallel, top level subdirectories are handled by a thread pool
+as filesystem calls release GIL.
+"""
+    os = _ext.os
+
+    if parallel:
+        try:
+            jobs = _ext.multiprocessing.cpu_count()
+        except NotImplementedError:
+            jobs = 1
+
+        parallel = jobs > 1
+
+    fd = _openDirFd(dir)
+
+    try:
+        if not parallel:
+            walk(fd, dir)
+            return
+
+        subdirs = []
+        walk(fd, dir, subdirs)
+
+        if not subdirs:
+            return
+
+        pool = _ext.threadpool(max(min(jobs, len(subdirs)), 1))
+
+        try:
+            pool.map(lambda v: sub(fd, dir, v[0], v[1]), subdirs, 1)
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        os.close(fd)
+
+
+def _chmodDirFd(fd, path, args, subdirs=None):
+    stat = _ext.stat
+    (dperm, fperm, keep_execute, skip) = args
+
+    for (name, st_mode) in _scanDirFd(fd):
+        if stat.S_ISDIR(st_mode):
+            if subdirs is None:
+                _chmodSubdirFd(fd, path, name, st_mode, args)
             else:
-                os.chmod(f, fperm)
+                subdirs.append((name, st_mode))
+
+            continue
+
+        if fperm is None:
+            continue
+
+        f = _ext.ospath.join(path, name)
+
+        if skip and f in skip:
+            continue
+        elif stat.S_ISLNK(st_mode):
+            lchmod(f, fperm)
+        else:
+            _chmodEntry(name, st_mode, fperm, keep_execute, fd)
+
+
+def _chmodSubdirFd(fd, path, name, st_mode, args):
+    _chmodEntry(name, st_mode, args[0], False, fd)
+    sub_fd = _openDirFd(name, fd)
+
+    try:
+        _chmodDirFd(sub_fd, _ext.ospath.join(path, name), args)
+    finally:
+        _ext.os.close(sub_fd)
+
+
+def _rmDirFd(fd, path, subdirs=None):
+    stat = _ext.stat
+    os = _ext.os
+
+    for (name, st_mode) in _scanDirFd(fd):
+        if not stat.S_ISDIR(st_mode):
+            os.unlink(name, dir_fd=fd)
+        elif subdirs is None:
+            _rmSubdirFd(fd, path, name, st_mode)
+        else:
+            subdirs.append((name, st_mode))
+
+
+def _rmSubdirFd(fd, path, name, st_mode):
+    stat = _ext.stat
+    os = _ext.os
+
+    if (st_mode & stat.S_IRWXU) != stat.S_IRWXU:
+        os.chmod(name, st_mode | stat.S_IRWXU, dir_fd=fd)
+
+    sub_fd = _openDirFd(name, fd)
+
+    try:
+        _rmDirFd(sub_fd, _ext.ospath.join(path, name))
+    finally:
+        os.close(sub_fd)
+
+    os.rmdir(name, dir_fd=fd)
 
 
 def lchmod(target, perm):
@@ -302,29 +486,43 @@ def tmpCacheDir(**kwargs):
     return _ext.tempfile.mkdtemp(dir=tmp_dir, **kwargs)
 
 
-def downloadFile(env, url, dst):
-    dst_tmp = dst + '.tmp'
-
-    rmTree(dst_tmp)
+def downloadFile(env, url, dst, hashes=None):
     rmTree(dst)
 
-    kwargs = {}
-    _ext.configutil.requestsOptions(env, kwargs)
-    kwargs['stream'] = True
-    res = _ext.requests.request('GET', url, **kwargs)
-    res.raise_for_status()
+    key = ['url', url]
 
-    with open(dst_tmp, 'wb') as f:
-        _ext.shutil.copyfileobj(res.raw, f)
+    if not hashes and _ext.artifactcache.isEnabled(env):
+        # content of the same URL may change, cache only what can be validated
+        validator = _urlValidator(env, url)
 
-    _ext.os.rename(dst_tmp, dst)
+        if validator is None:
+            _ext.httputil.download(env, url, dst)
+            return
+
+        key.append(validator)
+
+    if _ext.artifactcache.fetch(env, key, dst, hashes):
+        return
+
+    _ext.httputil.download(env, url, dst, hashes)
+    _ext.artifactcache.store(env, key, dst, hashes)
+
+
+def _urlValidator(env, url):
+    """Get ETag or Last-Modified of URL, if any."""
+    try:
+        res = _ext.httputil.request(env, 'HEAD', url, allow_redirects=True)
+    except _ext.requests.RequestException:
+        return None
+
+    if res.status_code != 200:
+        return None
+
+    return res.headers.get('ETag', None) or res.headers.get('Last-Modified', None)
 
 
 def downloadStream(env, url, cmd):
-    kwargs = {}
-    _ext.configutil.requestsOptions(env, kwargs)
-    kwargs['stream'] = True
-    res = _ext.requests.request('GET', url, **kwargs)
+    res = _ext.httputil.request(env, 'GET', url, stream=True)
     res.raise_for_status()
 
     _ext.executil.callExternal(cmd, input_stream=res.raw)
@@ -337,10 +535,19 @@ def downloadExtract(env, url, dst, tar_algo, strip=0):
     rmTree(dst)
 
     _ext.os.makedirs(dst_tmp)
-    cmd = ['tar', 'x' + tar_algo, '-C', dst_tmp]
+
+    # through file for artifact cache
+    archive = dst_tmp + '.archive'
+    downloadFile(env, url, archive)
+
+    cmd = ['tar', 'x' + tar_algo, '-f', archive, '-C', dst_tmp]
 
     if strip:
         cmd += ['--strip-components={0}'.format(strip)]
 
-    downloadStream(env, url, cmd)
+    try:
+        _ext.executil.callExternal(cmd)
+    finally:
+        rmTree(archive)
+
     _ext.os.rename(dst_tmp, dst)
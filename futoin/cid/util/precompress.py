@@ -0,0 +1,154 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from ..mixins.ondemand import ext as _ext
+from . import log as _log
+
+# format => (webmount tune, default)
+FORMATS = {
+    'gz': ('staticGzip', True),
+    'br': ('staticBrotli', False),
+    'zst': ('staticZstd', False),
+}
+
+
+def staticFormats(config):
+    """Get set of precompression formats required by static webmounts."""
+    res = set()
+
+    if not config.get('packageGzipStatic', True):
+        return res
+
+    webcfg = config.get('webcfg', {})
+
+    for (m, v) in webcfg.get('mounts', {}).items():
+        if not isinstance(v, dict):
+            continue
+
+        if v.get('static', False):
+            pass
+        elif v.get('app', None) is None:
+            pass
+        elif m == '/' and webcfg.get('main', None) is not None:
+            pass
+        else:
+            continue
+
+        tune = v.get('tune', {})
+
+        for (fmt, (tk, tv)) in FORMATS.items():
+            if tune.get(tk, tv):
+                res.add(fmt)
+
+    return res
+
+
+def precompress(files, formats, jobs=None):
+    """Create compressed siblings of files using process pool.
+
+Formats is a map of format to external binary, if required. Siblings
+get mtime of source file. Siblings with the same mtime as source are
+treated as up-to-date and skipped. Returns number of created files.
+"""
+    os = _ext.os
+    tasks = []
+
+    for f in files:
+        src_mtime = os.stat(f).st_mtime
+
+        for (fmt, fmt_bin) in formats.items():
+            try:
+                if os.stat(f + '.' + fmt).st_mtime == src_mtime:
+                    continue
+            except OSError:
+                pass
+
+            tasks.append((f, fmt, fmt_bin))
+
+    if not tasks:
+        return 0
+
+    if jobs is None:
+        try:
+            jobs = _ext.multiprocessing.cpu_count()
+        except NotImplementedError:
+            jobs = 1
+
+    jobs = max(min(jobs, len(tasks)), 1)
+
+    if jobs == 1:
+        results = map(_compressTask, tasks)
+        pool = None
+    else:
+        pool = _ext.multiprocessing.Pool(jobs)
+        results = pool.imap_unordered(_compressTask, tasks, 4)
+
+    try:
+        for err in results:
+            if err:
+                _log.errorExit(err)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    return len(tasks)
+
+
+def _compressTask(task):
+    os = _ext.os
+    (src, fmt, fmt_bin) = task
+    dst = src + '.' + fmt
+    dst_tmp = '{0}.{1}.tmp'.format(dst, os.getpid())
+
+    try:
+        st = os.stat(src)
+
+        if fmt == 'gz':
+            _gzipFile(src, dst_tmp)
+        elif fmt == 'br':
+            _ext.executil.callExternal(
+                [fmt_bin, '-q', '11', '-f', '-o', dst_tmp, src],
+                verbose=False)
+        elif fmt == 'zst':
+            _ext.executil.callExternal(
+                [fmt_bin, '-19', '-q', '-f', '-o', dst_tmp, src],
+                verbose=False)
+        else:
+            return 'Unknown precompression format "{0}"'.format(fmt)
+
+        os.utime(dst_tmp, (st.st_atime, st.st_mtime))
+        os.rename(dst_tmp, dst)
+    except Exception as e:
+        try:
+            os.unlink(dst_tmp)
+        except OSError:
+            pass
+
+        return 'Failed to create {0}: {1}'.format(dst, e)
+
+    return None
+
+
+def _gzipFile(src, dst):
+    gzip = _ext.gzip
+    shutil = _ext.shutil
+
+    with open(src, 'rb') as f_in:
+        with open(dst, 'wb') as f_raw:
+            # no name and time for reproducible result
+            with gzip.GzipFile('', 'wb', 9, f_raw, 0) as f_out:
+                shutil.copyfileobj(f_in, f_out)
@@ -0,0 +1,279 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Optional tracing of where time is spent.
+
+Enabled by CID_TRACE=/path/to/trace.json environment variable. Spans
+are written in Chrome trace event format (chrome://tracing, Perfetto)
+on exit. Aggregated summary is written next to it with ".txt" suffix.
+Nested cid processes write their parts to be merged by the top one.
+"""
+
+from ..mixins.ondemand import ext as _ext
+from . import log as _log
+
+_TRACE_ENV = 'CID_TRACE'
+_ROOT_ENV = 'CID_TRACE_ROOT'
+_EXEC_ENV = 'CID_TRACE_EXEC'
+_SUMMARY_LIMIT = 30
+
+_trace_file = None
+_is_root = False
+_continued = False
+_events = []
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+    def set(self, key, value):
+        pass
+
+    def end(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('cat', 'name', 'args', 'start')
+
+    def __init__(self, cat, name, args):
+        self.cat = cat
+        self.name = name
+        self.args = args
+        self.start = _ext.time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.args['error'] = str(exc_value)
+
+        self.end()
+
+    def set(self, key, value):
+        self.args[key] = value
+
+    def end(self):
+        if self.start is None:
+            return
+
+        now = _ext.time.time()
+        _events.append({
+            'name': self.name,
+            'cat': self.cat,
+            'ph': 'X',
+            'ts': int(self.start * 1e6),
+            'dur': int((now - self.start) * 1e6),
+            'pid': _ext.os.getpid(),
+            'tid': _ext.threading.current_thread().ident,
+            'args': self.args,
+        })
+        self.start = None
+
+
+def _init():
+    g = globals()
+    os = _ext.os
+    trace_file = os.environ.get(_TRACE_ENV, None)
+
+    if not trace_file:
+        return
+
+    # cid changes working directory
+    trace_file = _ext.ospath.realpath(trace_file)
+    os.environ[_TRACE_ENV] = trace_file
+
+    pid = str(os.getpid())
+
+    # exec() keeps pid
+    if os.environ.get(_ROOT_ENV, pid) == pid:
+        os.environ[_ROOT_ENV] = pid
+        g['_is_root'] = True
+        g['_continued'] = os.environ.pop(_EXEC_ENV, None) == pid
+
+    g['_trace_file'] = trace_file
+    _ext.atexit.register(finish)
+
+    _events.append({
+        'name': 'process_name',
+        'ph': 'M',
+        'pid': os.getpid(),
+        'args': {'name': ' '.join(_ext.sys.argv)},
+    })
+
+
+def enabled():
+    return _trace_file is not None
+
+
+def span(cat, name, **args):
+    """Start span, use as context manager or call end() explicitly."""
+    if _trace_file is None:
+        return _NULL_SPAN
+
+    return _Span(cat, name, args)
+
+
+def instant(cat, name, **args):
+    if _trace_file is None:
+        return
+
+    _events.append({
+        'name': name,
+        'cat': cat,
+        'ph': 'i',
+        's': 'p',
+        'ts': int(_ext.time.time() * 1e6),
+        'pid': _ext.os.getpid(),
+        'tid': _ext.threading.current_thread().ident,
+        'args': args,
+    })
+
+
+def traceMethods(cls, methods, cat):
+    """Wrap methods of class to record spans, if tracing is enabled.
+
+Span name is "{self._name}.{method}". Each class is wrapped once.
+"""
+    if _trace_file is None:
+        return
+
+    for m in methods:
+        orig = getattr(cls, m, None)
+
+        if orig is None or getattr(orig, '_cid_traced', False):
+            continue
+
+        setattr(cls, m, _wrapMethod(orig, m, cat))
+
+
+def _wrapMethod(orig, method, cat):
+    def wrapper(self, *args, **kwargs):
+        name = '{0}.{1}'.format(getattr(self, '_name', ''), method)
+
+        with span(cat, name):
+            return orig(self, *args, **kwargs)
+
+    wrapper._cid_traced = True
+    return wrapper
+
+
+def finish(exec_next=False):
+    """Write collected events. Called on exit and before exec()."""
+    g = globals()
+    trace_file = _trace_file
+
+    if trace_file is None:
+        return
+
+    g['_trace_file'] = None
+    os = _ext.os
+    json = _ext.json
+    events = list(_events)
+    del _events[:]
+
+    try:
+        if not _is_root:
+            _writeJSON('{0}.{1}-{2}.part'.format(
+                trace_file, os.getpid(), int(_ext.time.time() * 1e6)),
+                events)
+            return
+
+        if exec_next:
+            # continue in the same trace, if exec'ed process is cid
+            os.environ[_EXEC_ENV] = str(os.getpid())
+
+        if _continued:
+            try:
+                with open(trace_file, 'r') as f:
+                    events = json.load(f)['traceEvents'] + events
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+
+        for part in _ext.glob.glob(trace_file + '.*.part'):
+            try:
+                with open(part, 'r') as f:
+                    events += json.load(f)
+
+                os.remove(part)
+            except (IOError, OSError, ValueError):
+                pass
+
+        _writeJSON(trace_file, {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+        })
+
+        summary_file = trace_file + '.txt'
+        _ext.pathutil.writeTextFile(summary_file, _summary(events))
+        _log.info('Trace is written to {0} and {1}'.format(
+            trace_file, summary_file))
+    except (IOError, OSError) as e:
+        _log.warn('Failed to write trace: {0}'.format(e))
+
+
+def _writeJSON(file_name, content):
+    os = _ext.os
+    tmp_file = '{0}.{1}.tmp'.format(file_name, os.getpid())
+
+    with open(tmp_file, 'w') as f:
+        _ext.json.dump(content, f)
+
+    os.rename(tmp_file, file_name)
+
+
+def _summary(events):
+    stats = {}
+
+    for e in events:
+        if e['ph'] != 'X':
+            continue
+
+        key = (e['cat'], e['name'])
+        s = stats.setdefault(key, [0, 0, 0])
+        s[0] += 1
+        s[1] += e['dur']
+        s[2] = max(s[2], e['dur'])
+
+    res = ['{0:>7} {1:>10} {2:>10}  {3:<6} {4}'.format(
+        'count', 'total_s', 'max_s', 'cat', 'name')]
+    ordered = sorted(stats.items(), key=lambda v: v[1][1], reverse=True)
+
+    for ((cat, name), (count, total, max_dur)) in ordered[:_SUMMARY_LIMIT]:
+        if len(name) > 100:
+            name = name[:97] + '...'
+
+        res.append('{0:>7} {1:>10.3f} {2:>10.3f}  {3:<6} {4}'.format(
+            count, total / 1e6, max_dur / 1e6, cat, name))
+
+    if len(ordered) > _SUMMARY_LIMIT:
+        res.append('... {0} more'.format(len(ordered) - _SUMMARY_LIMIT))
+
+    res.append('')
+    return "\n".join(res)
+
+
+_init()
@@ -0,0 +1,511 @@
+#
+# Copyright 2015-2017 Andrey Galkin <andrey@futoin.org>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Benchmarks of CPU-bound parts of CID Tool on synthetic data.
+
+Neither network nor root is required. Results are written as JSON to
+track regressions over time. Optional comparison prints ratio to
+previous results.
+
+Usage:
+    cid_benchmark.py [--output=<json>] [--compare=<json>] [--repeat=<count>] [--entry-points=<count>] [--filter=<name>]
+
+Options:
+    --output=<json>         Write results to file.
+    --compare=<json>        Compare to previous results.
+    --repeat=<count>        Runs per benchmark [default: 10].
+    --entry-points=<count>  Entry points in synthetic deployment [default: 40].
+    --filter=<name>         Run only benchmarks with name containing it.
+"""
+
+from __future__ import print_function, absolute_import
+
+import os
+import sys
+import json
+import copy
+import time
+import shutil
+import random
+import platform
+import tempfile
+from collections import OrderedDict
+
+try:
+    from docopt import docopt
+except ImportError:
+    from futoin.cid.contrib.docopt import docopt
+
+from futoin.cid import __version__ as _cid_version
+from futoin.cid.details.resourcealgo import ResourceAlgo
+from futoin.cid.util import versionutil
+
+_BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register function which prepares data and returns callable to time."""
+    def wrap(f):
+        _BENCHMARKS.append((name, f))
+        return f
+
+    return wrap
+
+
+#=============================================================================
+def _entryPoints(count):
+    protocols = ('http', 'fcgi', 'scgi', 'uwsgi')
+    res = OrderedDict()
+
+    res['web'] = {
+        'tool': 'nginx',
+        'path': 'webroot',
+        'tune': {
+            'minMemory': '8M',
+            'connMemory': '32K',
+            'connFD': 8,
+            'maxRequestSize': '1M',
+            'socketProtocol': 'http',
+            'socketTypes': ['unix', 'tcp', 'tcp6'],
+            'socketType': 'tcp',
+            'socketPort': 8080,
+            'scalable': False,
+        },
+    }
+
+    for i in range(1, count):
+        res['app{0}'.format(i)] = {
+            'tool': 'exe',
+            'path': 'app{0}.sh'.format(i),
+            'tune': {
+                'minMemory': '{0}M'.format(16 + i % 7 * 16),
+                'connMemory': '{0}K'.format(64 + i % 5 * 64),
+                'memWeight': 50 + i % 4 * 50,
+                'multiCore': (i % 3) == 0,
+                'reloadable': (i % 4) == 0,
+                'maxRequestSize': '1M',
+                'socketProtocol': protocols[i % len(protocols)],
+                'socketTypes': ['unix', 'tcp'],
+                'socketType': (i % 2) and 'unix' or 'tcp',
+            },
+        }
+
+    return res
+
+
+def _deployConfig(ep_count, work_dir):
+    entry_points = _entryPoints(ep_count)
+
+    return {
+        'name': 'benchmark/app',
+        'version': '1.0.0',
+        'deployDir': work_dir,
+        'wcDir': work_dir,
+        'entryPoints': entry_points,
+        'webcfg': {
+            'root': 'webroot',
+            'main': 'app1',
+            'mounts': OrderedDict(
+                ('/{0}/'.format(en), {'app': en, 'static': True})
+                for en in entry_points if en != 'web'
+            ),
+        },
+        'deploy': {
+            'maxTotalMemory': '{0}M'.format(ep_count * 256),
+            'maxCpuCount': 16,
+        },
+        'env': {
+            'type': 'prod',
+        },
+    }
+
+
+def _writeJSON(file_name, content):
+    with open(file_name, 'w') as f:
+        json.dump(content, f, indent=2)
+
+
+#=============================================================================
+@benchmark('resourcealgo.distributeResources')
+def bench_distribute(args, work_dir):
+    config = _deployConfig(args['ep_count'], work_dir)
+
+    def run():
+        cfg = copy.deepcopy(config)
+        ResourceAlgo().distributeResources(cfg, 4 * 1024**3, 16)
+
+    return run
+
+
+@benchmark('resourcealgo.configServices')
+def bench_config_services(args, work_dir):
+    config = _deployConfig(args['ep_count'], work_dir)
+
+    def run():
+        cfg = copy.deepcopy(config)
+        ResourceAlgo().configServices(cfg)
+
+    return run
+
+
+@benchmark('config._initConfig')
+def bench_init_config(args, work_dir):
+    from futoin.cid.cidtool import CIDTool
+
+    ep_count = args['ep_count']
+    deploy_dir = os.path.join(work_dir, 'deploy')
+    current_dir = os.path.join(deploy_dir, 'current')
+    home_dir = os.path.join(work_dir, 'home')
+    os.makedirs(current_dir)
+    os.makedirs(home_dir)
+
+    config = _deployConfig(ep_count, deploy_dir)
+    ResourceAlgo().configServices(config)
+    tools = ['exe', 'nginx']
+
+    # project manifest
+    _writeJSON(os.path.join(current_dir, 'futoin.json'), {
+        'name': config['name'],
+        'version': config['version'],
+        'entryPoints': config['entryPoints'],
+        'webcfg': config['webcfg'],
+        'actions': dict(
+            ('action{0}'.format(i), ['@default', 'echo {0}'.format(i)])
+            for i in range(ep_count)),
+        'persistent': ['data{0}'.format(i) for i in range(ep_count)],
+    })
+
+    # deployment config overrides most of the project one
+    _writeJSON(os.path.join(deploy_dir, 'futoin.json'), {
+        'entryPoints': config['entryPoints'],
+        'deploy': config['deploy'],
+        'env': dict(
+            ('var{0}'.format(i), 'value{0}'.format(i))
+            for i in range(ep_count * 5)),
+        'tools': dict((t, True) for t in tools),
+        'toolTune': dict(
+            (t, dict(('opt{0}'.format(i), i) for i in range(ep_count)))
+            for t in tools),
+    })
+
+    # global config requires root, so the user one is filled instead
+    _writeJSON(os.path.join(home_dir, '.futoin.json'), {
+        'env': dict(
+            [('userVar{0}'.format(i), 'value{0}'.format(i))
+             for i in range(ep_count * 5)] +
+            [('externalSetup', False)]),
+    })
+
+    os.environ['HOME'] = home_dir
+    # tools are only checked, never installed
+    cit = CIDTool(overrides={'deployDir': deploy_dir, 'toolTest': True})
+
+    def run():
+        cit._initConfig()
+
+    return run
+
+
+@benchmark('service._configServiceList')
+def bench_config_service_list(args, work_dir):
+    from futoin.cid.cidtool import CIDTool
+
+    config = _deployConfig(args['ep_count'], work_dir)
+    ResourceAlgo().configServices(config)
+    config['toolTune'] = {
+        'exe': dict(('opt{0}'.format(i), {'nested': list(range(10))})
+                    for i in range(20)),
+    }
+    cit = CIDTool(overrides={})
+
+    def run():
+        cit._configServiceList(config)
+
+    return run
+
+
+@benchmark('nginx.ConfigBuilder.build')
+def bench_nginx_build(args, work_dir):
+    from futoin.cid.details.nginx import ConfigBuilder
+
+    # only version is queried from nginx binary
+    nginx_bin = os.path.join(work_dir, 'nginx')
+
+    with open(nginx_bin, 'w') as f:
+        f.write("#!/bin/sh\necho 'nginx version: nginx/1.12.2' >&2\n")
+
+    os.chmod(nginx_bin, 0o755)
+
+    config = _deployConfig(args['ep_count'], work_dir)
+    config['env']['nginxBin'] = nginx_bin
+    ResourceAlgo().configServices(config)
+
+    svc = copy.deepcopy(config['entryPoints']['web'])
+    svc['tune'].update(config['deploy']['autoServices']['web'][0])
+
+    def run():
+        builder = ConfigBuilder(config, svc)
+        builder.build('web-0', 'nginx.pid', work_dir)
+
+    return run
+
+
+@benchmark('nginx.ConfigBuilder.getTextConfig')
+def bench_nginx_text(args, work_dir):
+    from futoin.cid.details.nginx import ConfigBuilder
+
+    run_build = bench_nginx_build(args, work_dir)
+    builder = []
+
+    orig_init = ConfigBuilder.__init__
+
+    # build once, then measure only text generation
+    def init(self, *a, **kw):
+        orig_init(self, *a, **kw)
+        builder.append(self)
+
+    ConfigBuilder.__init__ = init
+
+    try:
+        run_build()
+    finally:
+        ConfigBuilder.__init__ = orig_init
+
+    def run():
+        builder[0].getTextConfig()
+
+    return run
+
+
+@benchmark('versionutil.sort')
+def bench_version_sort(args, work_dir):
+    rnd = random.Random(1)
+    tags = ['{0}.{1}.{2}'.format(rnd.randint(0, 20), rnd.randint(0, 50),
+                                 rnd.randint(0, 100))
+            for _ in range(10000)]
+
+    def run():
+        versionutil.sort(list(tags))
+
+    return run
+
+
+def _sourceTree(src_dir, dirs, files, max_lines):
+    rnd = random.Random(1)
+    content = []
+
+    for d in range(dirs):
+        sub_dir = 'dir{0}'.format(d)
+        os.makedirs(os.path.join(src_dir, sub_dir))
+        content.append(sub_dir)
+
+        for f in range(files):
+            file_name = os.path.join(src_dir, sub_dir, 'file{0}.txt'.format(f))
+
+            with open(file_name, 'w') as fh:
+                fh.write(''.join(
+                    'line {0} of {1}/{2}\n'.format(l, d, f)
+                    for l in range(rnd.randint(10, max_lines))))
+
+    return content
+
+
+@benchmark('pathutil.chmodTree')
+def bench_chmod_tree(args, work_dir):
+    from futoin.cid.util import pathutil
+
+    _sourceTree(work_dir, 50, 100, 10)
+    perms = [(0o750, 0o640), (0o755, 0o644)]
+
+    def run():
+        (dperm, fperm) = perms.pop(0)
+        perms.append((dperm, fperm))
+        pathutil.chmodTree(work_dir, dperm, fperm, keep_execute=True)
+
+    return run
+
+
+def _benchRmTree(args, work_dir, fd_ops):
+    from futoin.cid.util import pathutil
+
+    trees = []
+
+    for i in range(args['repeat']):
+        tree = os.path.join(work_dir, 'tree{0}'.format(i))
+        _sourceTree(tree, 50, 100, 10)
+        trees.append(tree)
+
+    has_fd_ops = pathutil._hasTreeFdOps
+
+    def run():
+        if not fd_ops:
+            pathutil._hasTreeFdOps = lambda: False
+
+        try:
+            pathutil.rmTree(trees.pop(), verbose=False, parallel=True)
+        finally:
+            pathutil._hasTreeFdOps = has_fd_ops
+
+    return run
+
+
+@benchmark('pathutil.rmTree')
+def bench_rm_tree(args, work_dir):
+    return _benchRmTree(args, work_dir, True)
+
+
+@benchmark('pathutil.rmTree.walk')
+def bench_rm_tree_walk(args, work_dir):
+    # fallback of Python 2 for comparison
+    return _benchRmTree(args, work_dir, False)
+
+
+@benchmark('hashutil.packageChecksums')
+def bench_package_checksums(args, work_dir):
+    from futoin.cid.util import hashutil
+
+    content = _sourceTree(work_dir, 20, 50, 1000)
+    os.chdir(work_dir)
+
+    # the same as "tar" package engine does
+    def run():
+        files = hashutil.walkFiles(content)
+        list(hashutil.fileDigests(files, 'sha512'))
+
+    return run
+
+
+@benchmark('cidtool.package')
+def bench_package(args, work_dir):
+    from futoin.cid.cidtool import CIDTool
+
+    src_dir = os.path.join(work_dir, 'src')
+    content = _sourceTree(src_dir, 10, 20, 200)
+
+    _writeJSON(os.path.join(src_dir, 'futoin.json'), {
+        'name': 'benchmark',
+        'version': '1.0.0',
+        'tools': {'futoin': True},
+        'package': content,
+    })
+
+    def run():
+        os.chdir(src_dir)
+
+        for f in os.listdir('.'):
+            if f.endswith('.txz'):
+                os.unlink(f)
+
+        cit = CIDTool(overrides={'wcDir': src_dir})
+        cit.package()
+
+    return run
+
+
+#=============================================================================
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+
+    if len(values) % 2:
+        return values[mid]
+
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def runBenchmarks(args):
+    results = OrderedDict()
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+
+    for (name, prepare) in _BENCHMARKS:
+        if args['filter'] and args['filter'] not in name:
+            continue
+
+        work_dir = os.path.realpath(tempfile.mkdtemp(prefix='cid-bench-'))
+
+        try:
+            run = prepare(args, work_dir)
+            times = []
+
+            for _ in range(args['repeat']):
+                start = time.time()
+                run()
+                times.append(time.time() - start)
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        results[name] = OrderedDict([
+            ('min', min(times)),
+            ('median', _median(times)),
+            ('mean', sum(times) / len(times)),
+            ('repeat', len(times)),
+        ])
+
+    return results
+
+
+def main():
+    opts = docopt(__doc__)
+    args = {
+        'repeat': int(opts['--repeat']),
+        'ep_count': int(opts['--entry-points']),
+        'filter': opts['--filter'],
+    }
+
+    # keep output of CID away from results
+    orig_stdout = sys.stdout
+    sys.stdout = sys.stderr
+
+    try:
+        results = runBenchmarks(args)
+    finally:
+        sys.stdout = orig_stdout
+
+    report = OrderedDict([
+        ('cidVersion', _cid_version),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('timestamp', int(time.time())),
+        ('repeat', args['repeat']),
+        ('entryPoints', args['ep_count']),
+        ('results', results),
+    ])
+
+    previous = {}
+
+    if opts['--compare']:
+        with open(opts['--compare'], 'r') as f:
+            previous = json.load(f).get('results', {})
+
+    for (name, res) in results.items():
+        line = '{0:<40} {1:>10.6f}s'.format(name, res['median'])
+
+        if name in previous:
+            line += ' {0:>7.2f}x'.format(
+                res['median'] / previous[name]['median'])
+
+        print(line)
+
+    if opts['--output']:
+        _writeJSON(opts['--output'], report)
+
+
+if __name__ == '__main__':
+    main()
@@ -505,6 +505,9 @@ class cid_deploy_Test( cid_UTBase ) :
         
         self._writeFile('cgroup_mem', '1234567')
         self.assertEqual(1234567, ra.cgroupMemory('cgroup_mem'))
+        
+        self._writeFile('cgroup_mem', 'max\n')
+        self.assertEqual(None, ra.cgroupMemory('cgroup_mem'))
     
     def test_20_memdetect_config(self):
         self._call_cid(['deploy', 'setup',
@@ -537,6 +540,20 @@ class cid_deploy_Test( cid_UTBase ) :
         
         self._writeFile('cgroup_cpu', '1,3-6,8\n')
         self.assertEqual(6, ra.cgroupCpuCount('cgroup_cpu'))
+        self.assertEqual([1, 3, 4, 5, 6, 8], ra.cgroupCpuSet('cgroup_cpu'))
+        
+        self._writeFile('cpu.max', 'max 100000\n')
+        self.assertEqual(None, ra.cgroupCpuQuota('cpu.max'))
+        
+        self._writeFile('cpu.max', '250000 100000\n')
+        self.assertEqual(3, ra.cgroupCpuQuota('cpu.max'))
+        
+        self._writeFile('cpu.cfs_quota_us', '50000\n')
+        self._writeFile('cpu.cfs_period_us', '100000\n')
+        self.assertEqual(1, ra.cgroupCpuQuota('cpu.cfs_quota_us'))
+        
+        os.unlink('cpu.cfs_period_us')
+        self.assertEqual(None, ra.cgroupCpuQuota('cpu.cfs_quota_us'))
         
     def test_30_cpudetect_config(self):
         self._call_cid(['deploy', 'setup',
@@ -633,6 +650,69 @@ class cid_deploy_Test( cid_UTBase ) :
         self.assertAlmostEqual(int(base * 50 / 350 + 100) * mb, service_mem['scalableMono'], delta=mb)
         self.assertAlmostEqual(int(base * 300 / 350 + 3*1024) * mb, service_mem['scalableMulti'], delta=mb)
         self.assertEqual(4 * 1024 * mb, service_mem['nonScalable'])
+        
+    def test_30_cpu_affinity(self):
+        ra = ResourceAlgo()
+        ra.availableCpus = lambda: [0, 1, 2, 3, 4, 5]
+        
+        autoServices = {
+            'a' : [{'maxCpuCount': 1}, {'maxCpuCount': 1}],
+            'b' : [{'maxCpuCount': 2}],
+            'c' : [{'maxCpuCount': 4}],
+        }
+        ra.planCpuAffinity(autoServices, 5)
+        
+        self.assertEqual([0], autoServices['a'][0]['cpuAffinity'])
+        self.assertEqual([1], autoServices['a'][1]['cpuAffinity'])
+        self.assertEqual([2, 3], autoServices['b'][0]['cpuAffinity'])
+        self.assertEqual([4, 0, 1, 2], autoServices['c'][0]['cpuAffinity'])
+        
+        ra.availableCpus = lambda: []
+        autoServices = {
+            'a' : [{'maxCpuCount': 1}],
+        }
+        ra.planCpuAffinity(autoServices, 5)
+        self.assertFalse('cpuAffinity' in autoServices['a'][0])
+        
+    def test_30_usage_feedback(self):
+        ra = ResourceAlgo()
+        mb = 1024*1024
+        tune = {
+            'minMemory' : '10M',
+            'connMemory' : '32K',
+            'multiCore' : False,
+            'maxRequestSize' : '1M',
+            'socketProtocol': 'http',
+        }
+        config = {
+            'deployDir' : '.',
+            'entryPoints': {
+                'heavy' : { 'tool': 'invalid', 'tune': dict(tune) },
+                'light' : { 'tool': 'invalid', 'tune': dict(tune) },
+            },
+            'deploy' : {
+                'usageFeedback' : True,
+            },
+        }
+        
+        self._writeJSON(ResourceAlgo.USAGE_FILE, {
+            'heavy' : [[0, 2, 600*mb, 300*mb, 0.5]] * 5,
+            'light' : [[0, 3, 150*mb, 50*mb, 2.0]] * 12,
+        })
+        self.assertEqual({}, ra.observedUsage(config))
+        
+        self._writeJSON(ResourceAlgo.USAGE_FILE, {
+            'heavy' : [[0, 2, 600*mb, 300*mb, 0.5]] * 12,
+            'light' : [[0, 3, 150*mb, 50*mb, 2.0]] * 12,
+        })
+        ra.distributeResources(config, 4096*mb, 8)
+        autoServices = config['deploy']['autoServices']
+        
+        self.assertEqual(2, len(autoServices['heavy']))
+        self.assertEqual(3, len(autoServices['light']))
+        self.assertGreater(
+            _configutil.parseMemory(autoServices['heavy'][0]['maxMemory']),
+            300*mb)
 
 class cid_devserve_Test( cid_UTBase ) :
     __test__ = True
@@ -162,7 +162,9 @@ system_tools = [
     'nginx',
     'bzip2',
     'gzip',
+    'brotli',
     'xz',
+    'zstd',
     'rust',
     'docker',
 ]
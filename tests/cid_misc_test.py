@@ -22,9 +22,118 @@ from futoin.cid.rmstool import RmsTool
 import os, stat
 import subprocess
 import glob
+import threading
 
 from collections import OrderedDict
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class _TestHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_HEAD(self):
+        self._handle('HEAD')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        srv = self.server
+        length = int(self.headers.get('Content-Length', None) or 0)
+        body = self.rfile.read(length)
+        req_range = self.headers.get('Range', None)
+
+        with srv.lock:
+            srv.requests.append((method, req_range, body))
+            fail = srv.fail_status and srv.fail_status.pop(0)
+            cut = srv.disconnect_at and srv.disconnect_at.pop(0)
+
+        if fail == 'close':
+            self.close_connection = True
+            return
+        elif fail:
+            self.send_response(fail)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        content = srv.content
+        (start, end) = (0, len(content))
+
+        if srv.ranges and req_range:
+            (start, end) = req_range.split('=')[1].split('-')
+            (start, end) = (int(start), int(end) + 1)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, end - 1, len(content)))
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('ETag', '"v1"')
+
+        if srv.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+
+        self.end_headers()
+
+        if method == 'HEAD':
+            return
+
+        data = content[start:end]
+
+        if cut and cut < len(data):
+            self.wfile.write(data[:cut])
+            self.close_connection = True
+            return
+
+        self.wfile.write(data)
+
+
+class _TestHTTPServer(ThreadingMixIn, HTTPServer):
+    """Local server with range support and injected failures."""
+    daemon_threads = True
+
+    def __init__(self, content):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _TestHTTPHandler)
+        self.content = content
+        self.ranges = True
+        self.fail_status = []
+        self.disconnect_at = []
+        self.requests = []
+        self.lock = threading.Lock()
+        self.url = 'http://127.0.0.1:{0}/file'.format(self.server_address[1])
+
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def handle_error(self, request, client_address):
+        # client side disconnects are expected
+        pass
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
 class cid_misc_Test ( cid_UTBase ) :
     __test__ = True
     TEST_DIR = os.path.join(cid_UTBase.TEST_RUN_DIR, 'misc')
@@ -99,3 +208,903 @@ class cid_misc_Test ( cid_UTBase ) :
         self._call_cid(['tool', 'install'], returncode=1)
 
 
+
+    def test_plugin_registry(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'registry-test',
+        })
+        self._writeFile(os.path.join(self.TEST_DIR, 'Makefile'), '')
+
+        registry = os.path.join(os.environ['HOME'], '.cache', 'futoin-cid',
+                                'plugins', 'registry.json')
+
+        first = self._call_cid(['tool', 'detect'], retout=True)
+        self.assertTrue(os.path.exists(registry))
+        self.assertTrue('make' in first.split())
+
+        cached = self._call_cid(['tool', 'detect'], retout=True)
+        self.assertEqual(first, cached)
+
+        self._writeFile(registry, '{ broken')
+        broken = self._call_cid(['tool', 'detect'], retout=True)
+        self.assertEqual(first, broken)
+        host = self._readJSON(registry)['host']
+
+        tools = self._readJSON(registry)['packs']['futoin.cid.tool']['tools']
+        self.assertFalse(tools['make']['customDetect'])
+        self.assertTrue(tools['svn']['customDetect'])
+
+        # registry of other host is not used
+        other = self._readJSON(registry)
+        other['host'] = 'Other'
+        other['packs']['futoin.cid.tool']['tools']['make']['deps'] = ['unknown']
+        self._writeJSON(registry, other)
+        self.assertEqual(first, self._call_cid(['tool', 'detect'], retout=True))
+        self.assertEqual(host, self._readJSON(registry)['host'])
+
+    def test_env_cache(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'envcache-test',
+        })
+        self._writeFile(os.path.join(self.TEST_DIR, 'Makefile'), 'all:\n\ttrue\n')
+
+        cache_dir = os.path.join(os.environ['HOME'], '.cache', 'futoin-cid',
+                                 'envcache')
+
+        self._call_cid(['build', '--no-env-cache'])
+        self.assertFalse(os.path.exists(cache_dir) and os.listdir(cache_dir))
+
+        self._call_cid(['build'])
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        self._call_cid(['build'])
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        snapshot = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(snapshot).st_mode))
+
+        # changed or missing tool binaries invalidate snapshot
+        content = self._readJSON(snapshot)
+        self.assertTrue(content['binaries'])
+
+        for b in content['binaries']:
+            content['binaries'][b] = 0
+
+        self._writeJSON(snapshot, content)
+        self._call_cid(['build'])
+        content = self._readJSON(snapshot)
+        self.assertNotIn(0, content['binaries'].values())
+
+        removed_bin = os.path.join(self.TEST_DIR, 'removed')
+        self._writeFile(removed_bin, '')
+        content['env']['removedBin'] = removed_bin
+        content['binaries'][removed_bin] = os.stat(removed_bin).st_mtime
+        self._writeJSON(snapshot, content)
+        os.unlink(removed_bin)
+        self._call_cid(['build'])
+        self.assertNotIn('removedBin', self._readJSON(snapshot)['env'])
+
+        # unrelated per-run variables do not affect key
+        os.environ['CID_TEST_SESSION'] = str(os.getpid())
+
+        try:
+            self._call_cid(['build'])
+        finally:
+            del os.environ['CID_TEST_SESSION']
+
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        # stale snapshots are evicted
+        for i in range(70):
+            stale = os.path.join(cache_dir, 'stale{0}.json'.format(i))
+            self._writeFile(stale, '{}')
+            os.utime(stale, (i, i))
+
+        self._call_cid(['build', '--debug'])
+        self.assertEqual(2, len(os.listdir(cache_dir)))
+
+        self._call_cid(['tool', 'envcache', 'clear'])
+        self.assertFalse(os.path.exists(cache_dir))
+
+    def test_cli_cache(self):
+        cache_dir = os.path.join(os.environ['HOME'], '.cache', 'futoin-cid',
+                                 'cli')
+
+        help_text = self._call_cid(['--help'], retout=True)
+        self.assertIn('cid tool envexec', help_text)
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        self.assertEqual(help_text, self._call_cid(['--help'], retout=True))
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        self._call_cid(['tool', 'bogus'], returncode=1)
+
+    def test_trace(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'trace-test',
+        })
+        self._writeFile(os.path.join(self.TEST_DIR, 'Makefile'), 'all:\n\ttrue\n')
+
+        trace_file = os.path.join(self.TEST_DIR, 'trace.json')
+        os.environ['CID_TRACE'] = trace_file
+
+        try:
+            self._call_cid(['build'])
+        finally:
+            del os.environ['CID_TRACE']
+
+        events = self._readJSON(trace_file)['traceEvents']
+        names = set(e['name'] for e in events if e['ph'] == 'X')
+        self.assertIn('initConfig', names)
+        self.assertIn('make.onBuild', names)
+        self.assertIn('make', names)
+
+        with open(trace_file + '.txt', 'r') as f:
+            self.assertIn('make.onBuild', f.read())
+
+    def test_package_checksums(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'checksums-test',
+            'version' : '1.0.0',
+            'package' : ['data', 'top.txt'],
+            'packageChecksumsCache' : True,
+            'packageEngine' : 'tar',
+        })
+        os.makedirs(os.path.join(self.TEST_DIR, 'data', 'sub'))
+        self._writeFile(os.path.join(self.TEST_DIR, 'top.txt'), 'top')
+        self._writeFile(os.path.join(self.TEST_DIR, 'data', 'b.txt'), 'b')
+        self._writeFile(os.path.join(self.TEST_DIR, 'data', 'sub', 'a.txt'), 'a')
+
+        with open(os.path.join(self.TEST_DIR, 'data', 'big.bin'), 'wb') as f:
+            f.write(b'x' * (3 * 1024 * 1024))
+
+        cache_dir = os.path.join(os.environ['HOME'], '.cache', 'futoin-cid',
+                                 'checksums')
+
+        self._call_cid(['package'])
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        with open('.package.checksums', 'r') as f:
+            first = f.read()
+
+        self.assertEqual(
+            ['data/b.txt', 'data/big.bin', 'data/sub/a.txt', 'top.txt'],
+            [l.split('  ', 1)[1] for l in first.split('\n') if l])
+
+        try:
+            subprocess.check_output('sha512sum -c .package.checksums',
+                                    shell=True, stderr=self._stderr_log)
+        except:
+            if os.path.exists('/usr/bin/sha512sum'):
+                raise
+
+        self._call_cid(['package'])
+
+        with open('.package.checksums', 'r') as f:
+            self.assertEqual(first, f.read())
+
+    def test_package_native(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'native-test',
+            'version' : '1.0.0',
+            'package' : ['data', 'futoin.json'],
+            'packageFormat' : 'tzst',
+        })
+        os.makedirs(os.path.join(self.TEST_DIR, 'data', '.git'))
+        self._writeFile(os.path.join(self.TEST_DIR, 'data', 'a.txt'), 'a')
+        self._writeFile(os.path.join(self.TEST_DIR, 'data', '.git', 'x'), 'x')
+        os.symlink('a.txt', os.path.join(self.TEST_DIR, 'data', 'link.txt'))
+
+        # sockets are skipped
+        import socket
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(os.path.join(self.TEST_DIR, 'data', 'sock'))
+        sock.close()
+
+        self._call_cid(['package'])
+        package = glob.glob('native-test-CI-1.0.0-*.tzst')
+        self.assertEqual(1, len(package))
+        package = package[0]
+
+        with open('.package.checksums', 'r') as f:
+            checksums = f.read()
+
+        self.assertEqual(
+            ['data/a.txt', 'data/link.txt', 'futoin.json'],
+            [l.split('  ', 1)[1] for l in checksums.split('\n') if l])
+
+        content = subprocess.check_output(
+            ['tar', '-t', '--use-compress-program=zstd', '-f', package],
+            stderr=self._stderr_log)
+        content = content.decode('utf8').split()
+        self.assertEqual([
+            '.package.checksums',
+            'data/',
+            'data/a.txt',
+            'data/link.txt',
+            'futoin.json',
+        ], content)
+        self.assertEqual([], glob.glob('*.tmp'))
+
+        # checksums are calculated while archiving
+        extracted = os.path.join(self.TEST_DIR, 'extracted')
+        os.mkdir(extracted)
+        subprocess.check_output(
+            ['tar', '-x', '--use-compress-program=zstd', '-f', package,
+             '-C', extracted],
+            stderr=self._stderr_log)
+        subprocess.check_output(
+            ['sha512sum', '-c', '.package.checksums'],
+            cwd=extracted, stderr=self._stderr_log)
+
+        # deterministic content, regardless of file times
+        os.utime(os.path.join(self.TEST_DIR, 'data', 'a.txt'), (1, 1))
+        os.unlink(package)
+        self._call_cid(['package'])
+        package2 = glob.glob('native-test-CI-1.0.0-*.tzst')[0]
+
+        with open(package2, 'rb') as f:
+            content2 = f.read()
+
+        os.unlink(package2)
+        self._call_cid(['package'])
+        package3 = glob.glob('native-test-CI-1.0.0-*.tzst')[0]
+
+        with open(package3, 'rb') as f:
+            self.assertEqual(content2, f.read())
+
+        # no partial package on failure
+        from futoin.cid.details.packager import Packager
+
+        packager = Packager('false', [])
+        self.assertRaises((subprocess.CalledProcessError, IOError, OSError),
+                          packager.create,
+                          'failed.tzst', ['data'], [], '.package.checksums')
+        self.assertFalse(os.path.exists('failed.tzst'))
+        self.assertEqual([], glob.glob('*.tmp'))
+
+    def test_static_precompress(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'precompress-test',
+            'webcfg' : {
+                'root' : 'web',
+                'mounts' : {
+                    '/' : {
+                        'static' : True,
+                        'tune' : {
+                            'staticGzip' : True,
+                            'staticZstd' : True,
+                        },
+                    },
+                },
+            },
+        })
+        web_dir = os.path.join(self.TEST_DIR, 'web')
+        os.makedirs(os.path.join(web_dir, 'js'))
+        self._writeFile(os.path.join(web_dir, 'js', 'a.js'), 'var a = 1;' * 100)
+        self._writeFile(os.path.join(web_dir, 'b.png'), 'PNG')
+
+        self._call_cid(['build'])
+
+        a_js = os.path.join(web_dir, 'js', 'a.js')
+
+        import gzip
+        with gzip.open(a_js + '.gz', 'rb') as f:
+            self.assertEqual('var a = 1;' * 100 + "\n", f.read().decode('utf8'))
+
+        self.assertTrue(os.path.exists(a_js + '.zst'))
+        self.assertFalse(os.path.exists(os.path.join(web_dir, 'b.png.gz')))
+        self.assertEqual(os.stat(a_js).st_mtime, os.stat(a_js + '.gz').st_mtime)
+
+        # unchanged files are skipped
+        gz_ino = os.stat(a_js + '.gz').st_ino
+        self._call_cid(['build'])
+        self.assertEqual(gz_ino, os.stat(a_js + '.gz').st_ino)
+
+        os.utime(a_js, (1, 1))
+        self._call_cid(['build'])
+        self.assertNotEqual(gz_ino, os.stat(a_js + '.gz').st_ino)
+
+    def test_static_precompress_no_gzip(self):
+        self._writeJSON(os.path.join(self.TEST_DIR, 'futoin.json'), {
+            'name' : 'precompress-test',
+            'webcfg' : {
+                'root' : 'web',
+                'mounts' : {
+                    '/' : {
+                        'static' : True,
+                        'tune' : {
+                            'staticGzip' : False,
+                            'staticZstd' : True,
+                        },
+                    },
+                },
+            },
+        })
+        web_dir = os.path.join(self.TEST_DIR, 'web')
+        os.makedirs(web_dir)
+        a_js = os.path.join(web_dir, 'a.js')
+        self._writeFile(a_js, 'var a = 1;' * 100)
+
+        self._call_cid(['build'])
+
+        self.assertTrue(os.path.exists(a_js + '.zst'))
+        self.assertFalse(os.path.exists(a_js + '.gz'))
+
+    def test_artifact_cache(self):
+        from futoin.cid.util import artifactcache
+        import hashlib, time
+
+        env = {'artifactCacheSize': '4G', 'artifactCacheDays': 30}
+        key = ['rms', 'repo', 'pool', 'pkg.txz']
+        src = os.path.join(self.TEST_DIR, 'src.txz')
+        dst = os.path.join(self.TEST_DIR, 'dst.txz')
+        self._writeFile(src, 'package')
+        sha256 = hashlib.sha256(b'package\n').hexdigest()
+        md5 = hashlib.md5(b'package\n').hexdigest()
+
+        # miss
+        self.assertFalse(artifactcache.fetch(env, key, dst))
+        self.assertFalse(os.path.exists(dst))
+
+        # store copies, source stays writable and separate
+        artifactcache.store(env, key, src)
+        self.assertTrue(os.stat(src).st_mode & stat.S_IWUSR)
+        self.assertEqual(1, os.stat(src).st_nlink)
+
+        # hit
+        self.assertTrue(artifactcache.fetch(env, key, dst))
+        self.assertEqual('package\n', self._readFile(dst))
+        self.assertEqual(1, os.stat(dst).st_nlink)
+        os.remove(dst)
+
+        # hashes are part of key
+        self.assertFalse(artifactcache.fetch(env, key, dst, {'md5': md5}))
+        artifactcache.store(env, key, src, {'md5': md5})
+        self.assertTrue(artifactcache.fetch(env, key, dst, {'md5': md5}))
+        os.remove(dst)
+
+        # mismatching file is not stored
+        self._writeFile(src, 'changed')
+        artifactcache.store(env, key, src, {'sha256': sha256})
+        self.assertFalse(artifactcache.fetch(env, key, dst, {'sha256': sha256}))
+        self.assertFalse(os.path.exists(dst))
+
+        # hash mismatch of cached object is a miss
+        cache_dir = os.path.join(os.environ['HOME'], '.cache', 'futoin-cid',
+                                 'artifacts')
+        changed_sha256 = hashlib.sha256(b'changed\n').hexdigest()
+        artifactcache.store(env, key, src)
+        self._writeFile(artifactcache._keyFile(cache_dir, key, {'md5': md5}),
+                        changed_sha256)
+        self.assertFalse(artifactcache.fetch(env, key, dst, {'md5': md5}))
+        self.assertFalse(artifactcache.fetch(env, key, dst, {'sha256': sha256}))
+        self.assertFalse(os.path.exists(dst))
+
+        # eviction by age and by size
+        objects = glob.glob(os.path.join(cache_dir, 'objects', '*', '*'))
+        self.assertEqual(2, len(objects))
+
+        old = time.time() - 31 * 24 * 3600
+
+        for o in objects:
+            os.utime(o, (old, old))
+
+        self._writeFile(src, 'other')
+        other_key = ['url', 'other']
+        artifactcache.store(env, other_key, src)
+        self.assertFalse(os.path.exists(objects[0]))
+        self.assertFalse(os.path.exists(objects[1]))
+        self.assertFalse(artifactcache.fetch(env, key, dst))
+        self.assertTrue(artifactcache.fetch(env, other_key, dst))
+
+        self._writeFile(src, 'x' * 1024)
+        artifactcache.store({'artifactCacheSize': '1K', 'artifactCacheDays': 30},
+                            ['url', 'large'], src)
+        self.assertFalse(artifactcache.fetch(env, other_key, dst))
+
+    def test_scp_promote_failures(self):
+        from futoin.cid.tool.scptool import scpTool
+
+        repo = os.path.join(self.TEST_DIR, 'rms')
+        os.makedirs(os.path.join(repo, 'Src'))
+        os.makedirs(os.path.join(repo, 'Dst'))
+
+        for p in ('a.txz', 'c.txz'):
+            self._writeFile(os.path.join(repo, 'Src', p), p)
+
+        calls = []
+
+        class localScpTool(scpTool):
+            __slots__ = ()
+
+            def _callSSH(self, config, user_host, port, cmd, **kwargs):
+                calls.append(cmd)
+                return subprocess.check_output(
+                    ['sh', '-c', cmd]).decode('utf8')
+
+        scp = localScpTool('scp')
+        config = {
+            'rmsRepo': 'rms@localhost/22:' + repo,
+            'env': {'rmsParallel': 1},
+        }
+
+        try:
+            scp.rmsPromote(config, 'Src', 'Dst', ['a.txz', 'b.txz', 'c.txz'])
+        except RuntimeError as e:
+            self.assertIn('failed for 1 of 3 packages', str(e))
+        else:
+            self.fail('must fail')
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(['a.txz', 'c.txz'],
+                         sorted(os.listdir(os.path.join(repo, 'Dst'))))
+        self.assertFalse(os.stat(os.path.join(repo, 'Dst', 'c.txz')).st_mode
+                         & stat.S_IWUSR)
+
+        scp.rmsPromote(config, 'Src', 'Sub/Pool', ['a.txz'])
+        self.assertEqual(['a.txz'],
+                         os.listdir(os.path.join(repo, 'Sub', 'Pool')))
+
+    def _treeFixture(self, base):
+        tree = os.path.join(base, 'tree')
+        outside = os.path.join(base, 'outside')
+        os.makedirs(os.path.join(tree, 'ro', 'sub'))
+        os.makedirs(os.path.join(tree, 'bin'))
+        os.makedirs(outside)
+
+        self._writeFile(os.path.join(tree, 'ro', 'sub', 'file'), 'file')
+        self._writeFile(os.path.join(tree, 'bin', 'run.sh'), 'run')
+        self._writeFile(os.path.join(tree, 'bin', 'skip.sh'), 'skip')
+        self._writeFile(os.path.join(outside, 'target'), 'target')
+        self._writeFile(os.path.join(outside, 'shared'), 'shared')
+        os.chmod(os.path.join(tree, 'bin', 'run.sh'), 0o755)
+        os.chmod(os.path.join(tree, 'bin', 'skip.sh'), 0o700)
+        os.chmod(outside, 0o755)
+        os.chmod(os.path.join(outside, 'target'), 0o600)
+        os.chmod(os.path.join(outside, 'shared'), 0o444)
+        os.link(os.path.join(outside, 'shared'),
+                os.path.join(tree, 'bin', 'shared'))
+        os.symlink(outside, os.path.join(tree, 'link'))
+        os.chmod(os.path.join(tree, 'ro', 'sub'), 0o500)
+        os.chmod(os.path.join(tree, 'ro'), 0o500)
+        os.chmod(tree, 0o500)
+
+        return (tree, outside)
+
+    def _checkPathTree(self, base, parallel):
+        from futoin.cid.util import pathutil
+
+        mode = lambda *p: stat.S_IMODE(os.lstat(os.path.join(*p)).st_mode)
+
+        (tree, outside) = self._treeFixture(base)
+        skip = set([os.path.join(tree, 'bin', 'skip.sh')])
+        pathutil.chmodTree(tree, 0o750, 0o640, keep_execute=True,
+                           skip=skip, parallel=parallel)
+
+        self.assertEqual(0o750, mode(tree))
+        self.assertEqual(0o750, mode(tree, 'ro', 'sub'))
+        self.assertEqual(0o640, mode(tree, 'ro', 'sub', 'file'))
+        self.assertEqual(0o750, mode(tree, 'bin', 'run.sh'))
+        self.assertEqual(0o700, mode(tree, 'bin', 'skip.sh'))
+        self.assertEqual(0o640, mode(outside, 'shared'))
+        self.assertEqual(0o755, mode(outside))
+        self.assertEqual(0o600, mode(outside, 'target'))
+
+        os.chmod(os.path.join(outside, 'shared'), 0o444)
+        pathutil.chmodTree(tree, 0o500, None, parallel=parallel)
+        self.assertEqual(0o500, mode(tree, 'ro'))
+        self.assertEqual(0o640, mode(tree, 'ro', 'sub', 'file'))
+        self.assertEqual(0o444, mode(outside, 'shared'))
+
+        pathutil.rmTree(tree, verbose=False, parallel=parallel)
+
+        self.assertFalse(os.path.lexists(tree))
+        self.assertEqual('target\n',
+                         self._readFile(os.path.join(outside, 'target')))
+        self.assertEqual(0o600, mode(outside, 'target'))
+        self.assertEqual(0o444, mode(outside, 'shared'))
+        self.assertEqual(1, os.stat(os.path.join(outside, 'shared')).st_nlink)
+
+        # not directory and missing path
+        pathutil.rmTree(os.path.join(outside, 'shared'), verbose=False)
+        self.assertFalse(os.path.exists(os.path.join(outside, 'shared')))
+        pathutil.rmTree(os.path.join(outside, 'missing'), verbose=False)
+
+    def test_path_tree(self):
+        from futoin.cid.util import pathutil
+        import multiprocessing
+
+        self._checkPathTree(os.path.join(self.TEST_DIR, 'fd'), False)
+
+        orig_cpu_count = multiprocessing.cpu_count
+        multiprocessing.cpu_count = lambda: 4
+
+        try:
+            self._checkPathTree(os.path.join(self.TEST_DIR, 'par'), True)
+        finally:
+            multiprocessing.cpu_count = orig_cpu_count
+
+        # Python 2 and platforms without fd-relative calls
+        orig_has_fd_ops = pathutil._hasTreeFdOps
+        pathutil._hasTreeFdOps = lambda: False
+
+        try:
+            self._checkPathTree(os.path.join(self.TEST_DIR, 'walk'), False)
+        finally:
+            pathutil._hasTreeFdOps = orig_has_fd_ops
+
+    def _toolInstallCID(self, metas, calls, failing=()):
+        from futoin.cid.cidtool import CIDTool
+        from futoin.cid.util import log
+        import time
+
+        class testCIDTool(CIDTool):
+            __slots__ = ()
+
+            def _getToolMeta(self, name):
+                return metas[name]
+
+        class fakeTool(object):
+            def __init__(self, name):
+                self.name = name
+
+            def sanitizeVersion(self, env):
+                pass
+
+            def importEnv(self, env):
+                pass
+
+            def isInstalled(self, env):
+                return False
+
+            def requireInstalled(self, env):
+                calls.append(('require', self.name, log.threadLabel()))
+
+            def installTool(self, env):
+                calls.append(('install', self.name, log.threadLabel()))
+                # let groups overlap
+                time.sleep(0.05)
+
+                if self.name in failing:
+                    raise RuntimeError('Broken ' + self.name)
+
+        cit = testCIDTool(overrides={'wcDir': self.TEST_DIR})
+
+        for name in metas:
+            cit._tool_impl[name] = fakeTool(name)
+
+        return cit
+
+    def test_tool_install_parallel(self):
+        from futoin.cid.util import log
+
+        meta = lambda deps=[], post=[]: {'deps': deps, 'postDeps': post}
+        metas = {
+            'a': meta(['ruby']),
+            'b': meta(['ruby', 'bash']),
+            'c': meta(['node']),
+            'd': meta([], ['virtualenv']),
+            'e': meta(['virtualenv']),
+            'f': meta(),
+            'g': meta(['c']),
+        }
+        generation = ['a', 'b', 'c', 'd', 'e', 'f', 'g']
+        calls = []
+        cit = self._toolInstallCID(metas, calls)
+
+        groups = cit._ToolMixIn__independentGroups(generation)
+        self.assertEqual(
+            sorted([['a', 'b'], ['c', 'g'], ['d', 'e'], ['f']]),
+            sorted(groups))
+
+        # sequential
+        env = {'toolInstallParallel': 1}
+        cit._ToolMixIn__installGeneration({}, env, generation)
+        self.assertEqual([('require', t, None) for t in generation], calls)
+
+        # parallel
+        del calls[:]
+        env = {'toolInstallParallel': 4}
+        cit._ToolMixIn__installGeneration({}, env, generation)
+        self.assertEqual(sorted(('install', t, t) for t in generation),
+                         sorted(calls))
+        installed = [c[1] for c in calls]
+        self.assertLess(installed.index('a'), installed.index('b'))
+        self.assertLess(installed.index('c'), installed.index('g'))
+        self.assertLess(installed.index('d'), installed.index('e'))
+        self.assertIsNone(log.threadLabel())
+
+        # error of worker thread
+        del calls[:]
+        cit = self._toolInstallCID(metas, calls, ['c'])
+
+        try:
+            cit._ToolMixIn__installGeneration({}, env, generation)
+        except RuntimeError as e:
+            self.assertEqual('Broken c', str(e))
+        else:
+            self.fail('must fail')
+
+        installed = [c[1] for c in calls]
+        self.assertEqual(['a', 'b', 'c', 'd', 'e', 'f'], sorted(installed))
+
+    def test_labelled_output(self):
+        from futoin.cid.util import executil, log
+        import sys
+
+        try:
+            from StringIO import StringIO
+        except ImportError:
+            from io import StringIO
+
+        cmd = ['sh', '-c', 'echo out; echo err1 >&2; echo err2 >&2; exit $0']
+        orig_stderr = sys.stderr
+        sys.stderr = StringIO()
+        log.setThreadLabel('lbl')
+
+        try:
+            res = executil.callExternal(cmd + ['0'])
+            self.assertRaises(subprocess.CalledProcessError,
+                              executil.callExternal, cmd + ['1'])
+            output = sys.stderr.getvalue()
+        finally:
+            log.setThreadLabel(None)
+            sys.stderr = orig_stderr
+
+        self.assertEqual('out\n', res)
+        lines = output.splitlines()
+        self.assertEqual(2, lines.count('[lbl] err1'))
+        self.assertEqual(2, lines.count('[lbl] err2'))
+        self.assertNotIn('err1', lines)
+
+    def _patchHTTPUtil(self, **values):
+        from futoin.cid.util import httputil
+
+        orig = dict((k, getattr(httputil, k)) for k in values)
+
+        for (k, v) in values.items():
+            setattr(httputil, k, v)
+
+        return lambda: [setattr(httputil, k, v) for (k, v) in orig.items()]
+
+    def test_http_download(self):
+        from futoin.cid.util import httputil
+        import hashlib, json
+
+        content = b''.join(hashlib.sha256(str(i).encode()).digest()
+                           for i in range(8192))
+        sha256 = hashlib.sha256(content).hexdigest()
+        md5 = hashlib.md5(content).hexdigest()
+        env = {'timeouts': {'connect': 5, 'read': 5, 'total': 30}}
+        dst = os.path.join(self.TEST_DIR, 'dl.bin')
+        dst_tmp = dst + '.tmp'
+        state_file = dst_tmp + '.state'
+        part_size = len(content) // 4
+
+        restore = self._patchHTTPUtil(
+            _DL_PART_MIN=part_size, _DL_BLOCK=4096, _DL_STATE_EVERY=16384,
+            _RETRY_BACKOFF=0)
+        server = _TestHTTPServer(content)
+
+        def download(**kwargs):
+            del server.requests[:]
+            res = httputil.download(env, server.url, dst, **kwargs)
+            self.assertEqual(content, open(dst, 'rb').read())
+            self.assertFalse(os.path.exists(dst_tmp))
+            self.assertFalse(os.path.exists(state_file))
+            os.remove(dst)
+            return res
+
+        def ranges():
+            return [r[1] for r in server.requests if r[1]]
+
+        try:
+            # parallel parts
+            res = download(hashes={'md5': md5.upper()})
+            self.assertEqual({'md5': md5, 'sha256': sha256}, res)
+            self.assertEqual(
+                sorted('bytes={0}-{1}'.format(i * part_size,
+                                              (i + 1) * part_size - 1)
+                       for i in range(1, 4)),
+                sorted(ranges()))
+
+            # continued on interrupts
+            server.disconnect_at = [10000, 10000, 10000]
+            self.assertEqual(sha256, download()['sha256'])
+            self.assertGreater(len(ranges()), 3)
+            self.assertTrue([r for r in ranges()
+                             if int(r[6:].split('-')[0]) % part_size])
+
+            # resumed from state of failed call
+            server.disconnect_at = [5000] * 100
+
+            self.assertRaises(Exception, httputil.download,
+                              env, server.url, dst)
+            self.assertTrue(os.path.exists(dst_tmp))
+            self.assertFalse(os.path.exists(dst))
+
+            with open(state_file, 'r') as f:
+                parts = json.load(f)['parts']
+
+            self.assertEqual(4, len(parts))
+            self.assertTrue([p for p in parts if p[1] > p[0]])
+
+            server.disconnect_at = []
+            self.assertEqual(sha256, download()['sha256'])
+            self.assertEqual(
+                sorted('bytes={0}-{1}'.format(p[1], p[2] - 1)
+                       for p in parts if p[1] < p[2]),
+                sorted(ranges()))
+
+            # hash mismatch
+            for ranges_on in (True, False):
+                server.ranges = ranges_on
+
+                self.assertRaises(RuntimeError, httputil.download,
+                                  env, server.url, dst, {'sha256': md5})
+                self.assertFalse(os.path.exists(dst))
+                self.assertFalse(os.path.exists(dst_tmp))
+                self.assertFalse(os.path.exists(state_file))
+
+            # no range support
+            self.assertEqual(sha256, download()['sha256'])
+            self.assertEqual([('GET', None)],
+                             [r[:2] for r in server.requests])
+
+            server.disconnect_at = [10000]
+            self.assertRaises(Exception, httputil.download,
+                              env, server.url, dst)
+            self.assertFalse(os.path.exists(dst_tmp))
+            self.assertFalse(os.path.exists(state_file))
+        finally:
+            server.stop()
+            restore()
+
+    def test_http_retry(self):
+        from futoin.cid.util import httputil
+        import io, requests
+
+        env = {'timeouts': {'connect': 5, 'read': 5, 'total': 30}}
+        restore = self._patchHTTPUtil(_RETRY_BACKOFF=0)
+        server = _TestHTTPServer(b'content')
+
+        def call(method, fail_status, **kwargs):
+            del server.requests[:]
+            server.fail_status = list(fail_status)
+            return httputil.request(env, method, server.url, **kwargs)
+
+        try:
+            # idempotent
+            for method in ('GET', 'HEAD', 'PUT', 'DELETE'):
+                res = call(method, [502, 503, 504])
+                self.assertEqual(4, len(server.requests))
+                self.assertEqual(200, res.status_code)
+
+            self.assertEqual(b'content', call('GET', ['close', 503]).content)
+            self.assertEqual(3, len(server.requests))
+
+            self.assertEqual(503, call('GET', [503] * 4).status_code)
+            self.assertEqual(4, len(server.requests))
+
+            self.assertRaises(requests.ConnectionError,
+                              call, 'GET', ['close'] * 4)
+            self.assertEqual(4, len(server.requests))
+
+            # seekable body is rewound
+            body = io.BytesIO(b'prefix:body')
+            body.seek(7)
+            self.assertEqual(200, call('PUT', [503, 'close'],
+                                       data=body).status_code)
+            self.assertEqual([('PUT', None, b'body')] * 3, server.requests)
+
+            # never retried
+            self.assertEqual(503, call('POST', [503], data=b'body').status_code)
+            self.assertEqual(1, len(server.requests))
+
+            self.assertRaises(requests.ConnectionError,
+                              call, 'POST', ['close'], data=b'body')
+            self.assertEqual(1, len(server.requests))
+        finally:
+            server.stop()
+            restore()
+
+    def _writeTar(self, tar_file, members):
+        import tarfile, io
+
+        with tarfile.open(tar_file, 'w') as tar:
+            for (name, kind, value) in members:
+                info = tarfile.TarInfo(name)
+
+                if kind == 'dir':
+                    info.type = tarfile.DIRTYPE
+                    info.mode = 0o755
+                    tar.addfile(info)
+                elif kind == 'file':
+                    value = value.encode('utf8')
+                    info.size = len(value)
+                    tar.addfile(info, io.BytesIO(value))
+                else:
+                    info.type = (kind == 'sym') and tarfile.SYMTYPE or tarfile.LNKTYPE
+                    info.linkname = value
+                    tar.addfile(info)
+
+    def test_incremental_unsafe_links(self):
+        from futoin.cid.details.incremental import IncrementalExtractor
+
+        outside = os.path.join(self.TEST_DIR, 'outside')
+        os.mkdir(outside)
+        self._writeFile(os.path.join(outside, 'x'), 'x')
+        package = os.path.join(self.TEST_DIR, 'package.tar')
+        prev_dir = os.path.join(self.TEST_DIR, 'prev')
+
+        def extract(members):
+            target = os.path.join(self.TEST_DIR, 'target')
+            self._writeTar(package, members)
+
+            if os.path.exists(target):
+                subprocess.check_call(['rm', '-rf', target])
+
+            os.mkdir(target)
+            IncrementalExtractor(None, package, prev_dir).extract(target, {})
+            return target
+
+        target = extract([
+            ('d', 'dir', None),
+            ('d/f', 'file', 'f'),
+            ('d/s', 'dir', None),
+            ('l', 'sym', 'd/f'),
+            ('ld', 'sym', 'd'),
+            ('d/s/up', 'sym', '../f'),
+            ('h', 'lnk', 'd/f'),
+            ('ld2', 'sym', 'ld/s'),
+        ])
+        self.assertEqual('f', self._readFile(os.path.join(target, 'l')))
+        self.assertEqual('f', self._readFile(os.path.join(target, 'h')))
+        self.assertEqual('f', self._readFile(
+            os.path.join(target, 'ld2', 'up')))
+
+        for members in (
+            [('a', 'sym', '/etc')],
+            [('a', 'sym', '../outside')],
+            [('d', 'dir', None), ('d/a', 'sym', '../../outside')],
+            [('a', 'sym', '../outside'), ('a/x', 'file', 'bad')],
+            [('a', 'sym', 'd'), ('d', 'dir', None), ('a/x', 'file', 'bad')],
+            [('a', 'sym', '.'), ('b', 'sym', 'a/../outside')],
+            [('a', 'sym', 'x'), ('a', 'file', 'bad')],
+            [('h', 'lnk', '../outside/x')],
+            [('h', 'lnk', '/etc/passwd')],
+            [('d', 'dir', None), ('f', 'file', 'f'), ('a', 'sym', 'd'),
+             ('h', 'lnk', 'a/../f')],
+        ):
+            self.assertRaises(RuntimeError, extract, members)
+            self.assertEqual(['x'], os.listdir(outside))
+            self.assertEqual('x\n', self._readFile(os.path.join(outside, 'x')))
+
+    def test_git_archive_extract(self):
+        from futoin.cid.tool.gittool import gitTool
+
+        git = gitTool('git')
+        package = os.path.join(self.TEST_DIR, 'export.tar')
+        self._writeTar(package, [
+            ('d', 'dir', None),
+            ('d/f', 'file', 'f' * 2048),
+        ])
+
+        dst = os.path.join(self.TEST_DIR, 'ok')
+        git._gitArchiveExtract(['cat', package], dst)
+        self.assertEqual('f' * 2048, self._readFile(os.path.join(dst, 'd', 'f')))
+
+        # truncated stream with successful exit
+        dst = os.path.join(self.TEST_DIR, 'truncated')
+        self.assertRaises(RuntimeError, git._gitArchiveExtract,
+                          ['head', '-c', '1024', package], dst)
+
+        # corrupted stream of command still writing
+        dst = os.path.join(self.TEST_DIR, 'corrupted')
+        self.assertRaises(RuntimeError, git._gitArchiveExtract,
+                          ['yes'], dst)
+
+        # exit code of command takes precedence
+        self.assertRaises(subprocess.CalledProcessError, git._gitArchiveExtract,
+                          ['sh', '-c', 'head -c 1024 "$0"; exit 3', package], dst)
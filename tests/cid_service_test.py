@@ -246,3 +246,302 @@ class cid_service_Test( cid_UTBase ) :
         os.waitpid(pid, 0)
         
             
+
+    def test06_rolling_reload(self):
+        start_file = 'dst/persistent/data/start.txt'
+
+        self._call_cid(['deploy', 'set', 'entrypoint', 'app', 'exe', 'app.sh',
+                        '{"scalable": true, "reloadable": false, '
+                        '"maxInstances": 4, "reloadBatch": "50%", '
+                        '"socketTypes": ["unix"], "socketType": "unix", '
+                        '"socketActivation": true}',
+                        '--deployDir=dst'])
+        self._call_cid(['deploy', 'rms', 'Releases', '--deployDir=dst',
+                        '--redeploy'])
+
+        try: os.unlink(start_file)
+        except: pass
+
+        pid = os.fork()
+
+        if not pid:
+            self._redirectAsyncStdIO()
+
+            os.execv(self.CIDTEST_BIN, [
+                self.CIDTEST_BIN, 'service', 'master',
+                '--deployDir=dst',
+            ])
+
+        for i in range(10):
+            time.sleep(1)
+
+            if not os.path.exists(start_file):
+                continue
+
+            if len(self._readFile(start_file)) == 4:
+                break
+        else:
+            self.assertTrue(False)
+
+        # pre-bound by master
+        sock_file = os.path.join('dst', '.runtime', 'app.3.sock')
+        self.assertTrue(stat.S_ISSOCK(os.stat(sock_file).st_mode))
+
+        os.kill(pid, signal.SIGUSR1)
+
+        for i in range(30):
+            time.sleep(1)
+
+            if len(self._readFile(start_file)) == 8:
+                break
+        else:
+            self.assertTrue(False)
+
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+        self.assertFalse(os.path.exists(sock_file))
+
+    def test07_incremental_deploy(self):
+        old_dir = os.path.realpath(os.path.join('dst', 'current'))
+
+        os.chdir('src')
+        self._writeFile('new.txt', 'NEW')
+        time.sleep(1)
+        self._call_cid(['package'])
+        package = sorted(glob.glob('*.txz'))[-1]
+        self._call_cid(['promote', 'Releases', package])
+        os.chdir('..')
+
+        self._call_cid(['deploy', 'rms', 'Releases', '--deployDir=dst',
+                        '--incremental'])
+
+        new_dir = os.path.realpath(os.path.join('dst', 'current'))
+        self.assertNotEqual(old_dir, new_dir)
+        self.assertEqual('NEW\n', self._readFile(
+            os.path.join(new_dir, 'new.txt')))
+        self.assertTrue(os.access(os.path.join(new_dir, 'app.sh'), os.X_OK))
+
+        self._stdout_log.seek(0)
+        log = self._stdout_log.read().split('Test Call: ')[-1]
+        self.assertIn('INFO: Reused 2 of 5 files from previous release', log)
+
+    def test08_metrics(self):
+        metrics_file = os.path.join('dst', '.runtime', 'cid-metrics.prom')
+        deploy_config = self._readJSON(os.path.join('dst', 'futoin.json'))
+        deploy_config['deploy']['exportMetrics'] = True
+        self._writeJSON(os.path.join('dst', 'futoin.json'), deploy_config)
+
+        pid = os.fork()
+
+        if not pid:
+            self._redirectAsyncStdIO()
+
+            os.execv(self.CIDTEST_BIN, [
+                self.CIDTEST_BIN, 'service', 'master',
+                '--deployDir=dst',
+            ])
+
+        for i in range(10):
+            time.sleep(1)
+
+            if os.path.exists(metrics_file):
+                break
+        else:
+            self.assertTrue(False)
+
+        metrics = self._readFile(metrics_file)
+        self.assertIn('cid_instance_up{entry_point="app",instance_id="3"} 1',
+                      metrics)
+        self.assertIn('cid_instance_max_connections{entry_point="app",',
+                      metrics)
+
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+        self.assertFalse(os.path.exists(metrics_file))
+
+    def _forkChild(self, on_term=signal.SIG_DFL, exit_code=None):
+        """Fork child and return, once it has SIGTERM handler set."""
+        (rfd, wfd) = os.pipe()
+        pid = os.fork()
+
+        if not pid:
+            try:
+                os.close(rfd)
+
+                if exit_code is not None:
+                    os._exit(exit_code)
+
+                signal.signal(signal.SIGTERM, on_term)
+                os.write(wfd, str(os.getpid()).encode())
+
+                while True:
+                    time.sleep(1)
+            finally:
+                os._exit(3)
+
+        os.close(wfd)
+        os.read(rfd, 32)
+        os.close(rfd)
+        return pid
+
+    def _forkNonChild(self):
+        """Fork grandchild, which gets reaped by own parent."""
+        (rfd, wfd) = os.pipe()
+        pid = os.fork()
+
+        if not pid:
+            try:
+                os.close(rfd)
+                gpid = self._forkChild()
+                os.write(wfd, str(gpid).encode())
+                os.close(wfd)
+                os.waitpid(gpid, 0)
+            finally:
+                os._exit(0)
+
+        os.close(wfd)
+        gpid = int(os.read(rfd, 32))
+        os.close(rfd)
+        return (pid, gpid)
+
+    def _stopServices(self, watcher, stop_list, own=True):
+        from futoin.cid.cidtool import CIDTool
+
+        class stopTool(object):
+            def onStop(self, config, pid, tune):
+                os.kill(pid, signal.SIGTERM)
+
+        cit = CIDTool(overrides={'wcDir': self.TEST_DIR})
+        stop_list = [
+            ({'tune': {'exitTimeoutMS': t}, 'toolImpl': stopTool()}, pid)
+            for (pid, t) in stop_list
+        ]
+        pid_to_svc = {}
+
+        if own:
+            pid_to_svc = dict((pid, svc) for (svc, pid) in stop_list)
+
+        exited = {}
+
+        def on_exit(pid, excode):
+            exited[pid] = excode
+
+        start = time.time()
+        cit._ServiceMixIn__stopServices(
+            watcher, stop_list, pid_to_svc, on_exit)
+
+        return (time.time() - start, exited)
+
+    @staticmethod
+    def _slowExit(*args):
+        time.sleep(0.5)
+        os._exit(0)
+
+    def test09_watcher_timers(self):
+        from futoin.cid.details.childwatcher import ChildWatcher
+
+        watcher = ChildWatcher()
+        watcher.open({})
+
+        try:
+            pid = self._forkChild(exit_code=1)
+            watcher.watch(pid)
+            self.assertEqual(set([pid]), watcher.wait(5))
+            (exited_pid, excode) = watcher.reap()[0]
+            self.assertEqual(pid, exited_pid)
+            self.assertEqual(1, os.WEXITSTATUS(excode))
+
+            # restart delay is not cut by unrelated child exit
+            start_at = watcher.monotonic() + 1
+            other = self._forkChild()
+            os.kill(other, signal.SIGTERM)
+            reaped = []
+            wakeups = 0
+
+            while watcher.monotonic() < start_at:
+                watcher.wait(start_at - watcher.monotonic())
+                reaped += [p for (p, _) in watcher.reap()]
+                wakeups += 1
+
+            self.assertEqual([other], reaped)
+            self.assertGreater(wakeups, 1)
+            self.assertLess(watcher.monotonic() - start_at, 0.5)
+        finally:
+            watcher.close()
+
+    def test10_watcher_stop_deadline(self):
+        from futoin.cid.details.childwatcher import ChildWatcher
+
+        pids = [self._forkChild(self._slowExit) for _ in range(3)]
+        watcher = ChildWatcher()
+        watcher.open({})
+
+        try:
+            (elapsed, exited) = self._stopServices(
+                watcher, [(pid, 5000) for pid in pids])
+        finally:
+            watcher.close()
+
+        # concurrent, i.e. not 3 x 0.5s
+        self.assertLess(elapsed, 1.2)
+        self.assertEqual(sorted(pids), sorted(exited.keys()))
+
+        for excode in exited.values():
+            self.assertEqual(0, os.WEXITSTATUS(excode))
+
+    def test11_watcher_kill_timeout(self):
+        from futoin.cid.details.childwatcher import ChildWatcher
+
+        stuck = [self._forkChild(signal.SIG_IGN) for _ in range(2)]
+        good = self._forkChild(self._slowExit)
+        watcher = ChildWatcher()
+        watcher.open({})
+
+        try:
+            (elapsed, exited) = self._stopServices(
+                watcher, [(pid, 1000) for pid in stuck] + [(good, 5000)])
+        finally:
+            watcher.close()
+
+        self.assertGreaterEqual(elapsed, 1)
+        self.assertLess(elapsed, 2)
+        self.assertEqual(sorted(stuck + [good]), sorted(exited.keys()))
+        self.assertEqual(0, os.WEXITSTATUS(exited[good]))
+
+        for pid in stuck:
+            self.assertTrue(os.WIFSIGNALED(exited[pid]))
+            self.assertEqual(signal.SIGKILL, os.WTERMSIG(exited[pid]))
+
+    def test12_watcher_fallback(self):
+        from futoin.cid.details.childwatcher import ChildWatcher
+
+        class noPidfdWatcher(ChildWatcher):
+            def watch(self, pid):
+                return False
+
+        for cls in (ChildWatcher, noPidfdWatcher):
+            pids = [self._forkChild(self._slowExit) for _ in range(2)]
+            (parent, non_child) = self._forkNonChild()
+            watcher = cls()
+            watcher.open({})
+
+            try:
+                (elapsed, exited) = self._stopServices(
+                    watcher, [(pid, 5000) for pid in pids])
+                self.assertLess(elapsed, 1.2)
+                self.assertEqual(sorted(pids), sorted(exited.keys()))
+
+                # not own child is watched through pidfd or polled
+                (elapsed, exited) = self._stopServices(
+                    watcher, [(non_child, 5000)], own=False)
+                self.assertLess(elapsed, 1)
+                self.assertFalse(watcher.isWatched(non_child))
+            finally:
+                watcher.close()
+
+                try:
+                    os.waitpid(parent, 0)
+                except OSError:
+                    pass
+
+            self.assertFalse(watcher.isAlive(non_child))
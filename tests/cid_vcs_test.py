@@ -504,7 +504,26 @@ class cid_git_Test ( cid_VCS_UTBase ) :
         
     def _ignore(self, path):
         self._writeFile('.gitignore', path)
-        
+
+    def test_71_shared_mirror( self ):
+        os.makedirs( 'test_deploy2' )
+        os.chdir( 'test_deploy2' )
+
+        self._call_cid( [ 'deploy', 'vcsref', 'branch_A', '--vcsRepo', self.VCS_REPO ] )
+        self.assertTrue(glob.glob('branch_A_*'))
+
+        alternates = os.path.join('objects', 'info', 'alternates')
+        mirror_objects = self._readFile(os.path.join('vcs', alternates))
+        self.assertEqual(
+            self._readFile(os.path.join('..', 'test_deploy', 'vcs', alternates)),
+            mirror_objects)
+
+        mirror = os.path.dirname(mirror_objects.strip())
+        users = self._readJSON(mirror + '.users')
+        self.assertEqual(len(users), 2)
+        self.assertIn(os.path.realpath('vcs'), users)
+
+
 #=============================================================================
 class cid_hg_Test ( cid_VCS_UTBase ) :
     __test__ = True